@@ -1,6 +1,21 @@
 import json
+import logging
 from core.gemini_client import gemini_flash
-from core.markdown_utils import chunk_markdown
+from core.instrumentation import instrument_agent
+from core.responses import DetailSpec, json_config, resolve_details, parse_failure
+from core.streaming import stream_json_array
+from core.pipeline import run_cpu
+from core.triage import triage_units, triage_report, has_claim
+
+logger = logging.getLogger(__name__)
+
+SPEC = DetailSpec("accuracy", "fact", "is_true", "reason", "sentence")
+
+# Sentences triage routes away from the LLM are scored by this rule instead
+DEFAULT_RULE = "no figure, currency, citation or trend claim to verify; counted as accurate"
+
+# run_cpu stages over the text this agent is given, as (fn, args)
+PREPROCESS = ((triage_units, ("sentence", has_claim)),)
 
 PROMPT_TEMPLATE = """
 You are a world-class data quality expert with deep expertise in factual accuracy assessment and prompt design. You have been tasked with evaluating the **accuracy** of the given markdown content.
@@ -30,27 +45,56 @@ dont give triple quotes while giving out the json output, give only the json wit
 Markdown content to analyze: 
 \"\"\"{content}\"\"" 
 """
-async def evaluate_accuracy(markdown: str):
-    content = chunk_markdown(markdown)
-    prompt = PROMPT_TEMPLATE.format(content=content)
-    response = await gemini_flash(prompt)
+def build_accuracy_prompt(markdown: str):
+    checked, _ = triage_units(markdown, "sentence", has_claim)
+    return PROMPT_TEMPLATE.format(content="\n".join(checked)) if checked else ""
 
-    try:
-        results = json.loads(response)
-    except Exception as e:
-        return f"❌ Failed to parse Gemini response as JSON:\n{response}\nError: {e}"
+def default_verdict(sentence: str):
+    return {"fact": sentence, "is_true": True, "reason": f"Not checked: {DEFAULT_RULE}"}
 
+def summarize_accuracy(results):
     total = len(results)
     correct = sum(1 for item in results if item.get("is_true") is True)
     score = round(correct / total, 2) if total > 0 else 0.0
 
-    print("\n🔎 Accuracy Agent Output:")
-    print(json.dumps(results, indent=2))
-    print(f"\n✅ Calculated Accuracy Score: {correct}/{total} = {score}\n")
-
     return {
         "score": score,
         "total_facts": total,
         "correct_facts": correct,
         "details": results
     }
+
+async def stream_accuracy(markdown: str):
+    """Async iterator over the accuracy details as Gemini generates them"""
+    checked, skipped = await run_cpu(triage_units, markdown, "sentence", has_claim, stage="triage")
+    triage_report("accuracy", checked, skipped, DEFAULT_RULE)
+    for sentence in skipped:
+        yield default_verdict(sentence)
+    if checked:
+        prompt = PROMPT_TEMPLATE.format(content="\n".join(checked))
+        async for item in stream_json_array(prompt, "accuracy", json_config(SPEC)):
+            yield item
+
+@instrument_agent("accuracy")
+async def evaluate_accuracy(markdown: str):
+    # Only claim-bearing sentences are worth a fact check
+    checked, skipped = await run_cpu(triage_units, markdown, "sentence", has_claim, stage="triage")
+    results = []
+    if checked:
+        content = "\n".join(checked)
+        response = await gemini_flash(PROMPT_TEMPLATE.format(content=content), dimension="accuracy", generation_config=json_config(SPEC))
+
+        try:
+            results = await resolve_details(response, content, SPEC, build_accuracy_prompt)
+        except Exception as e:
+            return parse_failure("accuracy", response, e)
+
+    results += [default_verdict(sentence) for sentence in skipped]
+    summary = summarize_accuracy(results)
+    summary["triage"] = triage_report("accuracy", checked, skipped, DEFAULT_RULE)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n🔎 Accuracy Agent Output:\n" + json.dumps(results, indent=2))
+    logger.info(f"\n✅ Calculated Accuracy Score: {summary['correct_facts']}/{summary['total_facts']} = {summary['score']}\n")
+
+    return summary
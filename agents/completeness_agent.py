@@ -1,5 +1,14 @@
 import json
+import logging
 from core.gemini_client import gemini_flash
+from core.instrumentation import instrument_agent
+from core.responses import DetailSpec, json_config, resolve_details, parse_failure
+from core.streaming import stream_json_array
+
+logger = logging.getLogger(__name__)
+
+SPEC = DetailSpec("completeness", "section", "is_complete", "missing_info", "document")
+PREPROCESS = ()
 
 PROMPT_TEMPLATE = """
 You are a world-class data quality expert specializing in assessing **completeness** of markdown content. Your job is to rigorously evaluate whether the information presented is thorough, sufficiently detailed, and not missing critical components.
@@ -31,23 +40,14 @@ Markdown content to analyze:
 \"\"\"{content}\"\"\"
 """
 
-async def evaluate_completeness(markdown: str):
-    prompt = PROMPT_TEMPLATE.format(content=markdown)
-    response = await gemini_flash(prompt)
-
-    try:
-        results = json.loads(response)
-    except Exception as e:
-        return f"❌ Failed to parse Gemini response as JSON:\n{response}\nError: {e}"
+def build_completeness_prompt(markdown: str):
+    return PROMPT_TEMPLATE.format(content=markdown)
 
+def summarize_completeness(results):
     total = len(results)
     incomplete = sum(1 for item in results if item.get("is_complete") is False)
     score = round(1 - (incomplete / total), 2) if total > 0 else 0.0
 
-    print("\n🔎 Completeness Agent Output:")
-    print(json.dumps(results, indent=2))
-    print(f"\n✅ Calculated Completeness Score: 1 - ({incomplete}/{total}) = {score}\n")
-
     return {
         "score": score,
         "total_sections": total,
@@ -55,3 +55,25 @@ async def evaluate_completeness(markdown: str):
         "incomplete_sections": incomplete,
         "details": results
     }
+
+def stream_completeness(markdown: str):
+    """Async iterator over the completeness details as Gemini generates them"""
+    return stream_json_array(build_completeness_prompt(markdown), "completeness", json_config(SPEC))
+
+@instrument_agent("completeness")
+async def evaluate_completeness(markdown: str):
+    prompt = build_completeness_prompt(markdown)
+    response = await gemini_flash(prompt, dimension="completeness", generation_config=json_config(SPEC))
+
+    try:
+        results = await resolve_details(response, markdown, SPEC, build_completeness_prompt)
+    except Exception as e:
+        return parse_failure("completeness", response, e)
+
+    summary = summarize_completeness(results)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n🔎 Completeness Agent Output:\n" + json.dumps(results, indent=2))
+    logger.info(f"\n✅ Calculated Completeness Score: 1 - ({summary['incomplete_sections']}/{summary['total_sections']}) = {summary['score']}\n")
+
+    return summary
@@ -1,5 +1,19 @@
 import json
+import asyncio
+import logging
 from core.gemini_client import gemini_flash
+from core.instrumentation import instrument_agent
+from core.responses import DetailSpec, json_config, resolve_details, parse_failure
+from core.streaming import stream_json_array
+from core.pipeline import run_cpu
+from core import consistency
+
+logger = logging.getLogger(__name__)
+
+SPEC = DetailSpec("consistency", "unit", "is_consistent", "issue", "paragraph")
+PREPROCESS = ()
+# run_cpu stages of local_findings, over the whole document
+LOCAL_PREPROCESS = ((consistency.analyze, ()),) if consistency.ENABLED else ()
 
 PROMPT_TEMPLATE = """
 You are a world-class data quality expert specializing in linguistic, stylistic, and structural consistency. Your task is to evaluate the **consistency** of the provided markdown content.
@@ -11,7 +25,7 @@ Consistency refers to the internal uniformity of the content in terms of:
 - Tone & Style: similar narrative voice, formality, or writing style throughout.
 - Structure: stable document layout and coherent progression of ideas.
 Inconsistencies may include changes in style, formatting errors, term drift, or abrupt shifts in tone.
-
+{scope}
 **Instructions**:
 1. Carefully analyze the markdown content holistically and at the block/paragraph level.
 2. For each identified **checkable unit** (paragraph, section, or formatting cluster), determine:
@@ -33,23 +47,39 @@ Markdown content to analyze:
 \"\"\"{content}\"\"\"
 """
 
-async def evaluate_consistency(markdown: str):
-    prompt = PROMPT_TEMPLATE.format(content=markdown)
-    response = await gemini_flash(prompt)
+# With the local analyzers on, the model is only asked for the judgments they cannot make
+LOCAL_SCOPE = """
+**Already checked separately, do not report**: spelling variants (e.g. "organise" / "organize"), hyphenation
+("health-care" / "healthcare"), capitalization of recurring terms, percent / currency / digit-grouping formats
+("per cent" / "%", "Rs." / "₹", "1,00,000" / "100,000"), heading case and emphasis, and list markers.
+Focus on tone, narrative voice, formality, word choice that needs judgment, and structure.
+"""
 
-    try:
-        results = json.loads(response)
-    except Exception as e:
-        return f"❌ Failed to parse Gemini response as JSON:\n{response}\nError: {e}"
+def build_consistency_prompt(markdown: str):
+    return PROMPT_TEMPLATE.format(content=markdown, scope=LOCAL_SCOPE if consistency.ENABLED else "")
 
+async def local_findings(markdown: str, doc_id: str = None):
+    """Mechanical inconsistencies of a whole document found without the model,
+    in the unit/is_consistent/issue shape, with ties settled by the corpus
+    convention. The document's counts are recorded under `doc_id`; without
+    one the corpus is only consulted."""
+    if not consistency.ENABLED:
+        return []
+    units, uses, counts = await run_cpu(consistency.analyze, markdown, stage="consistency")
+    corpus = {}
+    if consistency.CORPUS:
+        index = consistency.get_term_index()
+        if doc_id:
+            corpus = await asyncio.to_thread(index.update, doc_id, counts)
+        else:
+            corpus = await asyncio.to_thread(index.majority, counts)
+    return consistency.findings(units, uses, consistency.preferred_variants(counts, corpus))
+
+def summarize_consistency(results):
     total = len(results)
     inconsistent = sum(1 for item in results if item.get("is_consistent") is False)
     score = round(1 - (inconsistent / total), 2) if total > 0 else 0.0
 
-    print("\n🔎 Consistency Agent Output:")
-    print(json.dumps(results, indent=2))
-    print(f"\n✅ Calculated Consistency Score: 1 - ({inconsistent}/{total}) = {score}\n")
-
     return {
         "score": score,
         "total_units": total,
@@ -57,3 +87,25 @@ async def evaluate_consistency(markdown: str):
         "inconsistent_units": inconsistent,
         "details": results
     }
+
+def stream_consistency(markdown: str):
+    """Async iterator over the consistency details as Gemini generates them"""
+    return stream_json_array(build_consistency_prompt(markdown), "consistency", json_config(SPEC))
+
+@instrument_agent("consistency")
+async def evaluate_consistency(markdown: str):
+    prompt = build_consistency_prompt(markdown)
+    response = await gemini_flash(prompt, dimension="consistency", generation_config=json_config(SPEC))
+
+    try:
+        results = await resolve_details(response, markdown, SPEC, build_consistency_prompt)
+    except Exception as e:
+        return parse_failure("consistency", response, e)
+
+    summary = summarize_consistency(results)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n🔎 Consistency Agent Output:\n" + json.dumps(results, indent=2))
+    logger.info(f"\n✅ Calculated Consistency Score: 1 - ({summary['inconsistent_units']}/{summary['total_units']}) = {summary['score']}\n")
+
+    return summary
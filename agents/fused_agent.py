@@ -0,0 +1,191 @@
+import json
+import asyncio
+import logging
+from core.gemini_client import gemini_flash
+from core.instrumentation import instrument_agent
+from core.responses import json_config, parse_response, complete_details, parse_failure, unavailable
+from core.pipeline import run_cpu
+from core.triage import triage_units, triage_report, has_claim, has_time_reference
+from core import consistency
+from agents import accuracy_agent, timeliness_agent
+
+logger = logging.getLogger(__name__)
+
+# One compact instruction block per dimension; the shared preamble, content
+# and output rules are written once instead of six times.
+FUSED_INSTRUCTIONS = {
+    "accuracy": (
+        "**accuracy**: Treat each sentence as a standalone fact and judge whether it is true or plausible "
+        "using common knowledge and logical reasoning.",
+        '"fact" (the sentence), "is_true" (boolean), "reason" (concise justification)',
+    ),
+    "completeness": (
+        "**completeness**: For each logical block or paragraph, judge whether the information is complete "
+        "(no unfinished thoughts, empty sections, missing headings, unexplained items or abrupt endings).",
+        '"section" (the block), "is_complete" (boolean), "missing_info" (what is missing)',
+    ),
+    "consistency": (
+        "**consistency**: For each paragraph, section or formatting cluster, judge whether it is consistent "
+        + ("with the rest of the document in tone, voice, style and structure (spelling variants, term casing, number "
+           "and currency formats, heading case and list markers are checked separately)." if consistency.ENABLED else
+           "with the rest of the document in terminology, formatting, tone, style and structure."),
+        '"unit" (the content checked), "is_consistent" (boolean), "issue" (short description or null)',
+    ),
+    "timeliness": (
+        "**timeliness**: For each sentence or block with an explicit or implicit time reference, judge whether "
+        "it is still current and relevant today (flag outdated data, expired timelines, past forecasts in future tense).",
+        '"unit" (the time-aware sentence or paragraph), "is_timely" (boolean), "issue" (short explanation or null)',
+    ),
+    "uniqueness": (
+        "**uniqueness**: For each sentence, judge whether it contributes distinct information or repeats "
+        "(exactly or semantically) something already stated elsewhere in the content.",
+        '"sentence" (the sentence), "is_unique" (boolean), "issue" (explanation or null)',
+    ),
+    "semantic_coherence": (
+        "**semantic coherence**: For each sentence or paragraph transition, judge whether the ideas flow "
+        "logically and meaningfully, both locally and across sections.",
+        '"segment" (the transition evaluated), "is_coherent" (boolean), "issue" (explanation or null)',
+    ),
+}
+
+# Dimensions whose agents triage units locally: slug -> (granularity, detector,
+# separator, default verdict for skipped units or None, default rule)
+TRIAGE = {
+    "accuracy": ("sentence", has_claim, "\n", accuracy_agent.default_verdict, accuracy_agent.DEFAULT_RULE),
+    "timeliness": ("paragraph", has_time_reference, "\n\n", None, timeliness_agent.DEFAULT_RULE),
+}
+
+PROMPT_TEMPLATE = """
+You are a world-class data quality expert. Evaluate the markdown content below on each of the following quality dimensions, independently of one another.
+
+{instructions}
+
+**Expected Output**:
+Return only a single **JSON object** with exactly these keys: {keys}.
+Each key maps to a JSON list for that dimension, where each element has these fields:
+{schema}
+
+Do not use triple quotes or code fences to wrap the JSON output.
+
+Markdown content to analyze:
+\"\"\"{content}\"\"\"
+"""
+
+
+def build_fused_prompt(markdown: str, dimensions):
+    instructions = "\n".join(f"{i}. {FUSED_INSTRUCTIONS[d.slug][0]}" for i, d in enumerate(dimensions, 1))
+    keys = ", ".join(f'"{d.slug}"' for d in dimensions)
+    schema = "\n".join(f'- "{d.slug}": {FUSED_INSTRUCTIONS[d.slug][1]}' for d in dimensions)
+    return PROMPT_TEMPLATE.format(instructions=instructions, keys=keys, schema=schema, content=markdown)
+
+
+async def triage(dimension, markdown: str):
+    """(checked, skipped) units of a triaged dimension, None for the others"""
+    if dimension.slug not in TRIAGE:
+        return None
+    granularity, detector, _, _, _ = TRIAGE[dimension.slug]
+    return await run_cpu(triage_units, markdown, granularity, detector, stage="triage")
+
+
+def _normalize(text) -> str:
+    return " ".join(str(text).split()).lower()
+
+
+def checked_only(dimension, details, routing):
+    """Drop the model's items on units triage skipped; those get the default
+    verdict (or no score) exactly as when the agent runs on its own"""
+    checked = [_normalize(unit) for unit in routing[0]]
+    skipped = [_normalize(unit) for unit in routing[1]]
+
+    def covers(text, units):
+        return any(text in unit or unit in text for unit in units)
+
+    kept = []
+    for item in details:
+        text = _normalize(item.get(dimension.unit_key, ""))
+        if not text or covers(text, checked) or not covers(text, skipped):
+            kept.append(item)
+    return kept
+
+
+def summarize_triaged(dimension, details, routing):
+    """Summary of a triaged dimension: the checked units' details plus the
+    default verdicts of the skipped ones and the triage block"""
+    checked, skipped = routing
+    _, _, _, default, rule = TRIAGE[dimension.slug]
+    if default is not None:
+        details = details + [default(unit) for unit in skipped]
+    summary = dimension.summarize(details)
+    summary["triage"] = triage_report(dimension.slug, checked, skipped, rule)
+    return summary
+
+
+@instrument_agent("fused")
+async def evaluate_fused(markdown: str, dimensions):
+    """Evaluate several dimensions with one LLM call and split the answer back
+    into the per-agent result dicts, keyed by dimension name"""
+    dimensions = list(dimensions)
+    routings = dict(zip(
+        (d.slug for d in dimensions),
+        await asyncio.gather(*(triage(d, markdown) for d in dimensions)),
+    ))
+    # Triaged dimensions with nothing left to check are scored without the model
+    asked = [d for d in dimensions if routings[d.slug] is None or routings[d.slug][0]]
+    outputs = {d.name: summarize_triaged(d, [], routings[d.slug]) for d in dimensions if d not in asked}
+    if not asked:
+        return outputs
+
+    prompt = build_fused_prompt(markdown, asked)
+    # The cache entry must not outlive its shortest-lived dimension
+    ttl_dimension = "timeliness" if any(d.slug == "timeliness" for d in asked) else "fused"
+    response = await gemini_flash(prompt, dimension="fused", generation_config=json_config(), shape="fused",
+                                  ttl_dimension=ttl_dimension)
+
+    try:
+        results, clean = parse_response(response, "fused")
+        if not isinstance(results, dict):
+            raise ValueError("expected a JSON object keyed by dimension")
+    except Exception as e:
+        error = parse_failure("fused", response, e)
+        return {d.name: outputs.get(d.name, error) for d in dimensions}
+
+    def content(d):
+        # Lost units of a triaged dimension are re-asked among the checked ones only
+        routing = routings[d.slug]
+        return markdown if routing is None else TRIAGE[d.slug][2].join(routing[0])
+
+    def given(d):
+        details = results.get(d.slug)
+        if not isinstance(details, list):
+            return []
+        return details if routings[d.slug] is None else checked_only(d, details, routings[d.slug])
+
+    # Dimensions the (possibly truncated) answer missed or cut short are
+    # re-asked through their own prompts, for the lost units only
+    completed = await asyncio.gather(*(
+        complete_details(
+            given(d),
+            clean and isinstance(results.get(d.slug), list),
+            content(d), d.spec, d.build_prompt,
+        )
+        for d in asked
+    ))
+    for d, details in zip(asked, completed):
+        # An empty list is a valid answer (nothing to check); only a missing
+        # key that the re-ask could not make up for is a failure
+        if not details and not isinstance(results.get(d.slug), list):
+            outputs[d.name] = unavailable(f"Fused response has no list for '{d.slug}'")
+            continue
+        if routings[d.slug] is None:
+            outputs[d.name] = d.summarize(details)
+        else:
+            outputs[d.name] = summarize_triaged(d, details, routings[d.slug])
+    outputs = {d.name: outputs[d.name] for d in dimensions}
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n🔎 Fused Agent Output:\n" + json.dumps(results, indent=2))
+    logger.info("\n✅ Calculated Scores: " + ", ".join(
+        f"{name}={output['score']}" for name, output in outputs.items()
+    ) + "\n")
+
+    return outputs
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from core.gemini_client import gemini_flash
+from core.instrumentation import instrument_agent, recorder
+from core.responses import json_config, response_schema, parse_response, complete_details
+from agents.fused_agent import FUSED_INSTRUCTIONS, TRIAGE, triage, summarize_triaged
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = """
+You are a world-class data quality expert. Below are {count} independent markdown documents, each wrapped in <doc id="..."> tags. Evaluate every document on its own; never compare content across documents.
+
+{instruction}
+
+**Expected Output**:
+Return only a single **JSON object** with exactly these keys: {keys}.
+Each key maps to the JSON list for that document, where each element has these fields:
+{fields}
+
+Do not use triple quotes or code fences to wrap the JSON output.
+
+{documents}
+"""
+
+
+async def _prepare(dimension, markdown: str):
+    """(content sent for this document, triage routing or None)"""
+    routing = await triage(dimension, markdown)
+    if routing is None:
+        return markdown, None
+    return TRIAGE[dimension.slug][2].join(routing[0]), routing
+
+
+def build_packed_prompt(dimension, contents):
+    keys = [f"doc_{i}" for i in range(1, len(contents) + 1)]
+    instruction, fields = FUSED_INSTRUCTIONS[dimension.slug]
+    documents = "\n\n".join(f'<doc id="{key}">\n{content}\n</doc>' for key, content in zip(keys, contents))
+    prompt = PROMPT_TEMPLATE.format(
+        count=len(contents),
+        instruction=instruction,
+        keys=", ".join(f'"{key}"' for key in keys),
+        fields=fields,
+        documents=documents,
+    )
+    schema = {
+        "type": "OBJECT",
+        "properties": {key: response_schema(dimension.spec) for key in keys},
+        "required": keys,
+    }
+    return keys, prompt, {**json_config(), "responseSchema": schema}
+
+
+async def evaluate_packed(dimension, markdowns):
+    """Evaluate one dimension for several small documents with a single call.
+
+    Returns one result per document, in order, shaped exactly like
+    dimension.evaluate's. Documents the packed answer lost or cut short are
+    completed through the agent's own prompt; if the answer is unusable every
+    document falls back to its own call.
+    """
+    async def packed():
+        prepared = await asyncio.gather(*(_prepare(dimension, markdown) for markdown in markdowns))
+        # Documents with nothing left to check after triage are not sent
+        sent = [i for i, (content, _) in enumerate(prepared) if content.strip()]
+        results = {}
+        clean = True
+        if sent:
+            keys, prompt, config = build_packed_prompt(dimension, [prepared[i][0] for i in sent])
+            recorder.inc("dq_packed_calls_total", dimension=dimension.slug)
+            recorder.inc("dq_packed_documents_total", len(sent), dimension=dimension.slug)
+            response = await gemini_flash(prompt, dimension=dimension.slug, generation_config=config,
+                                          shape=f"packed:{dimension.slug}")
+            try:
+                value, clean = parse_response(response, dimension.slug)
+                if not isinstance(value, dict):
+                    raise ValueError("expected a JSON object keyed by document")
+            except ValueError as e:
+                logger.warning(f"⚠️ Packed {dimension.slug} answer unusable ({e}), evaluating documents one by one")
+                return list(await asyncio.gather(*(dimension.evaluate(markdown) for markdown in markdowns)))
+            results = {i: value.get(key) for i, key in zip(sent, keys)}
+
+        async def finish(i, markdown):
+            content, routing = prepared[i]
+            items = results.get(i)
+            details = []
+            if content.strip():
+                details = await complete_details(
+                    items if isinstance(items, list) else [],
+                    clean and isinstance(items, list),
+                    content, dimension.spec, dimension.build_prompt,
+                )
+            if routing is None:
+                return dimension.summarize(details)
+            return summarize_triaged(dimension, details, routing)
+
+        return list(await asyncio.gather(*(finish(i, markdown) for i, markdown in enumerate(markdowns))))
+
+    packed.__name__ = f"packed_{dimension.slug}"
+    return await instrument_agent(dimension.slug)(packed)()
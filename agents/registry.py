@@ -0,0 +1,33 @@
+from collections import namedtuple
+from agents.accuracy_agent import evaluate_accuracy, stream_accuracy, summarize_accuracy, build_accuracy_prompt, SPEC as ACCURACY_SPEC, PREPROCESS as ACCURACY_PREPROCESS
+from agents.completeness_agent import evaluate_completeness, stream_completeness, summarize_completeness, build_completeness_prompt, SPEC as COMPLETENESS_SPEC, PREPROCESS as COMPLETENESS_PREPROCESS
+from agents.consistency_agent import evaluate_consistency, stream_consistency, summarize_consistency, build_consistency_prompt, SPEC as CONSISTENCY_SPEC, PREPROCESS as CONSISTENCY_PREPROCESS
+from agents.timeliness_agent import evaluate_timeliness, stream_timeliness, summarize_timeliness, build_timeliness_prompt, SPEC as TIMELINESS_SPEC, PREPROCESS as TIMELINESS_PREPROCESS
+from agents.uniqueness_agent import evaluate_uniqueness, summarize_uniqueness, build_uniqueness_prompt, SPEC as UNIQUENESS_SPEC, PREPROCESS as UNIQUENESS_PREPROCESS
+from agents.semanticoherence_agent import evaluate_semantic_coherence, stream_semantic_coherence, summarize_semantic_coherence, build_semantic_coherence_prompt, SPEC as SEMANTIC_COHERENCE_SPEC, PREPROCESS as SEMANTIC_COHERENCE_PREPROCESS
+
+# name:         key used in evaluate_all results and the rendered report
+# slug:         machine name (cache TTLs, JSONL output, stored indexes)
+# stream:       markdown -> async iterator of `details` items as they are generated
+#               (None when the agent cannot stream, e.g. local uniqueness)
+# build_prompt: markdown -> the agent's full prompt (used for token accounting)
+# unit_key:     field of each `details` item holding the evaluated text
+# verdict_key:  boolean field of each `details` item
+# granularity:  "sentence" / "paragraph" for per-unit agents, "document" otherwise
+# corpus_aware: checks the whole document locally against a corpus index; takes a
+#               doc_id and is never windowed, fused or evaluated incrementally
+# spec:         core.responses.DetailSpec used to constrain, salvage and re-ask output
+# preprocess:   (fn, args) CPU stages the agent runs with run_cpu on the text it is
+#               given, precomputed in one worker call per document
+Dimension = namedtuple("Dimension", "name slug evaluate stream summarize build_prompt unit_key verdict_key granularity corpus_aware spec preprocess")
+
+DIMENSIONS = {
+    d.name: d for d in (
+        Dimension("Accuracy", "accuracy", evaluate_accuracy, stream_accuracy, summarize_accuracy, build_accuracy_prompt, "fact", "is_true", "sentence", False, ACCURACY_SPEC, ACCURACY_PREPROCESS),
+        Dimension("Completeness", "completeness", evaluate_completeness, stream_completeness, summarize_completeness, build_completeness_prompt, "section", "is_complete", "document", False, COMPLETENESS_SPEC, COMPLETENESS_PREPROCESS),
+        Dimension("Consistency", "consistency", evaluate_consistency, stream_consistency, summarize_consistency, build_consistency_prompt, "unit", "is_consistent", "paragraph", False, CONSISTENCY_SPEC, CONSISTENCY_PREPROCESS),
+        Dimension("timeliness", "timeliness", evaluate_timeliness, stream_timeliness, summarize_timeliness, build_timeliness_prompt, "unit", "is_timely", "paragraph", False, TIMELINESS_SPEC, TIMELINESS_PREPROCESS),
+        Dimension("uniqueness", "uniqueness", evaluate_uniqueness, None, summarize_uniqueness, build_uniqueness_prompt, "sentence", "is_unique", "sentence", True, UNIQUENESS_SPEC, UNIQUENESS_PREPROCESS),
+        Dimension("semantic coherence", "semantic_coherence", evaluate_semantic_coherence, stream_semantic_coherence, summarize_semantic_coherence, build_semantic_coherence_prompt, "segment", "is_coherent", "document", False, SEMANTIC_COHERENCE_SPEC, SEMANTIC_COHERENCE_PREPROCESS),
+    )
+}
@@ -1,5 +1,14 @@
 import json
+import logging
 from core.gemini_client import gemini_flash
+from core.instrumentation import instrument_agent
+from core.responses import DetailSpec, json_config, resolve_details, parse_failure
+from core.streaming import stream_json_array
+
+logger = logging.getLogger(__name__)
+
+SPEC = DetailSpec("semantic_coherence", "segment", "is_coherent", "issue", "document")
+PREPROCESS = ()
 
 PROMPT_TEMPLATE = """
 You are a world-class data quality expert with deep expertise in textual coherence and semantics. You have been tasked with evaluating the **semantic coherence** of the given markdown content.
@@ -29,23 +38,14 @@ Markdown content to analyze:
 \"\"\"{content}\"\"\"
 """
 
-async def evaluate_semantic_coherence(markdown: str):
-    prompt = PROMPT_TEMPLATE.format(content=markdown)
-    response = await gemini_flash(prompt)
-
-    try:
-        results = json.loads(response)
-    except Exception as e:
-        return f"❌ Failed to parse Gemini response as JSON:\n{response}\nError: {e}"
+def build_semantic_coherence_prompt(markdown: str):
+    return PROMPT_TEMPLATE.format(content=markdown)
 
+def summarize_semantic_coherence(results):
     total = len(results)
     incoherent_count = sum(1 for item in results if item.get("is_coherent") is False)
     score = round(1 - (incoherent_count / total), 2) if total > 0 else 0.0
 
-    print("\n🔎 Semantic Coherence Agent Output:")
-    print(json.dumps(results, indent=2))
-    print(f"\n✅ Calculated Semantic Coherence Score: 1 - ({incoherent_count}/{total}) = {score}\n")
-
     return {
         "score": score,
         "total_checks": total,
@@ -53,3 +53,25 @@ async def evaluate_semantic_coherence(markdown: str):
         "incoherent_checks": incoherent_count,
         "details": results
     }
+
+def stream_semantic_coherence(markdown: str):
+    """Async iterator over the semantic coherence details as Gemini generates them"""
+    return stream_json_array(build_semantic_coherence_prompt(markdown), "semantic_coherence", json_config(SPEC))
+
+@instrument_agent("semantic_coherence")
+async def evaluate_semantic_coherence(markdown: str):
+    prompt = build_semantic_coherence_prompt(markdown)
+    response = await gemini_flash(prompt, dimension="semantic_coherence", generation_config=json_config(SPEC))
+
+    try:
+        results = await resolve_details(response, markdown, SPEC, build_semantic_coherence_prompt)
+    except Exception as e:
+        return parse_failure("semantic_coherence", response, e)
+
+    summary = summarize_semantic_coherence(results)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n🔎 Semantic Coherence Agent Output:\n" + json.dumps(results, indent=2))
+    logger.info(f"\n✅ Calculated Semantic Coherence Score: 1 - ({summary['incoherent_checks']}/{summary['total_checks']}) = {summary['score']}\n")
+
+    return summary
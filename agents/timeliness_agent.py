@@ -1,5 +1,21 @@
 import json
+import logging
 from core.gemini_client import gemini_flash
+from core.instrumentation import instrument_agent
+from core.responses import DetailSpec, json_config, resolve_details, parse_failure
+from core.streaming import stream_json_array
+from core.pipeline import run_cpu
+from core.triage import triage_units, triage_report, has_time_reference
+
+logger = logging.getLogger(__name__)
+
+SPEC = DetailSpec("timeliness", "unit", "is_timely", "issue", "paragraph")
+
+# Paragraphs triage routes away from the LLM are scored by this rule instead
+DEFAULT_RULE = "no temporal expression, so nothing can be outdated; not scored (a document without any scores 1.0)"
+
+# run_cpu stages over the text this agent is given, as (fn, args)
+PREPROCESS = ((triage_units, ("paragraph", has_time_reference)),)
 
 PROMPT_TEMPLATE = """
 You are a world-class data quality expert with deep expertise in content evaluation and prompt design. Your task is to assess the **timeliness** of the provided markdown content.
@@ -33,22 +49,15 @@ Markdown content to analyze:
 \"\"\"{content}\"\"\"
 """
 
-async def evaluate_timeliness(markdown: str):
-    prompt = PROMPT_TEMPLATE.format(content=markdown)
-    response = await gemini_flash(prompt)
-
-    try:
-        results = json.loads(response)
-    except Exception as e:
-        return f"❌ Failed to parse Gemini response as JSON:\n{response}\nError: {e}"
+def build_timeliness_prompt(markdown: str):
+    checked, _ = triage_units(markdown, "paragraph", has_time_reference)
+    return PROMPT_TEMPLATE.format(content="\n\n".join(checked)) if checked else ""
 
+def summarize_timeliness(results):
     total = len(results)
     outdated = sum(1 for item in results if item.get("is_timely") is False)
-    score = round(1 - (outdated / total), 2) if total > 0 else 0.0
-
-    print("\n🔎 Timeliness Agent Output:")
-    print(json.dumps(results, indent=2))
-    print(f"\n✅ Calculated Timeliness Score: 1 - ({outdated}/{total}) = {score}\n")
+    # Without any time-aware unit there is nothing that could be outdated
+    score = round(1 - (outdated / total), 2) if total > 0 else 1.0
 
     return {
         "score": score,
@@ -57,3 +66,35 @@ async def evaluate_timeliness(markdown: str):
         "outdated_units": outdated,
         "details": results
     }
+
+async def stream_timeliness(markdown: str):
+    """Async iterator over the timeliness details as Gemini generates them"""
+    checked, skipped = await run_cpu(triage_units, markdown, "paragraph", has_time_reference, stage="triage")
+    triage_report("timeliness", checked, skipped, DEFAULT_RULE)
+    if checked:
+        prompt = PROMPT_TEMPLATE.format(content="\n\n".join(checked))
+        async for item in stream_json_array(prompt, "timeliness", json_config(SPEC)):
+            yield item
+
+@instrument_agent("timeliness")
+async def evaluate_timeliness(markdown: str):
+    # Only paragraphs with a temporal expression can be outdated
+    checked, skipped = await run_cpu(triage_units, markdown, "paragraph", has_time_reference, stage="triage")
+    results = []
+    if checked:
+        content = "\n\n".join(checked)
+        response = await gemini_flash(PROMPT_TEMPLATE.format(content=content), dimension="timeliness", generation_config=json_config(SPEC))
+
+        try:
+            results = await resolve_details(response, content, SPEC, build_timeliness_prompt)
+        except Exception as e:
+            return parse_failure("timeliness", response, e)
+
+    summary = summarize_timeliness(results)
+    summary["triage"] = triage_report("timeliness", checked, skipped, DEFAULT_RULE)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n🔎 Timeliness Agent Output:\n" + json.dumps(results, indent=2))
+    logger.info(f"\n✅ Calculated Timeliness Score: 1 - ({summary['outdated_units']}/{summary['total_units']}) = {summary['score']}\n")
+
+    return summary
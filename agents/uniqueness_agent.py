@@ -1,5 +1,18 @@
+import os
 import json
+import asyncio
+import logging
+import threading
 from core.gemini_client import gemini_flash
+from core.instrumentation import instrument_agent
+from core.responses import DetailSpec, json_config, parse_response, resolve_details, parse_failure, is_unavailable
+from core.md_parser import parse_markdown, SENTENCE, TABLE_ROW
+from core.dedup import MinHasher, find_duplicates, get_corpus_index
+from core.pipeline import run_cpu
+
+logger = logging.getLogger(__name__)
+
+SPEC = DetailSpec("uniqueness", "sentence", "is_unique", "issue", "sentence")
 
 PROMPT_TEMPLATE = """
 You are a world-class data quality expert with deep expertise in content evaluation and prompt design. You have been tasked with evaluating the **uniqueness** of the given markdown content.
@@ -31,23 +44,122 @@ Markdown content to analyze:
 \"\"\"{content}\"\"\"
 """
 
-async def evaluate_uniqueness(markdown: str):
-    prompt = PROMPT_TEMPLATE.format(content=markdown)
-    response = await gemini_flash(prompt)
+CONFIRM_PROMPT_TEMPLATE = """
+You are a world-class data quality expert. Each numbered pair below contains two passages that share a lot of wording.
+For each pair, decide whether passage B is **redundant** with passage A, i.e. it repeats the same fact, idea or statement (possibly in different words) without adding new information.
+
+**Expected Output**:
+Return only a **JSON list**, where each element contains:
+- "pair": The pair number
+- "is_duplicate": Boolean true/false
+- "reason": A brief explanation
+
+Do not use triple quotes to wrap the JSON output.
+
+Pairs to analyze:
+{pairs}
+"""
+
+# "local" (default): MinHash/LSH near-duplicate detection, with only ambiguous
+# pairs confirmed by Gemini. "llm": send the whole document to Gemini.
+BACKEND = os.getenv("UNIQUENESS_BACKEND", "local")
+
+_hasher = MinHasher()
+# The corpus index is one SQLite connection shared by every document in flight
+_index_lock = threading.Lock()
+
+
+def local_redundancy(markdown: str):
+    """Classify every sentence/table row of `markdown` against the rest of the
+    document. Pure CPU work, so it can run in a worker process.
+
+    Returns the unit texts, a list of (is_unique, issue) verdicts, the
+    ambiguous candidates as (unit index, other text, similarity) tuples and
+    the units' MinHash signatures. Sentences inside a paragraph that
+    near-duplicates an earlier one are flagged as well.
+    """
+    doc = parse_markdown(markdown)
+    nodes = doc.iter(SENTENCE, TABLE_ROW)
+    units = [n.text for n in nodes]
+    verdicts = [(True, None)] * len(units)
+    ambiguous = []
+
+    signatures = _hasher.signatures(units)
+    for i, (j, score, status) in find_duplicates(units, _hasher).items():
+        if status == "ambiguous":
+            ambiguous.append((i, units[j], score))
+        else:
+            verdicts[i] = (False, f"{status} duplicate (similarity {score:.2f}) of: {units[j][:120]}")
+
+    blocks = doc.blocks()
+    block_position = {node.index: k for k, node in enumerate(blocks)}
+    block_matches = find_duplicates([b.text for b in blocks], _hasher)
+    for i, node in enumerate(nodes):
+        k = block_position.get(doc.parents[node.index])
+        if k in block_matches and verdicts[i][0]:
+            j, score, status = block_matches[k]
+            if status != "ambiguous":
+                verdicts[i] = (False, f"part of a paragraph that {status}-duplicates: {blocks[j].text[:120]}")
+
+    return units, verdicts, ambiguous, signatures
+
+
+# run_cpu stages over the text this agent is given, as (fn, args)
+PREPROCESS = ((local_redundancy, ()),) if BACKEND != "llm" else ()
 
-    try:
-        results = json.loads(response)
-    except Exception as e:
-        return f"❌ Failed to parse Gemini response as JSON:\n{response}\nError: {e}"
 
+def corpus_redundancy(index, doc_id: str, units, verdicts, ambiguous, signatures):
+    """Check the units still considered unique against the documents registered
+    before this one in the corpus index, then (re-)index this document's units"""
+    # The local results may be shared with other callers (run_cpu memoizes them)
+    verdicts, ambiguous = list(verdicts), list(ambiguous)
+    with _index_lock:
+        rank = index.register([doc_id])[doc_id]
+        flagged = {i for i, _, _ in ambiguous}
+        for i, text in enumerate(units):
+            if not verdicts[i][0] or i in flagged:
+                continue
+            match = index.query(text, signatures[i], before=rank)
+            if match is None:
+                continue
+            other_doc, other, score, status = match
+            if status == "ambiguous":
+                ambiguous.append((i, other, score))
+            else:
+                verdicts[i] = (False, f"{status} duplicate (similarity {score:.2f}) of content in {other_doc}")
+        index.add(doc_id, units, signatures)
+    return verdicts, ambiguous
+
+
+def find_redundancy(markdown: str, doc_id: str = None):
+    """local_redundancy, plus the corpus-wide check when a `doc_id` is given and
+    a corpus index is open; returns the unit texts, verdicts and ambiguous candidates"""
+    units, verdicts, ambiguous, signatures = local_redundancy(markdown)
+    index = get_corpus_index() if doc_id else None
+    if index is not None:
+        verdicts, ambiguous = corpus_redundancy(index, doc_id, units, verdicts, ambiguous, signatures)
+    return units, verdicts, ambiguous
+
+
+def build_uniqueness_prompt(markdown: str):
+    if BACKEND == "llm":
+        return PROMPT_TEMPLATE.format(content=markdown)
+    units, _, ambiguous = find_redundancy(markdown)
+    return build_confirm_prompt(units, ambiguous) if ambiguous else ""
+
+
+def build_confirm_prompt(units, ambiguous):
+    pairs = "\n\n".join(
+        f"{n}. A: {other}\n   B: {units[i]}" for n, (i, other, _) in enumerate(ambiguous, 1)
+    )
+    return CONFIRM_PROMPT_TEMPLATE.format(pairs=pairs)
+
+
+def summarize_uniqueness(results):
     total = len(results)
     redundant = sum(1 for item in results if item.get("is_unique") is False)
     score = round(1 - (redundant / total), 2) if total > 0 else 0.0
 
-    print("\n🔎 Uniqueness Agent Output:")
-    print(json.dumps(results, indent=2))
-    print(f"\n✅ Calculated Uniqueness Score: 1 - ({redundant}/{total}) = {score}\n")
-
     return {
         "score": score,
         "total_sentences": total,
@@ -55,3 +167,60 @@ async def evaluate_uniqueness(markdown: str):
         "redundant_sentences": redundant,
         "details": results
     }
+
+async def confirm_ambiguous(units, ambiguous):
+    """Ask Gemini about the ambiguous candidate pairs only; returns {unit index: (is_unique, issue)}"""
+    response = await gemini_flash(build_confirm_prompt(units, ambiguous), dimension="uniqueness",
+                                  generation_config=json_config(), shape="confirm:uniqueness")
+    try:
+        answers = {item.get("pair"): item for item in parse_response(response, "uniqueness")[0] if isinstance(item, dict)}
+    except Exception as e:
+        logger.warning(f"⚠️ Could not parse uniqueness confirmations, keeping ambiguous units as unique: {e}")
+        answers = {}
+
+    verdicts = {}
+    for n, (i, other, score) in enumerate(ambiguous, 1):
+        answer = answers.get(n, {})
+        if answer.get("is_duplicate") is True:
+            verdicts[i] = (False, f"semantic duplicate (similarity {score:.2f}): {answer.get('reason')}")
+    return verdicts
+
+async def evaluate_uniqueness_llm(markdown: str):
+    prompt = PROMPT_TEMPLATE.format(content=markdown)
+    response = await gemini_flash(prompt, dimension="uniqueness", generation_config=json_config(SPEC))
+
+    try:
+        results = await resolve_details(response, markdown, SPEC, lambda text: PROMPT_TEMPLATE.format(content=text))
+    except Exception as e:
+        return parse_failure("uniqueness", response, e)
+
+    return summarize_uniqueness(results)
+
+@instrument_agent("uniqueness")
+async def evaluate_uniqueness(markdown: str, doc_id: str = None):
+    if BACKEND == "llm":
+        summary = await evaluate_uniqueness_llm(markdown)
+        if is_unavailable(summary):
+            return summary
+        results = summary["details"]
+    else:
+        # MinHash runs in the worker pool and the SQLite corpus lookup in a
+        # thread, keeping the event loop free for the other agents' requests
+        units, verdicts, ambiguous, signatures = await run_cpu(local_redundancy, markdown, stage="uniqueness")
+        index = get_corpus_index() if doc_id else None
+        if index is not None:
+            verdicts, ambiguous = await asyncio.to_thread(corpus_redundancy, index, doc_id, units, verdicts, ambiguous, signatures)
+        if ambiguous:
+            confirmed = await confirm_ambiguous(units, ambiguous)
+            verdicts = [confirmed.get(i, verdict) for i, verdict in enumerate(verdicts)]
+        results = [
+            {"sentence": text, "is_unique": is_unique, "issue": issue}
+            for text, (is_unique, issue) in zip(units, verdicts)
+        ]
+        summary = summarize_uniqueness(results)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n🔎 Uniqueness Agent Output:\n" + json.dumps(results, indent=2))
+    logger.info(f"\n✅ Calculated Uniqueness Score: 1 - ({summary['redundant_sentences']}/{summary['total_sentences']}) = {summary['score']}\n")
+
+    return summary
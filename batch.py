@@ -0,0 +1,244 @@
+# python batch.py docs/ "reports/**/*.md" @manifest.txt --output results.jsonl
+import os
+import sys
+import glob
+import json
+import time
+import asyncio
+import argparse
+from agents.registry import DIMENSIONS
+from core.incremental import DocumentIndex
+from core.gemini_client import close_client
+from core.pipeline import loaded, seed, shutdown_pool
+from core.resultstore import ResultWriter
+from core.dedup import open_corpus_index
+from core import instrumentation
+from evaluate import build_tasks, collect_results, preprocessing, run_with_deadline, task_deadline, MODES, WINDOW_TOKENS, DIMENSION_DEADLINE
+
+
+def collect_documents(inputs, pattern="*.md"):
+    """Expand directories, glob patterns and @manifest files into a sorted, de-duplicated path list"""
+    paths = []
+    for item in inputs:
+        if item.startswith("@"):
+            with open(item[1:], "r", encoding="utf-8") as f:
+                manifest = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+            paths.extend(collect_documents(manifest, pattern))
+        elif os.path.isdir(item):
+            paths.extend(glob.glob(os.path.join(item, "**", pattern), recursive=True))
+        elif glob.has_magic(item):
+            paths.extend(glob.glob(item, recursive=True))
+        else:
+            paths.append(item)
+    return sorted({os.path.normpath(p) for p in paths if os.path.isfile(p)})
+
+
+class Checkpoint:
+    """Append-only record of finished documents as `path<TAB>sha256` lines"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    doc, _, digest = line.rstrip("\n").partition("\t")
+                    self.done.setdefault(doc, set()).add(digest)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, doc, digest):
+        return digest in self.digests(doc)
+
+    def digests(self, doc):
+        return self.done.get(doc, set())
+
+    def mark(self, doc, digest):
+        self.done.setdefault(doc, set()).add(digest)
+        self.file.write(f"{doc}\t{digest}\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Progress:
+    def __init__(self, total, every=5.0):
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.every = every
+        self.started = time.monotonic()
+        self.last = 0.0
+
+    def docs_per_minute(self):
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed * 60 if elapsed > 0 else 0.0
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last < self.every:
+            return
+        self.last = now
+        finished = self.done + self.skipped + self.failed
+        print(
+            f"📈 {finished}/{self.total} documents "
+            f"({self.done} scored, {self.skipped} skipped, {self.failed} failed) "
+            f"- {self.docs_per_minute():.1f} docs/min",
+            file=sys.stderr,
+        )
+
+
+async def score_document(path, markdown, semaphore, incremental=False, mode="fanout", window_tokens=WINDOW_TOKENS, deadline=None):
+    doc_id = os.path.abspath(path)
+    index = DocumentIndex(doc_id) if incremental else None
+
+    async def run(name, coro):
+        # The deadline starts once a slot is free, not while queued behind other documents
+        async with semaphore:
+            return await run_with_deadline(name, coro, task_deadline(name, mode, deadline))
+
+    tasks = build_tasks(markdown, index, mode, window_tokens, doc_id)
+    results = await asyncio.gather(*(run(name, coro) for name, coro in tasks.items()))
+    if index is not None:
+        index.save()
+    return collect_results(dict(zip(tasks.keys(), results)))
+
+
+def _failed(output):
+    # Unavailable dimensions carry an "error", so they are retried next run
+    return "error" in output
+
+
+async def run_batch(paths, output_path, checkpoint_path, concurrency=16, documents_in_flight=None, incremental=False, mode="fanout", window_tokens=WINDOW_TOKENS, deadline=None, store_path=None, corpus_index=None):
+    """Score `paths` x dimensions and stream a JSONL record per document.
+
+    Documents are fingerprinted, decoded, split and triaged in one call per
+    document in the preprocessing worker pool and handed to the scorers on
+    the event loop through a bounded queue.
+    `concurrency` caps in-flight dimension calls across all documents;
+    documents with a failed dimension are written but not checkpointed so
+    the next run retries them. With `store_path` every unit verdict is also
+    appended to that columnar result store. With `corpus_index` uniqueness also
+    checks every document against the ones indexed before it there; new
+    documents are indexed in path order, so shared passages are flagged in the
+    same documents whatever order they finish in.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    if corpus_index:
+        open_corpus_index(corpus_index).register([os.path.abspath(p) for p in paths])
+    # Enough documents in flight to keep every dimension slot busy
+    workers = documents_in_flight or max(1, concurrency // len(DIMENSIONS) + 1)
+    queue = asyncio.Queue(workers)
+
+    checkpoint = Checkpoint(checkpoint_path)
+    progress = Progress(len(paths))
+    out = open(output_path, "a", encoding="utf-8")
+    store = ResultWriter(store_path) if store_path else None
+    stages = preprocessing(mode, window_tokens, incremental)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            path, digest, markdown = item.path, item.digest, item.markdown
+            if item.error is None and checkpoint.is_done(path, digest):
+                progress.skipped += 1
+                progress.report()
+                continue
+            started = time.monotonic()
+            error = item.error
+            if error is None:
+                try:
+                    seed(markdown, item.computed, stages["split"])
+                    results = await score_document(path, markdown, semaphore, incremental, mode, window_tokens, deadline)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+            if error is not None:
+                # One unreadable or crashing document must not take the batch down with it
+                print(f"⚠️ Could not score {path}: {error}", file=sys.stderr)
+                record = {"doc": path, "sha256": digest, "elapsed": round(time.monotonic() - started, 3), "error": error}
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                progress.failed += 1
+                progress.report()
+                continue
+            record = {
+                "doc": path,
+                "sha256": digest,
+                "elapsed": round(time.monotonic() - started, 3),
+                "scores": {
+                    dim: output.get("score")
+                    for dim, output in results.items()
+                },
+                "results": results,
+            }
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if store is not None:
+                store.add_document(path, markdown, results)
+
+            if any(_failed(output) for output in results.values()):
+                progress.failed += 1
+            else:
+                checkpoint.mark(path, digest)
+                progress.done += 1
+            progress.report()
+
+    try:
+        await asyncio.gather(loaded(paths, queue, workers, checkpoint.digests, **stages), *(worker() for _ in range(workers)))
+    finally:
+        out.close()
+        if store is not None:
+            store.close()
+        checkpoint.close()
+        await close_client()
+        shutdown_pool()
+    progress.report(force=True)
+    return progress
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a corpus of markdown files into a JSONL report")
+    parser.add_argument("inputs", nargs="+", help="files, directories, glob patterns or @manifest files")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--pattern", default="*.md", help="file pattern used when walking directories")
+    parser.add_argument("--concurrency", type=int, default=16, help="maximum in-flight dimension calls")
+    parser.add_argument("--documents", type=int, help="maximum documents in flight")
+    parser.add_argument("--incremental", action="store_true", help="reuse per-unit verdicts from previous runs (whole-document dimensions only when the document is unchanged)")
+    parser.add_argument("--mode", choices=MODES, default="fanout", help="fanout, fused or hybrid evaluation")
+    parser.add_argument("--window-tokens", type=int, default=WINDOW_TOKENS,
+                        help="split documents larger than this many tokens into parallel windows (0 disables)")
+    parser.add_argument("--store", help="also append one row per evaluated unit to this columnar result store (see report.py)")
+    parser.add_argument("--corpus-index", default=os.getenv("UNIQUENESS_INDEX_PATH"),
+                        help="MinHash index to check uniqueness across the corpus against (default: UNIQUENESS_INDEX_PATH; unset checks each document on its own)")
+    parser.add_argument("--deadline", type=float, default=DIMENSION_DEADLINE,
+                        help="seconds each dimension may take before it is reported unavailable")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.setup_from_args(args)
+
+    paths = collect_documents(args.inputs, args.pattern)
+    if not paths:
+        print("❌ No documents matched the given inputs")
+        exit(1)
+
+    print(f"🚀 Scoring {len(paths)} documents x {len(DIMENSIONS)} dimensions")
+    progress = asyncio.run(run_batch(
+        paths,
+        args.output,
+        args.checkpoint or args.output + ".checkpoint",
+        concurrency=args.concurrency,
+        documents_in_flight=args.documents,
+        incremental=args.incremental,
+        mode=args.mode,
+        window_tokens=args.window_tokens,
+        deadline=args.deadline,
+        store_path=args.store,
+        corpus_index=args.corpus_index,
+    ))
+    print(f"✅ Batch completed: {progress.done} scored, {progress.skipped} skipped, "
+          f"{progress.failed} failed. See '{args.output}'.")
+    instrumentation.export_from_args(args)
@@ -0,0 +1,83 @@
+# python benchmarks/bench_fused.py sample.md [--live --repeat 3]
+"""Compare prompt tokens (and optionally wall time) of fanout, hybrid and fused evaluation."""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.registry import DIMENSIONS
+from agents.fused_agent import build_fused_prompt
+from core.gemini_client import estimate_tokens
+
+
+def prompt_tokens(markdown, mode):
+    from evaluate import fused_dimensions
+
+    fused = fused_dimensions(mode)
+    calls, tokens = 0, 0
+    for name, d in DIMENSIONS.items():
+        prompt = d.build_prompt(markdown) if name not in fused else ""
+        # Local agents (e.g. uniqueness without ambiguous pairs) make no call at all
+        if prompt:
+            calls += 1
+            tokens += estimate_tokens(prompt)
+    if fused:
+        tokens += estimate_tokens(build_fused_prompt(markdown, [DIMENSIONS[name] for name in fused]))
+        calls += 1
+    return calls, tokens
+
+
+async def wall_time(markdown, mode, repeat):
+    from evaluate import evaluate_all
+    from core.gemini_client import close_client
+
+    timings = []
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await evaluate_all(markdown, mode=mode)
+            timings.append(time.perf_counter() - started)
+    finally:
+        await close_client()
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--live", action="store_true", help="also measure wall time against GEMINI_API_URL")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.live:
+        # Cached responses would make every mode look free
+        os.environ["GEMINI_CACHE"] = "0"
+
+    report = []
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            markdown = f.read()
+        document_tokens = estimate_tokens(markdown)
+        for mode in ("fanout", "hybrid", "fused"):
+            calls, tokens = prompt_tokens(markdown, mode)
+            row = {
+                "file": path,
+                "mode": mode,
+                "calls": calls,
+                "prompt_tokens": tokens,
+                "tokens_per_document_token": round(tokens / document_tokens, 2),
+            }
+            if args.live:
+                timings = asyncio.run(wall_time(markdown, mode, args.repeat))
+                row["wall_time_s"] = [round(t, 3) for t in timings]
+                row["wall_time_min_s"] = round(min(timings), 3)
+            report.append(row)
+
+    baseline = {row["file"]: row["prompt_tokens"] for row in report if row["mode"] == "fanout"}
+    for row in report:
+        row["token_ratio_vs_fanout"] = round(row["prompt_tokens"] / baseline[row["file"]], 3)
+        print(json.dumps(row))
@@ -0,0 +1,67 @@
+# python benchmarks/bench_parser.py [files...] --size-mb 50
+"""Throughput (MB/s) of the structural parser against the old regex chunk_markdown."""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.md_parser import parse_bytes, parse_file, SENTENCE
+
+
+def legacy_chunk_markdown(markdown: str):
+    # The original naive splitter, kept here as the baseline
+    sentences = re.split(r'(?<=[.!?])\s+', markdown)
+    return "\n".join(s.strip() for s in sentences if len(s.strip()) > 10)
+
+
+def build_corpus(files, size_mb):
+    seed = b"\n\n".join(open(path, "rb").read() for path in files)
+    repeats = max(1, int(size_mb * 1024 * 1024 / len(seed)))
+    return b"\n\n".join([seed] * repeats)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="*", default=["sample.md"])
+    parser.add_argument("--size-mb", type=float, default=20.0, help="size of the synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.files, args.size_mb)
+    megabytes = len(corpus) / (1024 * 1024)
+    text = corpus.decode("utf-8")
+
+    legacy_time, legacy = timed(lambda: legacy_chunk_markdown(text), args.repeat)
+    parse_time, doc = timed(lambda: parse_bytes(corpus), args.repeat)
+
+    with tempfile.NamedTemporaryFile(suffix=".md", delete=False) as f:
+        f.write(corpus)
+    try:
+        mmap_time, _ = timed(lambda: parse_file(f.name), args.repeat)
+    finally:
+        os.unlink(f.name)
+
+    print(json.dumps({
+        "corpus_mb": round(megabytes, 2),
+        "legacy_chunk_markdown_mb_s": round(megabytes / legacy_time, 2),
+        "parse_bytes_mb_s": round(megabytes / parse_time, 2),
+        "parse_file_mmap_mb_s": round(megabytes / mmap_time, 2),
+        "legacy_sentences": legacy.count("\n") + 1,
+        "parsed_sentences": sum(1 for k in doc.kinds if k == SENTENCE),
+        "parsed_nodes": len(doc),
+    }, indent=2))
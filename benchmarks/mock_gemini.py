@@ -0,0 +1,336 @@
+# python benchmarks/mock_gemini.py --port 8089 --latency lognormal:-1.2,0.5 --error-rate 0.05
+"""Offline stand-in for the Gemini generateContent endpoint.
+
+Speaks the request/response JSON shape the client uses, and the server-sent
+events of streamGenerateContent, with configurable latency, injected 429/5xx
+errors, malformed JSON, cut-off streams and canned per-agent answers derived
+from the prompt, so evaluate_all and the CLIs can be benchmarked without
+network access or an API key.
+"""
+import os
+import re
+import sys
+import json
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass, field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.md_parser import parse_markdown, SENTENCE, TABLE_ROW
+
+# Bold marker in each agent prompt -> (unit field, verdict field, extra field, unit granularity)
+AGENT_MARKERS = {
+    "**accuracy**": ("accuracy", "fact", "is_true", "reason", "sentence"),
+    "**completeness**": ("completeness", "section", "is_complete", "missing_info", "block"),
+    "**consistency**": ("consistency", "unit", "is_consistent", "issue", "block"),
+    "**timeliness**": ("timeliness", "unit", "is_timely", "issue", "block"),
+    "**uniqueness**": ("uniqueness", "sentence", "is_unique", "issue", "sentence"),
+    "**semantic coherence**": ("semantic_coherence", "segment", "is_coherent", "issue", "block"),
+}
+SLUG_FIELDS = {slug: (unit, verdict, extra, granularity) for slug, unit, verdict, extra, granularity in AGENT_MARKERS.values()}
+
+CONTENT = re.compile(r'"""(.*?)""\"?\s*$', re.S)
+PACKED_DOC = re.compile(r'<doc id="(\w+)">\n(.*?)\n</doc>', re.S)
+
+
+def parse_latency(spec: str):
+    """'fixed:0.2', 'uniform:0.1,0.5', 'normal:0.3,0.05' or 'lognormal:mu,sigma' -> sampler"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+@dataclass
+class MockConfig:
+    latency: str = "fixed:0.05"
+    error_rate: float = 0.0
+    error_statuses: tuple = (429, 500, 503)
+    retry_after: float = 0.1
+    malformed_rate: float = 0.0
+    stream_chunks: int = 8
+    chunk_delay: float = 0.01
+    cut_rate: float = 0.0
+    true_rate: float = 0.85
+    canned_dir: str = None
+    seed: int = 0
+
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    by_agent: dict = field(default_factory=dict)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    errors_injected: int = 0
+    malformed_injected: int = 0
+    streams_cut: int = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def _verdict(text: str, true_rate: float) -> bool:
+    # Deterministic per unit so repeated runs produce identical scores
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF < true_rate
+
+
+def _units(content: str, granularity: str):
+    doc = parse_markdown(content)
+    if granularity == "sentence":
+        return [n.text for n in doc.iter(SENTENCE, TABLE_ROW)]
+    return [n.text for n in doc.blocks()]
+
+
+def _agent_items(slug: str, content: str, true_rate: float):
+    unit, verdict, extra, granularity = SLUG_FIELDS[slug]
+    items = []
+    for text in _units(content, granularity):
+        ok = _verdict(slug + text, true_rate)
+        items.append({unit: text, verdict: ok, extra: None if ok else "mock issue"})
+    return items
+
+
+def canned_response(prompt: str, config: MockConfig):
+    """Return (agent name, response text) for a prompt"""
+    match = CONTENT.search(prompt)
+    content = match.group(1) if match else ""
+
+    if "Pairs to analyze" in prompt:
+        pairs = len(re.findall(r"^\d+\. A: ", prompt, re.M))
+        return "uniqueness_confirm", json.dumps([
+            {"pair": n, "is_duplicate": _verdict(f"pair{n}", 0.5), "reason": "mock confirmation"}
+            for n in range(1, pairs + 1)
+        ])
+
+    packed = PACKED_DOC.findall(prompt)
+    if packed:
+        slug = min((prompt.find(m), spec) for m, spec in AGENT_MARKERS.items() if m in prompt)[1][0]
+        return "packed", json.dumps({key: _agent_items(slug, doc, config.true_rate) for key, doc in packed})
+
+    keys_line = re.search(r"exactly these keys: (.*)\.", prompt)
+    if keys_line:
+        slugs = [s for s in re.findall(r'"(\w+)"', keys_line.group(1)) if s in SLUG_FIELDS]
+        return "fused", json.dumps({slug: _agent_items(slug, content, config.true_rate) for slug in slugs})
+
+    found = [(prompt.find(marker), spec) for marker, spec in AGENT_MARKERS.items() if marker in prompt]
+    if not found:
+        return "unknown", "[]"
+    slug = min(found)[1][0]
+    if config.canned_dir:
+        path = os.path.join(config.canned_dir, f"{slug}.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return slug, f.read()
+    return slug, json.dumps(_agent_items(slug, content, config.true_rate))
+
+
+class MockGeminiServer:
+    def __init__(self, config: MockConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self.host = host
+        self.port = port
+        self.rng = random.Random(self.config.seed)
+        self.latency = parse_latency(self.config.latency)
+        self.stats = MockStats()
+        self.server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1beta/models/gemini-mock:generateContent?key=mock"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, extra_headers, payload = await self.respond(request_line.decode("latin-1"), body)
+                if isinstance(payload, list):
+                    if not await self.write_stream(writer, payload):
+                        break
+                else:
+                    writer.write(self.encode(status, extra_headers, payload))
+                    await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def encode(status, headers, payload: bytes) -> bytes:
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+                   500: "Internal Server Error", 503: "Service Unavailable"}
+        lines = [f"HTTP/1.1 {status} {reasons.get(status, 'Error')}", f"Content-Length: {len(payload)}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload
+
+    async def write_stream(self, writer, events):
+        """Send server-sent events with chunked encoding; returns False if the stream was cut"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        cut = len(events) // 2 if self.rng.random() < self.config.cut_rate else None
+        for i, event in enumerate(events):
+            if i == cut:
+                # Drop the connection mid-stream without the terminating chunk
+                self.stats.streams_cut += 1
+                await writer.drain()
+                return False
+            data = b"data: " + json.dumps(event).encode("utf-8") + b"\r\n\r\n"
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+            if i < len(events) - 1:
+                await asyncio.sleep(self.config.chunk_delay)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return True
+
+    async def respond(self, request_line: str, body: bytes):
+        method, path, _ = request_line.split(" ", 2)
+        streaming = ":streamGenerateContent" in path
+        if method != "POST" or not (streaming or ":generateContent" in path):
+            return 404, {}, b'{"error": {"code": 404, "message": "not found"}}'
+
+        self.stats.requests += 1
+        await asyncio.sleep(self.latency(self.rng))
+
+        if self.rng.random() < self.config.error_rate:
+            self.stats.errors_injected += 1
+            status = self.rng.choice(self.config.error_statuses)
+            headers = {"Retry-After": str(self.config.retry_after)} if status in (429, 503) else {}
+            return status, headers, json.dumps({"error": {"code": status, "message": "injected"}}).encode()
+
+        try:
+            request = json.loads(body)
+            prompt = request["contents"][0]["parts"][0]["text"]
+        except (ValueError, KeyError, IndexError):
+            return 400, {}, b'{"error": {"code": 400, "message": "bad request"}}'
+
+        agent, text = canned_response(prompt, self.config)
+        if self.rng.random() < self.config.malformed_rate:
+            self.stats.malformed_injected += 1
+            text = "```json\n" + text[: max(1, len(text) // 2)]
+
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(text) // 4)
+        self.stats.by_agent[agent] = self.stats.by_agent.get(agent, 0) + 1
+        self.stats.prompt_tokens += prompt_tokens
+        self.stats.completion_tokens += completion_tokens
+
+        usage = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": completion_tokens,
+            "totalTokenCount": prompt_tokens + completion_tokens,
+        }
+        if streaming:
+            size = max(1, -(-len(text) // self.config.stream_chunks))
+            pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+            events = [{"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}}]} for piece in pieces]
+            events[-1]["candidates"][0]["finishReason"] = "STOP"
+            events[-1]["usageMetadata"] = usage
+            return 200, {}, events
+
+        return 200, {"Content-Type": "application/json"}, json.dumps({
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+            }],
+            "usageMetadata": usage,
+        }).encode("utf-8")
+
+
+def start_in_thread(config: MockConfig = None, host: str = "127.0.0.1", port: int = 0):
+    """Run a mock server on its own event loop thread; returns (server, stop function)"""
+    loop = asyncio.new_event_loop()
+    server = MockGeminiServer(config, host, port)
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return server, stop
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        retry_after=args.retry_after,
+        canned_dir=args.canned_dir,
+        stream_chunks=args.stream_chunks,
+        chunk_delay=args.chunk_delay,
+        cut_rate=args.cut_rate,
+        seed=args.seed,
+    )
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", default="fixed:0.05", help="fixed:S | uniform:A,B | normal:M,SD | lognormal:MU,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429/500/503")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of responses with broken JSON")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with 429/503")
+    parser.add_argument("--stream-chunks", type=int, default=8, help="events per streamGenerateContent response")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="seconds between streamed events")
+    parser.add_argument("--cut-rate", type=float, default=0.0, help="fraction of streams dropped halfway through")
+    parser.add_argument("--canned-dir", help="directory of <dimension>.json files returned verbatim")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    async def serve():
+        server = await MockGeminiServer(config_from_args(args), args.host, args.port).start()
+        print(f"🧪 Mock Gemini listening. Use GEMINI_API_URL={server.url}")
+        await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,200 @@
+# python benchmarks/run_benchmarks.py --sizes 2,20,100 --docs 20 --output bench_results.json
+"""Reproducible performance suite against the offline mock Gemini server.
+
+Drives evaluate_all in-process and the CLIs (main.py, batch.py) as
+subprocesses over synthetic corpora of several document sizes, and writes
+p50/p95/p99 latency, docs/sec, calls/doc, tokens/doc and peak RSS as JSON
+that can be diffed between versions.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.mock_gemini import start_in_thread, add_arguments, config_from_args
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def latency_summary(values):
+    return {f"p{q}": round(percentile(values, q), 4) for q in (50, 95, 99)}
+
+
+def synthetic_document(seed_paragraphs, size_kb, rng):
+    """Shuffle and perturb the seed paragraphs until the document reaches ~size_kb"""
+    parts, size, section = [], 0, 1
+    while size < size_kb * 1024:
+        if rng.random() < 0.15:
+            heading = f"#### Section {section}: {rng.choice(['Overview', 'Findings', 'Policy', 'Outlook'])}"
+            parts.append(heading)
+            section += 1
+        paragraph = rng.choice(seed_paragraphs)
+        # Perturb numbers so documents are not byte-identical (and not cache hits)
+        paragraph = "".join(str(rng.randint(0, 9)) if c.isdigit() and rng.random() < 0.3 else c for c in paragraph)
+        parts.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(parts) + "\n"
+
+
+def build_corpus(directory, seed_files, size_kb, count, seed):
+    rng = random.Random(seed + size_kb)
+    text = "\n\n".join(open(path, encoding="utf-8").read() for path in seed_files)
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip() and not p.startswith("#")]
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"doc_{size_kb}kb_{i:04d}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(synthetic_document(paragraphs, size_kb, rng))
+        paths.append(path)
+    return paths
+
+
+async def bench_evaluate_all(paths, concurrency, mode):
+    from evaluate import evaluate_all
+    from core.gemini_client import close_client
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(path):
+        with open(path, encoding="utf-8") as f:
+            markdown = f.read()
+        async with semaphore:
+            started = time.perf_counter()
+            await evaluate_all(markdown, mode=mode)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(p) for p in paths))
+    finally:
+        await close_client()
+    return latencies, time.perf_counter() - started
+
+
+def stats_delta(server, before):
+    after = server.stats.as_dict()
+    return {k: after[k] - before[k] for k in ("requests", "prompt_tokens", "completion_tokens", "errors_injected", "malformed_injected")}
+
+
+def run_cli(args, env):
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{completed.stderr[-2000:]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed-files", nargs="+", default=[os.path.join(ROOT, "sample.md")])
+    parser.add_argument("--sizes", default="2,20,100", help="document sizes in KB")
+    parser.add_argument("--docs", type=int, default=20, help="documents per size")
+    parser.add_argument("--concurrency", type=int, default=8, help="documents evaluated concurrently")
+    parser.add_argument("--mode", default="fanout", help="evaluate_all mode")
+    parser.add_argument("--skip-cli", action="store_true", help="only benchmark evaluate_all in-process")
+    parser.add_argument("--output", default="bench_results.json")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server, stop = start_in_thread(config_from_args(args))
+    workdir = tempfile.mkdtemp(prefix="dq_bench_")
+    env = dict(
+        os.environ,
+        GOOGLE_API_KEY="mock",
+        GEMINI_API_URL=server.url,
+        GEMINI_CACHE="0",
+        GEMINI_RPM="1000000",
+        GEMINI_TPM="1000000000",
+        INCREMENTAL_INDEX_DIR=os.path.join(workdir, "incremental"),
+        UNIQUENESS_INDEX_PATH=os.path.join(workdir, "minhash.sqlite"),
+    )
+    os.environ.update(env)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_rev": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                      capture_output=True, text=True).stdout.strip(),
+            "python": platform.python_version(),
+            "mode": args.mode,
+            "concurrency": args.concurrency,
+            "docs_per_size": args.docs,
+            "mock": config_from_args(args).__dict__,
+        },
+        "evaluate_all": [],
+        "cli": [],
+    }
+
+    try:
+        for size_kb in [int(s) for s in args.sizes.split(",")]:
+            paths = build_corpus(os.path.join(workdir, f"corpus_{size_kb}kb"), args.seed_files, size_kb, args.docs, args.seed)
+
+            before = server.stats.as_dict()
+            with contextlib.redirect_stdout(io.StringIO()):
+                latencies, elapsed = asyncio.run(bench_evaluate_all(paths, args.concurrency, args.mode))
+            delta = stats_delta(server, before)
+            results["evaluate_all"].append({
+                "size_kb": size_kb,
+                "docs": len(paths),
+                "latency_s": latency_summary(latencies),
+                "docs_per_sec": round(len(paths) / elapsed, 3),
+                "calls_per_doc": round(delta["requests"] / len(paths), 2),
+                "prompt_tokens_per_doc": round(delta["prompt_tokens"] / len(paths), 1),
+                "completion_tokens_per_doc": round(delta["completion_tokens"] / len(paths), 1),
+                "errors_injected": delta["errors_injected"],
+                "malformed_injected": delta["malformed_injected"],
+                "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            })
+
+            if args.skip_cli:
+                continue
+            before = server.stats.as_dict()
+            output = os.path.join(workdir, f"batch_{size_kb}kb.jsonl")
+            elapsed = run_cli(["batch.py", os.path.dirname(paths[0]), "--output", output,
+                               "--concurrency", str(args.concurrency * 6), "--mode", args.mode], env)
+            delta = stats_delta(server, before)
+            single = run_cli(["main.py", paths[0], "--mode", args.mode, "--output", os.path.join(workdir, "output.txt")], env)
+            results["cli"].append({
+                "size_kb": size_kb,
+                "docs": len(paths),
+                "batch_wall_s": round(elapsed, 3),
+                "batch_docs_per_sec": round(len(paths) / elapsed, 3),
+                "batch_calls_per_doc": round(delta["requests"] / len(paths), 2),
+                "main_single_doc_wall_s": round(single, 3),
+                "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+            })
+    finally:
+        stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results["mock_totals"] = server.stats.as_dict()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
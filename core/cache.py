@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+DAY = 24 * 60 * 60
+
+# Timeliness verdicts go stale with the calendar; the other dimensions only
+# change when the content or prompt changes, which already changes the key.
+DEFAULT_TTLS = {
+    "accuracy": 30 * DAY,
+    "completeness": 30 * DAY,
+    "consistency": 30 * DAY,
+    "semantic_coherence": 30 * DAY,
+    "uniqueness": 30 * DAY,
+    "timeliness": 1 * DAY,
+}
+DEFAULT_TTL = 7 * DAY
+
+
+def cache_key(url: str, prompt: str, params: Optional[dict] = None) -> str:
+    """Content address of a request: hash of model URL, full prompt and generation params"""
+    # The query string carries the API key (?key=...); the model is in the path
+    url = url.partition("?")[0]
+    blob = json.dumps([url, prompt, params or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Disk-backed (SQLite) LLM response cache with an in-memory LRU hot tier.
+
+    Entries expire after a per-dimension TTL and the on-disk store is kept
+    under `max_bytes` by evicting the least recently used rows.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, hot_items: int = 256, ttls: Optional[dict] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hot_items = hot_items
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.hot = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "bytes_read": 0,
+            "bytes_written": 0,
+        }
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                dimension TEXT,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def ttl(self, dimension: Optional[str]) -> float:
+        return self.ttls.get(dimension, DEFAULT_TTL)
+
+    def _remember(self, key: str, value: str, created: float, dimension: Optional[str]):
+        self.hot[key] = (value, created, dimension)
+        self.hot.move_to_end(key)
+        while len(self.hot) > self.hot_items:
+            self.hot.popitem(last=False)
+
+    def get(self, key: str, dimension: Optional[str] = None) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            entry = self.hot.get(key)
+            if entry is not None:
+                value, created, stored_dimension = entry
+                if now - created <= self.ttl(dimension or stored_dimension):
+                    self.hot.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    self.stats["bytes_read"] += len(value)
+                    return value
+                del self.hot[key]
+
+            row = self.db.execute(
+                "SELECT value, created, dimension, size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            value, created, stored_dimension, size = row
+            if now - created > self.ttl(dimension or stored_dimension):
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._remember(key, value, created, stored_dimension)
+            self.stats["hits"] += 1
+            self.stats["bytes_read"] += size
+            return value
+
+    def put(self, key: str, value: str, dimension: Optional[str] = None):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            old = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, dimension, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, dimension, size, now, now),
+            )
+            self.total_bytes += size - (old[0] if old else 0)
+            self.stats["bytes_written"] += size
+            self._remember(key, value, now, dimension)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used rows until we are back under 90% of the budget
+        target = int(self.max_bytes * 0.9)
+        rows = self.db.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            doomed.append((key,))
+            self.total_bytes -= size
+            self.hot.pop(key, None)
+        self.db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.stats["evictions"] += len(doomed)
+
+    def purge_expired(self) -> int:
+        """Remove every expired row; returns the number of rows deleted"""
+        now = time.time()
+        removed = 0
+        with self.lock:
+            rows = self.db.execute("SELECT key, dimension, size, created FROM responses").fetchall()
+            doomed = [(key,) for key, dimension, size, created in rows if now - created > self.ttl(dimension)]
+            self.db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            removed = len(doomed)
+            for (key,) in doomed:
+                self.hot.pop(key, None)
+            self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return removed
+
+    def summary(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "stored_bytes": self.total_bytes,
+        }
+
+    def close(self):
+        self.db.close()
+
+
+_cache = None
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Process-wide cache configured from the environment, or None when disabled"""
+    global _cache
+    if os.getenv("GEMINI_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        _cache = ResponseCache(
+            os.getenv("GEMINI_CACHE_PATH", os.path.join(".cache", "gemini_cache.sqlite")),
+            max_bytes=int(float(os.getenv("GEMINI_CACHE_MAX_MB", "512")) * 1024 * 1024),
+        )
+    return _cache
@@ -0,0 +1,316 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from core.md_parser import parse_markdown, HEADING, LIST_ITEM
+
+# Set LOCAL_CONSISTENCY=0 to leave every consistency check to Gemini again
+ENABLED = os.getenv("LOCAL_CONSISTENCY", "1") != "0"
+# Set CONSISTENCY_CORPUS=0 to settle ties within each document only
+CORPUS = os.getenv("CONSISTENCY_CORPUS", "1") != "0"
+
+# Interchangeable ways of writing the same thing: family -> {variant: pattern}
+FORMATS = {
+    "percent": {
+        "per cent": r"\bper cent\b",
+        "percent": r"\bpercent\b",
+        "%": r"\d\s?%",
+    },
+    "rupee symbol": {
+        "Rs.": r"\bRs\.?\s?\d",
+        "₹": r"₹\s?\d",
+        "INR": r"\bINR\s?\d",
+    },
+    "dollar symbol": {
+        "US$": r"\bUS\$\s?\d",
+        "USD": r"\bUSD\s?\d",
+        "$": r"(?<![A-Z])\$\s?\d",
+    },
+    "currency code position": {
+        "code before amount": r"\b(?:USD|INR|EUR|GBP)\s?\d",
+        "code after amount": r"\d\s?(?:USD|INR|EUR|GBP)\b",
+    },
+    "digit grouping": {
+        "lakh grouping (1,00,000)": r"\b\d{1,2},\d\d,\d\d\d\b",
+        "thousands grouping (100,000)": r"\b\d{3},\d{3}\b|\b\d{1,3},\d{3},\d{3}\b",
+    },
+    "decade": {
+        "1990s": r"\b\d{4}s\b",
+        "1990's": r"\b\d{4}'s\b",
+    },
+}
+_groups = {}
+_alternatives = []
+for family, variants in FORMATS.items():
+    for variant, pattern in variants.items():
+        name = f"g{len(_groups)}"
+        _groups[name] = (family, variant)
+        _alternatives.append(f"(?P<{name}>{pattern})")
+# Every format family is found in one scan of each unit; all variants start
+# with one of the lookahead's characters, so other positions fail fast
+FORMAT = re.compile(r"(?=[\dpRIU₹$])(?:" + "|".join(_alternatives) + ")")
+
+WORD = re.compile(r"[A-Za-z](?:[A-Za-z'-]*[A-Za-z])?")
+# Endings spelt differently in British and American English; a word is only
+# indexed for spelling when it has one, and only flagged when the document
+# (or corpus) also uses the other spelling
+SPELLING = re.compile(r"(?:is|iz|ys|yz)(?:e[sd]?|ing|ations?)$|our(?:s|ed|ing|ite|hood)?$|(?:tre|ter)s?$|(?:ogue|og)s?$|ll(?:ed|ing|er)$|l(?:ed|ing|er)$")
+SPELLING_KEY = (
+    (re.compile(r"is(e[sd]?|ing|ations?)$"), r"iz\1"),
+    (re.compile(r"ys(e[sd]?|ing)$"), r"yz\1"),
+    (re.compile(r"our(s|ed|ing|ite|hood)?$"), r"or\1"),
+    (re.compile(r"tre(s?)$"), r"ter\1"),
+    (re.compile(r"ogue(s?)$"), r"og\1"),
+    (re.compile(r"ll(ed|ing|er)$"), r"l\1"),
+)
+HEADING_MARKUP = re.compile(r"^#{1,6}\s+")
+LIST_MARKER = re.compile(r"^\s*([-*+]|\d+[.)])\s")
+SECTION_NUMBER = re.compile(r"^(?:[\dIVXivx]+(?:\.[\dIVXivx]+)*[.:)]?|Box [\w.]+:|Table [\w.]+:|Figure [\w.]+:)\s*")
+
+# Casing drift (e.g. "Care Economy" vs "care economy") is only flagged against
+# a clear convention, since proper nouns legitimately mix both
+CASING_SHARE = 0.75
+CASING_MIN = 4
+
+
+def spelling_key(word: str) -> str:
+    for pattern, replacement in SPELLING_KEY:
+        word = pattern.sub(replacement, word)
+    return word
+
+
+def _sentence_initial(text: str, start: int) -> bool:
+    before = text[:start].rstrip(" *_\"'(“‘[")
+    return not before or before[-1] in ".!?:;\n|#>-" or before[-1].isdigit()
+
+
+def _heading_case(title: str):
+    words = [w for w in WORD.findall(title) if len(w) > 3 and not w.isupper()]
+    if len(words) < 2:
+        return None
+    if all(w[0].isupper() for w in words):
+        return "Title Case"
+    if not any(w[0].isupper() for w in words[1:]):
+        return "Sentence case"
+    return None
+
+
+def analyze(markdown: str):
+    """One pass over the paragraph units of `markdown`.
+
+    Returns the unit texts, per unit the (family, key, variant) uses found in
+    it, and the document's {(family, key): Counter(variant)} index.
+    """
+    doc = parse_markdown(markdown)
+    units, uses = [], []
+    counts = defaultdict(Counter)
+    spelling = {}
+
+    for node in doc.blocks():
+        text = node.text
+        if not text:
+            continue
+        found = []
+        kind = doc.kinds[node.index]
+        if kind == HEADING:
+            level = doc.levels[node.index]
+            title = HEADING_MARKUP.sub("", text)
+            emphasis = "bold" if title.startswith(("**", "__")) else "italic" if title.startswith(("*", "_")) else "plain"
+            found.append((f"heading emphasis (h{level})", "", emphasis))
+            case = _heading_case(SECTION_NUMBER.sub("", title.strip("*_ ")))
+            if case:
+                found.append((f"heading case (h{level})", "", case))
+        elif kind == LIST_ITEM:
+            marker = LIST_MARKER.match(text)
+            if marker:
+                symbol = marker.group(1)
+                if symbol[0].isdigit():
+                    found.append(("numbered list marker", "", "1" + symbol[-1]))
+                else:
+                    found.append(("bullet marker", "", symbol))
+
+        for match in FORMAT.finditer(text):
+            found.append((*_groups[match.lastgroup][:1], "", _groups[match.lastgroup][1]))
+
+        words = list(WORD.finditer(text))
+        for i, match in enumerate(words):
+            token = match.group()
+            lower = token.lower()
+            if "-" in lower:
+                found.append(("compound", lower.replace("-", ""), lower))
+            elif len(lower) > 5 and SPELLING.search(lower):
+                if lower not in spelling:
+                    spelling[lower] = spelling_key(lower)
+                found.append(("spelling", spelling[lower], lower))
+            if len(token) < 3 or token.isupper() or _sentence_initial(text, match.start()):
+                continue
+            if token[0].isupper():
+                # Part of a multi-word name ("Public Day Care"), not a casing choice
+                if any(0 <= j < len(words) and words[j].group()[0].isupper() for j in (i - 1, i + 1)):
+                    continue
+                found.append(("casing", lower, "Capitalized"))
+            else:
+                found.append(("casing", lower, "lowercase"))
+
+        units.append(text)
+        uses.append(found)
+        for family, key, variant in found:
+            counts[(family, key)][variant] += 1
+
+    # Closed and open forms of a hyphenated compound ("healthcare", "health care")
+    compounds = {key for family, key in counts if family == "compound"}
+    if compounds:
+        for i, text in enumerate(units):
+            words = [w.lower() for w in WORD.findall(text)]
+            for a, b in zip(words, words[1:] + [""]):
+                for key, variant in ((a, a), (a + b, f"{a} {b}")):
+                    if key in compounds and "-" not in variant:
+                        uses[i].append(("compound", key, variant))
+                        counts[("compound", key)][variant] += 1
+    return units, uses, dict(counts)
+
+
+def conflicts(counts: dict):
+    """The (family, key) entries written in more than one way"""
+    return {group: variants for group, variants in counts.items() if len(variants) > 1}
+
+
+def preferred_variants(counts: dict, corpus: dict = None):
+    """{(family, key): the variant the document should use} for every conflict.
+
+    The document's majority wins; ties go to the corpus majority and then to
+    the variant used first. Casing is only enforced against a clear majority.
+    """
+    corpus = corpus or {}
+    preferred = {}
+    for group, variants in conflicts(counts).items():
+        top = max(variants.values())
+        if group[0] == "casing" and (top < CASING_SHARE * sum(variants.values()) or top < CASING_MIN):
+            continue
+        tied = [variant for variant, count in variants.items() if count == top]
+        choice = tied[0]
+        if len(tied) > 1 and corpus.get(group) in tied:
+            choice = corpus[group]
+        preferred[group] = choice
+    return preferred
+
+
+def findings(units, uses, preferred: dict):
+    """`details` items for the units using a non-preferred variant"""
+    items = []
+    for text, found in zip(units, uses):
+        issues = []
+        for family, key, variant in found:
+            choice = preferred.get((family, key))
+            if choice is None or variant == choice:
+                continue
+            issue = f'{family}: "{variant}" instead of the prevailing "{choice}"'
+            if issue not in issues:
+                issues.append(issue)
+        if issues:
+            items.append({"unit": text, "is_consistent": False, "issue": "; ".join(issues)})
+    return items
+
+
+def _normalize(text) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def pending_findings(items):
+    """{normalized unit: local finding} for merge_item to consume"""
+    return {_normalize(item["unit"]): item for item in items}
+
+
+def merge_item(item: dict, pending: dict) -> dict:
+    """Fold the local findings for the unit(s) a model item covers into it.
+
+    A local finding makes the unit inconsistent whatever the model said; its
+    issue is put before the model's. Matched findings are removed from
+    `pending`, so what is left afterwards are units the model did not flag.
+    """
+    unit = _normalize(item.get("unit", ""))
+    matched = [key for key in pending if key == unit or (key and key in unit)]
+    if not matched:
+        return item
+    issues = [pending.pop(key)["issue"] for key in matched]
+    if item.get("is_consistent") is False and item.get("issue"):
+        issues.append(str(item["issue"]))
+    return {**item, "is_consistent": False, "issue": "; ".join(issues)}
+
+
+def merge_findings(details, items):
+    """The model's details with the local findings merged in and the rest appended"""
+    pending = pending_findings(items)
+    merged = [merge_item(item, pending) if isinstance(item, dict) else item for item in details]
+    return merged + list(pending.values())
+
+
+class TermIndex:
+    """Persistent (SQLite) variant counts per document id across the corpus,
+    used to settle ties with the corpus-wide convention. Casing is not
+    indexed; it depends too much on each document's proper nouns."""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS variants (
+                doc TEXT NOT NULL,
+                family TEXT NOT NULL,
+                key TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (doc, family, key, variant)
+            );
+            CREATE INDEX IF NOT EXISTS variants_key ON variants(family, key);
+            """
+        )
+
+    def update(self, doc: str, counts: dict):
+        """Replace the counts of document id `doc` (so edits and re-runs of a
+        document never pile up) and return the corpus majority for its conflicts"""
+        rows = [
+            (doc, family, key, variant, count)
+            for (family, key), variants in counts.items() if family != "casing"
+            for variant, count in variants.items()
+        ]
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM variants WHERE doc = ?", (doc,))
+            self.db.executemany("INSERT INTO variants VALUES (?, ?, ?, ?, ?)", rows)
+            return self._majority(counts, doc)
+
+    def majority(self, counts: dict):
+        """Corpus majority for the conflicts of a document that has no id,
+        without recording its counts"""
+        with self.lock:
+            return self._majority(counts, None)
+
+    def _majority(self, counts: dict, doc):
+        majority = {}
+        for family, key in conflicts(counts):
+            row = self.db.execute(
+                "SELECT variant FROM variants WHERE family = ? AND key = ? AND doc IS NOT ? "
+                "GROUP BY variant ORDER BY SUM(count) DESC LIMIT 1",
+                (family, key, doc),
+            ).fetchone()
+            if row:
+                majority[(family, key)] = row[0]
+        return majority
+
+    def close(self):
+        self.db.close()
+
+
+_index = None
+
+
+def get_term_index() -> TermIndex:
+    global _index
+    if _index is None:
+        _index = TermIndex(os.getenv("CONSISTENCY_INDEX_PATH", os.path.join(".cache", "terms.sqlite")))
+    return _index
@@ -0,0 +1,254 @@
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+import numpy as np
+from collections import defaultdict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MERSENNE = np.uint64((1 << 31) - 1)
+NUM_PERM = 128
+BANDS = 32  # 32 bands x 4 rows: pairs above ~0.42 Jaccard become candidates
+
+WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(WORD.findall(str(text).lower()))
+
+
+def exact_hash(text: str) -> str:
+    return hashlib.sha1(normalize(text).encode("utf-8")).hexdigest()
+
+
+def shingles(text: str, size: int = 3) -> np.ndarray:
+    """32-bit hashes of the word `size`-grams of `text` (single words for short text)"""
+    words = WORD.findall(str(text).lower())
+    if len(words) < size:
+        grams = words or [""]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    ))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(MERSENNE), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(MERSENNE), size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        # (a * h + b) mod p for every permutation x shingle at once, then min per permutation
+        values = (self.a[:, None] * (hashes[None, :] % MERSENNE) + self.b[:, None]) % MERSENNE
+        return values.min(axis=1).astype(np.uint32)
+
+    def signatures(self, texts) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, len(self.a)), dtype=np.uint32)
+        return np.vstack([self.signature(shingles(t)) for t in texts])
+
+
+def band_keys(signature: np.ndarray, bands: int = BANDS):
+    rows = len(signature) // bands
+    return [hashlib.blake2b(signature[i * rows:(i + 1) * rows].tobytes(), digest_size=8).hexdigest() for i in range(bands)]
+
+
+def estimated_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+def jaccard(a: str, b: str) -> float:
+    sa, sb = set(shingles(a).tolist()), set(shingles(b).tolist())
+    return len(sa & sb) / len(sa | sb) if sa | sb else 1.0
+
+
+def find_duplicates(texts, hasher: MinHasher = None, high: float = 0.8, low: float = 0.5):
+    """Near-duplicate detection within one list of units, in linear time.
+
+    Returns {i: (j, similarity, status)} for every unit i that repeats an
+    earlier unit j, where status is "exact", "near" (>= high) or
+    "ambiguous" (between low and high, to be confirmed semantically).
+    """
+    hasher = hasher or MinHasher()
+    signatures = hasher.signatures(texts)
+    seen_exact = {}
+    buckets = defaultdict(list)
+    matches = {}
+    for i, text in enumerate(texts):
+        digest = exact_hash(text)
+        if digest in seen_exact:
+            matches[i] = (seen_exact[digest], 1.0, "exact")
+            continue
+        seen_exact[digest] = i
+
+        candidates = set()
+        keys = band_keys(signatures[i])
+        for band, key in enumerate(keys):
+            candidates.update(buckets[(band, key)])
+            buckets[(band, key)].append(i)
+
+        best, best_score = None, 0.0
+        for j in candidates:
+            score = estimated_jaccard(signatures[i], signatures[j])
+            if score > best_score:
+                best, best_score = j, score
+        if best is not None and best_score >= low:
+            # Confirm the estimate on the real shingle sets before judging
+            score = jaccard(texts[i], texts[best])
+            if score >= high:
+                matches[i] = (best, score, "near")
+            elif score >= low:
+                matches[i] = (best, score, "ambiguous")
+    return matches
+
+
+class CorpusIndex:
+    """Persistent (SQLite) MinHash/LSH index of units across a corpus.
+
+    Documents are added incrementally; re-adding a document replaces its units.
+    Each document keeps the rank it was first registered with, and a passage
+    shared by several documents belongs to the lowest-ranked one: only the
+    documents registered after it are flagged, however often they are re-run.
+    """
+
+    def __init__(self, path: str, hasher: MinHasher = None):
+        self.hasher = hasher or MinHasher()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS units (
+                id INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                exact TEXT NOT NULL,
+                signature BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS units_doc ON units(doc_id);
+            CREATE INDEX IF NOT EXISTS units_exact ON units(exact);
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                unit_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS bands_key ON bands(band, key);
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id TEXT PRIMARY KEY,
+                rank INTEGER NOT NULL
+            );
+            -- Indexes written before documents had ranks keep their insertion order
+            INSERT OR IGNORE INTO docs SELECT doc_id, MIN(id) FROM units GROUP BY doc_id;
+            """
+        )
+
+    def register(self, doc_ids):
+        """Rank the `doc_ids` not seen before after every known document, in the
+        given order; returns {doc_id: rank}"""
+        ranks = {}
+        with self.db:
+            for doc_id in doc_ids:
+                self.db.execute(
+                    "INSERT OR IGNORE INTO docs SELECT ?, COALESCE(MAX(rank), 0) + 1 FROM docs", (doc_id,)
+                )
+                ranks[doc_id] = self.db.execute("SELECT rank FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()[0]
+        return ranks
+
+    def prune(self) -> int:
+        """Forget documents whose id is an absolute path that no longer exists
+        (deleted, moved or renamed files); returns how many"""
+        gone = [doc for (doc,) in self.db.execute("SELECT doc_id FROM docs").fetchall()
+                if os.path.isabs(doc) and not os.path.exists(doc)]
+        with self.db:
+            for doc in gone:
+                self.remove(doc)
+                self.db.execute("DELETE FROM docs WHERE doc_id = ?", (doc,))
+        return len(gone)
+
+    def add(self, doc_id: str, texts, signatures=None):
+        if signatures is None:
+            signatures = self.hasher.signatures(texts)
+        self.register([doc_id])
+        with self.db:
+            self.remove(doc_id)
+            for text, signature in zip(texts, signatures):
+                cursor = self.db.execute(
+                    "INSERT INTO units (doc_id, text, exact, signature) VALUES (?, ?, ?, ?)",
+                    (doc_id, text, exact_hash(text), signature.tobytes()),
+                )
+                self.db.executemany(
+                    "INSERT INTO bands (band, key, unit_id) VALUES (?, ?, ?)",
+                    [(band, key, cursor.lastrowid) for band, key in enumerate(band_keys(signature))],
+                )
+
+    def remove(self, doc_id: str):
+        ids = [(row[0],) for row in self.db.execute("SELECT id FROM units WHERE doc_id = ?", (doc_id,))]
+        self.db.executemany("DELETE FROM bands WHERE unit_id = ?", ids)
+        self.db.execute("DELETE FROM units WHERE doc_id = ?", (doc_id,))
+
+    def query(self, text: str, signature: np.ndarray, before: int, high: float = 0.8, low: float = 0.5):
+        """Best match for `text` in the documents ranked below `before` as
+        (doc_id, text, similarity, status), or None"""
+        row = self.db.execute(
+            "SELECT u.doc_id, u.text FROM units u JOIN docs d ON d.doc_id = u.doc_id "
+            "WHERE u.exact = ? AND d.rank < ? LIMIT 1",
+            (exact_hash(text), before),
+        ).fetchone()
+        if row:
+            return row[0], row[1], 1.0, "exact"
+
+        clauses = " OR ".join("(band = ? AND key = ?)" for _ in range(BANDS))
+        params = [v for band, key in enumerate(band_keys(signature)) for v in (band, key)]
+        rows = self.db.execute(
+            f"SELECT DISTINCT u.doc_id, u.text, u.signature FROM bands b JOIN units u ON u.id = b.unit_id "
+            f"JOIN docs d ON d.doc_id = u.doc_id WHERE ({clauses}) AND d.rank < ?",
+            params + [before],
+        ).fetchall()
+
+        best, best_score = None, 0.0
+        for doc_id, other, blob in rows:
+            score = estimated_jaccard(signature, np.frombuffer(blob, dtype=np.uint32))
+            if score > best_score:
+                best, best_score = (doc_id, other), score
+        if best is None or best_score < low:
+            return None
+        score = jaccard(text, best[1])
+        if score >= high:
+            return best[0], best[1], score, "near"
+        if score >= low:
+            return best[0], best[1], score, "ambiguous"
+        return None
+
+    def close(self):
+        self.db.close()
+
+
+_index = None
+
+
+def open_corpus_index(path: str) -> CorpusIndex:
+    """Check documents against the corpus index at `path` from now on, after
+    forgetting the files that no longer exist"""
+    global _index
+    _index = CorpusIndex(path)
+    pruned = _index.prune()
+    if pruned:
+        logger.info(f"🧹 Removed {pruned} missing documents from the corpus index {path}")
+    return _index
+
+
+def get_corpus_index() -> Optional[CorpusIndex]:
+    """The cross-document index, or None when no corpus was given: it is opt-in
+    (--corpus-index or UNIQUENESS_INDEX_PATH), so unrelated documents scored on
+    the same machine never count as each other's duplicates"""
+    if _index is None and os.getenv("UNIQUENESS_INDEX_PATH"):
+        open_corpus_index(os.getenv("UNIQUENESS_INDEX_PATH"))
+    return _index
@@ -1,52 +1,520 @@
 import os
+import time
+import logging
+import random
+import json
+import asyncio
+import email.utils
+from collections import deque, defaultdict
 from dotenv import load_dotenv
 import httpx
-import asyncio
 from typing import Optional
+from core.cache import get_cache, cache_key
+from core.instrumentation import recorder
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
 
-API_KEY = os.getenv("GOOGLE_API_KEY")
-if not API_KEY:
-    raise ValueError("GOOGLE_API_KEY environment variable is not set")
 
-BASE_URL = os.getenv("GEMINI_API_URL")
-if not BASE_URL:
-    raise ValueError("GEMINI_API_URL environment variable is not set")
+def get_base_url() -> str:
+    """Gemini endpoint from the environment, checked when first needed rather
+    than at import time so offline tools (mock server, benchmarks) can import us"""
+    if not os.getenv("GOOGLE_API_KEY"):
+        raise ValueError("GOOGLE_API_KEY environment variable is not set")
+    base_url = os.getenv("GEMINI_API_URL")
+    if not base_url:
+        raise ValueError("GEMINI_API_URL environment variable is not set")
+    return base_url
+
+
+def stream_url(url: str) -> str:
+    """The server-sent-events streamGenerateContent endpoint for a generateContent URL"""
+    base, _, query = url.partition("?")
+    base = base.replace(":generateContent", ":streamGenerateContent")
+    return f"{base}?{query}&alt=sse" if query else f"{base}?alt=sse"
+
+
+# Status codes worth retrying: throttling and transient server-side failures
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.TimeoutException, httpx.ConnectError, httpx.RemoteProtocolError)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for TPM budgeting"""
+    return max(1, len(text) // 4)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        # Requests larger than the bucket can never fit, so clamp them to a full bucket
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+def _quantile(ordered, q: float) -> float:
+    k = (len(ordered) - 1) * q / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+class LatencyTracker:
+    """Sliding window of successful generateContent latencies per call shape
+    (a dimension's own prompt, or e.g. "fused", "packed:<slug>", "reask:<slug>").
+
+    Once a shape has `min_samples` latencies, a call still running past
+    their `percentile` gets a hedged duplicate; hedges are capped at
+    `max_ratio` of that shape's calls so a slow backend is not doubled.
+    Quantiles are exported as dq_llm_latency_quantile_seconds gauges.
+    """
+
+    def __init__(self, percentile: float = 95.0, min_samples: int = 20, max_ratio: float = 0.1, window: int = 256):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.calls = defaultdict(int)
+        self.hedges = defaultdict(int)
+
+    @classmethod
+    def from_env(cls) -> "LatencyTracker":
+        # GEMINI_HEDGE_PERCENTILE=0 turns hedging off
+        return cls(
+            percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95")),
+            min_samples=_env_int("GEMINI_HEDGE_MIN_SAMPLES", 20),
+            max_ratio=float(os.getenv("GEMINI_HEDGE_MAX_RATIO", "0.1")),
+        )
+
+    def observe(self, dimension: str, seconds: float):
+        samples = self.samples[dimension]
+        samples.append(seconds)
+        ordered = sorted(samples)
+        for q in (50, 95, 99):
+            recorder.set_gauge("dq_llm_latency_quantile_seconds", _quantile(ordered, q), dimension=dimension, quantile=f"0.{q}")
+        delay = self.hedge_delay(dimension)
+        if delay is not None:
+            recorder.set_gauge("dq_hedge_threshold_seconds", delay, dimension=dimension)
+
+    def quantile(self, dimension: str, q: float) -> Optional[float]:
+        samples = self.samples.get(dimension)
+        return _quantile(sorted(samples), q) if samples else None
+
+    def hedge_delay(self, dimension: str) -> Optional[float]:
+        """Seconds after which a call is hedged, or None while hedging is off
+        or there is not enough history to know what slow means"""
+        if not self.percentile or len(self.samples.get(dimension, ())) < self.min_samples:
+            return None
+        return self.quantile(dimension, self.percentile)
+
+    def take_hedge(self, dimension: str) -> bool:
+        if self.hedges[dimension] + 1 > self.max_ratio * self.calls[dimension]:
+            return False
+        self.hedges[dimension] += 1
+        return True
+
+    def snapshot(self) -> dict:
+        result = {}
+        for dimension, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            delay = self.hedge_delay(dimension)
+            result[dimension] = {
+                "samples": len(ordered),
+                **{f"p{q}": round(_quantile(ordered, q), 4) for q in (50, 95, 99)},
+                "hedge_after_s": None if delay is None else round(delay, 4),
+                "calls": self.calls[dimension],
+                "hedges": self.hedges[dimension],
+            }
+        return result
+
+
+# Process-wide: latencies are a property of the backend, not of one event loop
+latency = LatencyTracker.from_env()
+
+
+async def hedged(call, shape: Optional[str] = None):
+    """Await `call()`; if it runs past the call shape's hedge threshold, race a
+    duplicate against it, keep whichever answers first and cancel the other"""
+    label = shape or "unknown"
+    latency.calls[label] += 1
+    delay = latency.hedge_delay(label)
+    start = time.perf_counter()
+    primary = asyncio.ensure_future(call())
+    hedge = None
+    done, pending = set(), {primary}
+    try:
+        if delay is not None:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if pending and latency.take_hedge(label):
+                logger.info(f"⏱️ {label} call slower than {delay:.2f}s, sending a hedged duplicate")
+                recorder.inc("dq_hedges_total", dimension=label)
+                hedge = asyncio.ensure_future(call())
+                pending.add(hedge)
+        while True:
+            # Calls that beat the threshold are observed too, or the window
+            # would only ever see the slow tail and stop adapting
+            for task in done:
+                if task.exception() is None and task.result() is not None:
+                    latency.observe(label, time.perf_counter() - start)
+                    if hedge is not None:
+                        recorder.inc("dq_hedge_wins_total", dimension=label, winner="primary" if task is primary else "hedge")
+                    return task.result()
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        # Every attempt failed; surface the primary's outcome
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class GeminiClient:
+    """Long-lived Gemini transport shared by every agent.
+
+    Holds one pooled HTTP/2 keep-alive connection set, a global in-flight
+    semaphore and request/token rate limiters, so concurrent agents and
+    documents reuse connections instead of handshaking on every call.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        max_concurrency: int = 8,
+        requests_per_minute: int = 60,
+        tokens_per_minute: int = 1_000_000,
+        http2: bool = True,
+        timeout: float = 30.0,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 30.0,
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.client = httpx.AsyncClient(
+            http2=http2 and _http2_available(),
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+
+    @classmethod
+    def from_env(cls) -> "GeminiClient":
+        return cls(
+            get_base_url(),
+            max_connections=_env_int("GEMINI_MAX_CONNECTIONS", 20),
+            max_keepalive=_env_int("GEMINI_MAX_KEEPALIVE", 10),
+            max_concurrency=_env_int("GEMINI_MAX_CONCURRENCY", 8),
+            requests_per_minute=_env_int("GEMINI_RPM", 60),
+            tokens_per_minute=_env_int("GEMINI_TPM", 1_000_000),
+            http2=os.getenv("GEMINI_HTTP2", "1") != "0",
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        # Full jitter, but never sooner than the server asked us to wait
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after) + random.uniform(0, self.backoff_base)
+        return delay
+
+    async def generate(
+        self,
+        prompt: str,
+        max_retries: int = 3,
+        timeout: Optional[float] = None,
+        generation_config: Optional[dict] = None,
+        dimension: Optional[str] = None,
+    ) -> Optional[str]:
+        payload = {
+            "contents": [{
+                "parts": [{
+                    "text": prompt
+                }]
+            }]
+        }
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        tokens = estimate_tokens(prompt)
+        labels = {"dimension": dimension or "unknown"}
 
-async def gemini_flash(prompt: str, max_retries: int = 3, timeout: float = 30.0) -> Optional[str]:
-    """Make API call to Gemini with retry logic and timeout handling"""
-    
-    async with httpx.AsyncClient(timeout=timeout) as client:
         for attempt in range(max_retries):
+            if attempt:
+                recorder.inc("dq_llm_retries_total", **labels)
+            queued = time.perf_counter()
+            await self.request_bucket.acquire()
+            await self.token_bucket.acquire(tokens)
             try:
-                payload = {
-                    "contents": [{
-                        "parts": [{
-                            "text": prompt
-                        }]
-                    }]
-                }
-                
-                response = await client.post(
-                    BASE_URL,
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                
+                async with self.semaphore:
+                    sent = time.perf_counter()
+                    recorder.observe("dq_llm_queue_wait_seconds", sent - queued, **labels)
+                    try:
+                        response = await self.client.post(self.url, json=payload, timeout=timeout or self.timeout)
+                    finally:
+                        received = time.perf_counter()
+                        recorder.observe("dq_llm_network_seconds", received - sent, **labels)
+                        recorder.add_span("generateContent", "network", sent, received, attempt=attempt, **labels)
+                recorder.inc("dq_llm_requests_total", status=str(response.status_code), **labels)
+
+                if response.status_code in RETRYABLE_STATUS:
+                    if attempt == max_retries - 1:
+                        logger.error(f"❌ API returned {response.status_code} after {max_retries} attempts")
+                        response.raise_for_status()
+                    delay = self._backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                    logger.warning(f"⚠️ Attempt {attempt + 1} got {response.status_code}, retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+                    continue
+
                 response.raise_for_status()
-                return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+                body = response.json()
+                text = body["candidates"][0]["content"]["parts"][0]["text"]
+                usage = body.get("usageMetadata", {})
+                recorder.inc("dq_llm_prompt_tokens_total", usage.get("promptTokenCount", tokens), **labels)
+                recorder.inc("dq_llm_response_tokens_total", usage.get("candidatesTokenCount", estimate_tokens(text)), **labels)
+                return text
 
-            except httpx.ReadTimeout:
+            except RETRYABLE_ERRORS as e:
+                recorder.inc("dq_llm_requests_total", status=type(e).__name__, **labels)
                 if attempt == max_retries - 1:
-                    print(f"❌ API request timed out after {max_retries} attempts")
+                    logger.error(f"❌ API request failed after {max_retries} attempts: {type(e).__name__}")
                     raise
-                print(f"⚠️ Attempt {attempt + 1} timed out, retrying...")
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                
+                delay = self._backoff(attempt)
+                logger.warning(f"⚠️ Attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
             except Exception as e:
-                print(f"❌ Error making API call: {str(e)}")
+                logger.error(f"❌ Error making API call: {str(e)}")
                 raise
 
-    return None
+        return None
+
+    async def stream(
+        self,
+        prompt: str,
+        max_retries: int = 3,
+        timeout: Optional[float] = None,
+        generation_config: Optional[dict] = None,
+        dimension: Optional[str] = None,
+    ):
+        """Async iterator over the response text chunks of streamGenerateContent.
+
+        `timeout` bounds each read rather than the whole generation, so long
+        outputs keep flowing. Failures before the first chunk are retried like
+        generate(); once text has been yielded an error is raised to the caller,
+        which keeps whatever it already consumed.
+        """
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        tokens = estimate_tokens(prompt)
+        labels = {"dimension": dimension or "unknown"}
+        url = stream_url(self.url)
+
+        for attempt in range(max_retries):
+            if attempt:
+                recorder.inc("dq_llm_retries_total", **labels)
+            queued = time.perf_counter()
+            await self.request_bucket.acquire()
+            await self.token_bucket.acquire(tokens)
+            yielded = False
+            usage = {}
+            try:
+                async with self.semaphore:
+                    sent = time.perf_counter()
+                    recorder.observe("dq_llm_queue_wait_seconds", sent - queued, **labels)
+                    try:
+                        async with self.client.stream("POST", url, json=payload, timeout=timeout or self.timeout) as response:
+                            recorder.inc("dq_llm_requests_total", status=str(response.status_code), **labels)
+                            if response.status_code in RETRYABLE_STATUS and attempt < max_retries - 1:
+                                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                            else:
+                                retry_after = None
+                                if response.status_code >= 400:
+                                    await response.aread()
+                                    response.raise_for_status()
+                                async for line in response.aiter_lines():
+                                    if not line.startswith("data:"):
+                                        continue
+                                    event = json.loads(line[5:])
+                                    usage = event.get("usageMetadata", usage)
+                                    for candidate in event.get("candidates", [])[:1]:
+                                        for part in candidate.get("content", {}).get("parts", []):
+                                            if part.get("text"):
+                                                if not yielded:
+                                                    recorder.observe("dq_llm_first_chunk_seconds", time.perf_counter() - sent, **labels)
+                                                yielded = True
+                                                yield part["text"]
+                    finally:
+                        received = time.perf_counter()
+                        recorder.observe("dq_llm_network_seconds", received - sent, **labels)
+                        recorder.add_span("streamGenerateContent", "network", sent, received, attempt=attempt, **labels)
+
+                if response.status_code in RETRYABLE_STATUS and not yielded:
+                    delay = self._backoff(attempt, retry_after)
+                    logger.warning(f"⚠️ Attempt {attempt + 1} got {response.status_code}, retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+                    continue
+
+                recorder.inc("dq_llm_prompt_tokens_total", usage.get("promptTokenCount", tokens), **labels)
+                if "candidatesTokenCount" in usage:
+                    recorder.inc("dq_llm_response_tokens_total", usage["candidatesTokenCount"], **labels)
+                return
+
+            except RETRYABLE_ERRORS as e:
+                recorder.inc("dq_llm_requests_total", status=type(e).__name__, **labels)
+                if yielded or attempt == max_retries - 1:
+                    logger.error(f"❌ Stream failed after {attempt + 1} attempts: {type(e).__name__}")
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"⚠️ Attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# One client per event loop: httpx connections and asyncio primitives are loop-bound
+_clients = {}
+
+
+def get_client() -> GeminiClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        for stale in [l for l in _clients if l.is_closed()]:
+            del _clients[stale]
+        client = _clients[loop] = GeminiClient.from_env()
+    return client
+
+
+async def close_client():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def gemini_flash(
+    prompt: str,
+    max_retries: int = 3,
+    timeout: float = 30.0,
+    dimension: Optional[str] = None,
+    generation_config: Optional[dict] = None,
+    shape: Optional[str] = None,
+    ttl_dimension: Optional[str] = None,
+) -> Optional[str]:
+    """Make API call to Gemini through the shared pooled client.
+
+    Responses are served from the persistent response cache when the same
+    (model URL, prompt, generation params) has been answered before;
+    `dimension` labels the call's metrics and selects the cache TTL unless
+    `ttl_dimension` names another one. `shape` keys the hedging latency
+    window (default: `dimension`), so prompts of very different sizes for
+    one dimension do not share a threshold.
+    """
+    cache = get_cache()
+    key = cache_key(get_base_url(), prompt, generation_config) if cache else None
+    if cache:
+        cached = cache.get(key, ttl_dimension or dimension)
+        if cached is not None:
+            recorder.inc("dq_cache_hits_total", dimension=dimension or "unknown")
+            return cached
+        recorder.inc("dq_cache_misses_total", dimension=dimension or "unknown")
+
+    client = get_client()
+    response = await hedged(
+        lambda: client.generate(
+            prompt, max_retries=max_retries, timeout=timeout, generation_config=generation_config, dimension=dimension
+        ),
+        shape or dimension,
+    )
+    if cache and response is not None:
+        cache.put(key, response, ttl_dimension or dimension)
+    return response
+
+
+async def gemini_flash_stream(
+    prompt: str,
+    max_retries: int = 3,
+    timeout: float = 30.0,
+    dimension: Optional[str] = None,
+    generation_config: Optional[dict] = None,
+):
+    """Streaming counterpart of gemini_flash: yields response text as it is generated.
+
+    Shares the response cache with gemini_flash; a cached answer is yielded
+    in one piece, and only a stream that completed normally is stored.
+    """
+    cache = get_cache()
+    key = cache_key(get_base_url(), prompt, generation_config) if cache else None
+    if cache:
+        cached = cache.get(key, dimension)
+        if cached is not None:
+            recorder.inc("dq_cache_hits_total", dimension=dimension or "unknown")
+            yield cached
+            return
+        recorder.inc("dq_cache_misses_total", dimension=dimension or "unknown")
+
+    pieces = []
+    async for text in get_client().stream(
+        prompt, max_retries=max_retries, timeout=timeout, generation_config=generation_config, dimension=dimension
+    ):
+        pieces.append(text)
+        yield text
+    if cache and pieces:
+        cache.put(key, "".join(pieces), dimension)
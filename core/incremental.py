@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import hashlib
+from core.markdown_utils import split_sentences, split_paragraphs
+from core.pipeline import run_cpu
+
+SPLITTERS = {
+    "sentence": (split_sentences, "\n"),
+    "paragraph": (split_paragraphs, "\n\n"),
+}
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def unit_hash(text: str) -> str:
+    return hashlib.sha1(_normalize(text).encode("utf-8")).hexdigest()[:16]
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", _normalize(text)))
+
+
+class DocumentIndex:
+    """Per-document map of unit content hash -> previous `details` verdicts
+    (for whole-document dimensions: document hash -> previous result).
+
+    Stored as one JSON file per document id so repeated edits of the same
+    document only pay for the units that changed.
+    """
+
+    def __init__(self, doc_id: str, root: str = None):
+        root = root or os.getenv("INCREMENTAL_INDEX_DIR", os.path.join(".cache", "incremental"))
+        self.path = os.path.join(root, hashlib.sha1(doc_id.encode("utf-8")).hexdigest() + ".json")
+        self.doc_id = doc_id
+        self.dimensions = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.dimensions = json.load(f).get("dimensions", {})
+
+    def get(self, slug: str) -> dict:
+        return self.dimensions.get(slug, {})
+
+    def set(self, slug: str, verdicts: dict):
+        self.dimensions[slug] = verdicts
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"doc_id": self.doc_id, "dimensions": self.dimensions}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def _context_ranges(changed, count, context):
+    # Merge [i - context, i + context] windows around each changed unit
+    ranges = []
+    for i in changed:
+        start, end = max(0, i - context), min(count, i + context + 1)
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+def _assign(details, dimension, units, hashes, sent, changed):
+    """Attach each returned detail to the sent unit it best matches.
+
+    Details that land on unchanged context units are dropped (their old
+    verdicts are kept); details matching nothing go to the first changed unit.
+    """
+    assigned = {hashes[i]: [] for i in changed}
+    sent_words = [(i, _words(units[i]), _normalize(units[i])) for i in sent]
+    for item in details:
+        text = _normalize(item.get(dimension.unit_key, ""))
+        words = _words(text)
+        best, best_score = None, 0.0
+        for i, unit_words, unit_text in sent_words:
+            if text and (text in unit_text or unit_text in text):
+                best, best_score = i, 1.0
+                break
+            union = len(words | unit_words)
+            score = len(words & unit_words) / union if union else 0.0
+            if score > best_score:
+                best, best_score = i, score
+        if best is None or best_score == 0.0:
+            best = changed[0]
+        if hashes[best] in assigned:
+            assigned[hashes[best]].append(item)
+    return assigned
+
+
+async def evaluate_incremental(dimension, markdown: str, index: DocumentIndex, context: int = 1, evaluate=None):
+    """Re-evaluate only the units of `markdown` whose content changed since the
+    last run; `evaluate(excerpt)` (default dimension.evaluate) scores the
+    changed units, e.g. through windows when the excerpt is large"""
+    split, joiner = SPLITTERS[dimension.granularity]
+    units = await run_cpu(split, markdown, stage="incremental")
+    hashes = [unit_hash(u) for u in units]
+    previous = index.get(dimension.slug)
+    changed = [i for i, h in enumerate(hashes) if h not in previous]
+
+    verdicts = {h: previous[h] for h in hashes if h in previous}
+    if changed:
+        if len(changed) == len(units):
+            sent = list(range(len(units)))
+            excerpt = markdown
+        else:
+            sent = [i for start, end in _context_ranges(changed, len(units), context) for i in range(start, end)]
+            excerpt = joiner.join(units[i] for i in sent)
+
+        output = await (evaluate or dimension.evaluate)(excerpt)
+        if "error" in output:
+            return output
+        verdicts.update(_assign(output.get("details", []), dimension, units, hashes, sent, changed))
+
+    index.set(dimension.slug, verdicts)
+    seen = set()
+    details = []
+    for h in hashes:
+        # Repeated identical units share one hash; count their verdicts once
+        if h not in seen:
+            seen.add(h)
+            details.extend(verdicts.get(h, []))
+
+    summary = dimension.summarize(details)
+    summary["incremental"] = {
+        "units": len(units),
+        "reused_units": len(units) - len(changed),
+        "evaluated_units": len(changed),
+    }
+    return summary
+
+
+async def evaluate_document(dimension, markdown: str, index: DocumentIndex, evaluate=None):
+    """Incremental counterpart for whole-document dimensions: the document is
+    their only unit, so the previous result is reused while its content hash
+    is unchanged and any edit re-evaluates all of it"""
+    digest = unit_hash(markdown)
+    previous = index.get(dimension.slug)
+    if digest in previous:
+        return {**previous[digest], "incremental": {"units": 1, "reused_units": 1, "evaluated_units": 0}}
+    output = await (evaluate or dimension.evaluate)(markdown)
+    if "error" in output:
+        return output
+    index.set(dimension.slug, {digest: output})
+    return {**output, "incremental": {"units": 1, "reused_units": 0, "evaluated_units": 1}}
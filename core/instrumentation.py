@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import functools
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Recorder:
+    """In-process metrics and span store.
+
+    Counters and histograms are keyed by (metric name, sorted label tuple);
+    spans are kept in a bounded ring buffer for trace export.
+    """
+
+    def __init__(self, max_spans: int = 100_000):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.epoch = time.time()
+        self.counters = defaultdict(float)
+        self.histograms = defaultdict(Histogram)
+        self.gauges = {}
+        self.spans = deque(maxlen=max_spans)
+        self.help = {}
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.gauges.clear()
+            self.spans.clear()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name: str, value: float, **labels):
+        with self.lock:
+            self.histograms[(name, tuple(sorted(labels.items())))].observe(value)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def add_span(self, name: str, category: str, start: float, end: float, **attrs):
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        lane = task.get_name() if task else threading.current_thread().name
+        with self.lock:
+            self.spans.append((name, category, start, end, lane, attrs))
+
+    @contextmanager
+    def span(self, name: str, category: str = "app", **attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.add_span(name, category, start, time.perf_counter(), **attrs)
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            gauges = sorted(self.gauges.items())
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        for (name, labels), value in gauges:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def chrome_trace(self) -> dict:
+        """Spans as Chrome trace-event JSON (chrome://tracing, Perfetto)"""
+        lanes = {}
+        events = []
+        with self.lock:
+            spans = list(self.spans)
+        for name, category, start, end, lane, attrs in spans:
+            tid = lanes.setdefault(lane, len(lanes) + 1)
+            events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self.started) * 1e6, 1),
+                "dur": round((end - start) * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": attrs,
+            })
+        for lane, tid in lanes.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": lane}})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"epoch": self.epoch}}
+
+    def summary(self) -> dict:
+        """Per-dimension wall time, calls, tokens, retries and cache hits"""
+        result = defaultdict(lambda: defaultdict(float))
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                dimension = dict(labels).get("dimension")
+                if dimension:
+                    result[dimension][name] += value
+            for (name, labels), histogram in self.histograms.items():
+                dimension = dict(labels).get("dimension")
+                if dimension and name == "dq_agent_seconds":
+                    result[dimension]["agent_seconds"] += histogram.total
+                    result[dimension]["agent_runs"] += histogram.count
+        return {dimension: dict(values) for dimension, values in result.items()}
+
+
+recorder = Recorder()
+
+
+def instrument_agent(dimension: str):
+    """Decorator timing an async evaluate_* function as one agent span"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                result = await fn(*args, **kwargs)
+                if isinstance(result, dict) and result.get("status") == "unavailable":
+                    status = "failed"
+                return result
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                end = time.perf_counter()
+                recorder.observe("dq_agent_seconds", end - start, dimension=dimension)
+                recorder.inc("dq_agent_runs_total", dimension=dimension, status=status)
+                recorder.add_span(fn.__name__, "agent", start, end, dimension=dimension, status=status)
+        return wrapper
+    return decorate
+
+
+def write_prometheus(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(recorder.prometheus_text())
+
+
+def write_chrome_trace(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(recorder.chrome_trace(), f)
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serve /metrics in Prometheus text format from a daemon thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = recorder.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    logger.info(f"📊 Metrics at http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def configure_logging(level: str = None):
+    """Agent output goes through logging; LOG_LEVEL=DEBUG restores the full JSON dumps"""
+    logging.basicConfig(level=(level or os.getenv("LOG_LEVEL", "WARNING")).upper(), format="%(message)s")
+    # httpx logs every request at INFO; that is what the metrics are for
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def add_arguments(parser):
+    parser.add_argument("--log-level", help="DEBUG prints every agent's full JSON output (default: LOG_LEVEL or WARNING)")
+    parser.add_argument("--metrics", help="write Prometheus text metrics to this file when done")
+    parser.add_argument("--metrics-port", type=int, help="serve live Prometheus metrics on this port")
+    parser.add_argument("--trace", help="write Chrome trace-event JSON (chrome://tracing, Perfetto) to this file")
+
+
+def setup_from_args(args):
+    configure_logging(args.log_level)
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+
+def export_from_args(args):
+    if args.metrics:
+        write_prometheus(args.metrics)
+    if args.trace:
+        write_chrome_trace(args.trace)
+    # Logged rather than printed so the CLIs' stdout stays the report itself
+    for dimension, values in sorted(recorder.summary().items()):
+        logger.info(f"📊 {dimension}: " + ", ".join(f"{name}={value:g}" for name, value in sorted(values.items())))
@@ -0,0 +1,253 @@
+import os
+import abc
+import json
+import time
+import socket
+import sqlite3
+import threading
+from collections import namedtuple
+from typing import Optional
+
+# One unit of work: a dimension of one document at a given content hash
+Job = namedtuple("Job", "id doc sha256 dimension attempts")
+
+# pending -> leased -> done, or back to pending on failure / lease expiry,
+# until `max_attempts` is used up and the job is dead-lettered
+STATES = ("pending", "leased", "done", "dead")
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue(abc.ABC):
+    """Lease-based queue of (document, dimension) jobs plus the result store
+    workers write to. Backends implement these methods; see SQLiteJobQueue."""
+
+    @abc.abstractmethod
+    def enqueue(self, doc: str, sha256: str, dimensions) -> int:
+        """Add one job per dimension; already queued (doc, sha256, dimension) jobs are kept. Returns how many were added."""
+
+    @abc.abstractmethod
+    def lease(self, worker: str, count: int, seconds: float):
+        """Claim up to `count` pending jobs for `seconds`; returns Jobs"""
+
+    @abc.abstractmethod
+    def heartbeat(self, worker: str, ids, seconds: float):
+        """Extend the leases `worker` still holds; returns the ids it still owns"""
+
+    @abc.abstractmethod
+    def complete(self, job: Job, result, worker: str):
+        """Store `result` (idempotently, keyed by doc, sha256 and dimension) and mark the job done"""
+
+    @abc.abstractmethod
+    def fail(self, job: Job, error: str, worker: str):
+        """Return the job to pending, or dead-letter it once its attempts are used up"""
+
+    @abc.abstractmethod
+    def requeue_expired(self) -> int:
+        """Release leases whose worker stopped heartbeating; returns how many"""
+
+    @abc.abstractmethod
+    def retry_dead(self) -> int:
+        """Give dead-lettered jobs a fresh set of attempts; returns how many"""
+
+    @abc.abstractmethod
+    def progress(self) -> dict:
+        """{dimension: {state: count}}"""
+
+    @abc.abstractmethod
+    def results(self):
+        """Iterate (doc, sha256, dimension, score, result) over the result store, oldest first"""
+
+    @abc.abstractmethod
+    def dead(self, limit: int = 20):
+        """Dead-lettered jobs as (doc, dimension, attempts, error)"""
+
+    def close(self):
+        pass
+
+
+class SQLiteJobQueue(JobQueue):
+    """JobQueue in one SQLite file (WAL). Leasing runs in an IMMEDIATE
+    transaction, so any number of worker processes sharing the file never
+    claim the same job twice. Single host only: WAL relies on shared memory
+    and file locks that network filesystems (NFS, SMB) do not provide, so
+    processes on different hosts sharing the file can corrupt it."""
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                doc TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_until REAL,
+                error TEXT,
+                updated REAL NOT NULL,
+                UNIQUE (doc, sha256, dimension)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, lease_until);
+            CREATE TABLE IF NOT EXISTS results (
+                doc TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                score REAL,
+                result TEXT NOT NULL,
+                worker TEXT,
+                finished REAL NOT NULL,
+                PRIMARY KEY (doc, sha256, dimension)
+            );
+            """
+        )
+
+    def _transaction(self, fn):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.db)
+                self.db.execute("COMMIT")
+                return result
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, doc: str, sha256: str, dimensions) -> int:
+        now = time.time()
+
+        def run(db):
+            added = 0
+            for dimension in dimensions:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO jobs (doc, sha256, dimension, updated) VALUES (?, ?, ?, ?)",
+                    (doc, sha256, dimension, now),
+                )
+                added += cursor.rowcount
+            return added
+        return self._transaction(run)
+
+    def _expire(self, db, now: float) -> int:
+        db.execute(
+            "UPDATE jobs SET state = 'dead', error = COALESCE(error, 'lease expired'), worker = NULL, updated = ? "
+            "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        )
+        return db.execute(
+            "UPDATE jobs SET state = 'pending', worker = NULL, lease_until = NULL, updated = ? "
+            "WHERE state = 'leased' AND lease_until < ?",
+            (now, now),
+        ).rowcount
+
+    def lease(self, worker: str, count: int, seconds: float):
+        now = time.time()
+
+        def run(db):
+            # A worker that finds an abandoned lease picks it up without waiting for the coordinator
+            self._expire(db, now)
+            rows = db.execute(
+                "SELECT id, doc, sha256, dimension, attempts FROM jobs WHERE state = 'pending' ORDER BY id LIMIT ?",
+                (count,),
+            ).fetchall()
+            db.executemany(
+                "UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                [(worker, now + seconds, now, row[0]) for row in rows],
+            )
+            return [Job(id, doc, sha256, dimension, attempts + 1) for id, doc, sha256, dimension, attempts in rows]
+        return self._transaction(run)
+
+    def heartbeat(self, worker: str, ids, seconds: float):
+        now = time.time()
+
+        def run(db):
+            held = []
+            for id in ids:
+                if db.execute(
+                    "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                    (now + seconds, now, id, worker),
+                ).rowcount:
+                    held.append(id)
+            return held
+        return self._transaction(run)
+
+    def complete(self, job: Job, result, worker: str):
+        now = time.time()
+        score = result.get("score") if isinstance(result, dict) else None
+
+        def run(db):
+            db.execute(
+                "INSERT OR REPLACE INTO results (doc, sha256, dimension, score, result, worker, finished) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.doc, job.sha256, job.dimension, score, json.dumps(result, ensure_ascii=False), worker, now),
+            )
+            # Done even if the lease had been lost meanwhile: the result is the same either way
+            db.execute(
+                "UPDATE jobs SET state = 'done', worker = ?, lease_until = NULL, error = NULL, updated = ? WHERE id = ?",
+                (worker, now, job.id),
+            )
+        self._transaction(run)
+
+    def fail(self, job: Job, error: str, worker: str):
+        now = time.time()
+        state = "dead" if job.attempts >= self.max_attempts else "pending"
+        self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, error = ?, updated = ? "
+            "WHERE id = ? AND worker = ? AND state = 'leased'",
+            (state, error, now, job.id, worker),
+        ))
+
+    def requeue_expired(self) -> int:
+        return self._transaction(lambda db: self._expire(db, time.time()))
+
+    def retry_dead(self) -> int:
+        return self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET state = 'pending', attempts = 0, updated = ? WHERE state = 'dead'", (time.time(),)
+        ).rowcount)
+
+    def progress(self) -> dict:
+        counts = {}
+        with self.lock:
+            rows = self.db.execute("SELECT dimension, state, COUNT(*) FROM jobs GROUP BY dimension, state").fetchall()
+        for dimension, state, count in rows:
+            counts.setdefault(dimension, dict.fromkeys(STATES, 0))[state] = count
+        return counts
+
+    def results(self):
+        with self.lock:
+            rows = self.db.execute("SELECT doc, sha256, dimension, score, result FROM results ORDER BY finished").fetchall()
+        for doc, sha256, dimension, score, result in rows:
+            yield doc, sha256, dimension, score, json.loads(result)
+
+    def dead(self, limit: int = 20):
+        with self.lock:
+            return self.db.execute(
+                "SELECT doc, dimension, attempts, error FROM jobs WHERE state = 'dead' ORDER BY updated DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+    def close(self):
+        self.db.close()
+
+
+# Other backends register here under their URL scheme
+BACKENDS = {"sqlite": SQLiteJobQueue}
+
+
+def open_queue(url: Optional[str] = None, **kwargs) -> JobQueue:
+    """Open a queue from "scheme://location" (a bare path means sqlite); JOB_QUEUE_URL by default"""
+    url = url or os.getenv("JOB_QUEUE_URL", os.path.join(".cache", "jobs.sqlite"))
+    scheme, sep, location = url.partition("://")
+    if not sep:
+        scheme, location = "sqlite", url
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unknown job queue backend '{scheme}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[scheme](location, **kwargs)
@@ -1,6 +1,13 @@
-import re
+from core.md_parser import parse_markdown, TABLE_ROW, SENTENCE
+
+def split_sentences(markdown: str):
+    # Sentences of paragraphs and list items, plus table rows, from the shared parse
+    doc = parse_markdown(markdown)
+    return [node.text for node in doc.iter(SENTENCE, TABLE_ROW)]
+
+def split_paragraphs(markdown: str):
+    # Block-level units: headings, paragraphs, list items, tables and code blocks
+    return [node.text for node in parse_markdown(markdown).blocks()]
 
 def chunk_markdown(markdown: str):
-    # Naive sentence-based chunking
-    sentences = re.split(r'(?<=[.!?])\s+', markdown)
-    return "\n".join(s.strip() for s in sentences if len(s.strip()) > 10)
+    return "\n".join(split_sentences(markdown))
@@ -0,0 +1,329 @@
+import re
+import mmap
+import hashlib
+from array import array
+from functools import lru_cache
+
+# Node kinds
+DOCUMENT, SECTION, HEADING, PARAGRAPH, LIST_ITEM, TABLE, TABLE_ROW, CODE, SENTENCE = range(9)
+KIND_NAMES = ("document", "section", "heading", "paragraph", "list_item", "table", "table_row", "code", "sentence")
+
+# Blocks that are units of their own (everything below a section except sentences/rows)
+BLOCK_KINDS = (HEADING, PARAGRAPH, LIST_ITEM, TABLE, CODE)
+
+HEADING_LINE = re.compile(rb"^(#{1,6})\s+\S")
+LIST_LINE = re.compile(rb"^(\s*)(?:[-*+]|\d+[.)])\s+\S")
+LIST_MARKER = re.compile(rb"^\s*(?:[-*+]|\d+[.)])\s+")
+# Numbered paragraphs such as "8.64 For example, ..." start a new paragraph
+NUMBERED_LINE = re.compile(rb"^\d+(?:\.\d+)+\s")
+FENCE_LINE = re.compile(rb"^\s*(```|~~~)")
+
+ABBREVIATIONS = {
+    "al", "rs", "dr", "mr", "mrs", "ms", "prof", "sr", "jr", "st", "vs", "etc", "cf", "fig", "figs",
+    "eg", "ie", "e.g", "i.e", "no", "nos", "vol", "pp", "approx", "inc", "ltd", "co", "corp", "govt",
+    "dept", "est", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    "u.s", "u.k", "rs.", "mn", "bn", "cr", "viz", "ibid", "op", "art", "sec", "para", "ch",
+}
+# Sentence-ending punctuation, optional closing quotes/brackets, optional footnote
+# number glued to the period (e.g. "programme.81 While"), then whitespace
+BOUNDARY = re.compile(r"([.!?])([\"'”’)\]]*)(\d{1,3})?\s+")
+WORD_BEFORE = re.compile(r"([\w.]+)$")
+
+
+def content_hash(data: bytes) -> int:
+    """Stable 64-bit hash of a span with whitespace runs normalised"""
+    return int.from_bytes(hashlib.blake2b(b" ".join(data.split()), digest_size=8).digest(), "little")
+
+
+def sentence_spans(text: str):
+    """Yield (start, end) character spans of the sentences in `text`.
+
+    Unlike a plain split on punctuation this keeps abbreviations ("et al.",
+    "Rs."), initials, decimals ("8.64") and lowercase continuations together.
+    """
+    start = 0
+    length = len(text)
+    for match in BOUNDARY.finditer(text):
+        dot = match.start(1)
+        end = match.end()
+        if end >= length:
+            break
+        following = text[end]
+        if following.islower():
+            continue
+        if match.group(3) and dot > 0 and text[dot - 1].isdigit():
+            continue  # a decimal number, not a footnote marker
+        if match.group(1) == ".":
+            word = WORD_BEFORE.search(text, max(start, dot - 16), dot)
+            if word:
+                token = word.group(1).lower()
+                if token in ABBREVIATIONS or (len(token) == 1 and token.isalpha()):
+                    continue
+        piece_end = match.end(3) if match.group(3) else match.end(2)
+        if text[start:piece_end].strip():
+            yield start, piece_end
+        start = end
+    if text[start:].strip():
+        yield start, len(text.rstrip())
+
+
+class Document:
+    """Array-backed markdown tree: node i is described by kinds[i], starts[i],
+    ends[i] (byte offsets into `source`), parents[i], levels[i] and hashes[i]."""
+
+    __slots__ = ("source", "kinds", "starts", "ends", "parents", "levels", "hashes", "_children")
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array("B")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.parents = array("l")
+        self.levels = array("b")
+        self.hashes = array("Q")
+        self._children = None
+
+    def add(self, kind, start, end, parent, level=0):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.parents.append(parent)
+        self.levels.append(level)
+        self.hashes.append(0)
+        return len(self.kinds) - 1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def text(self, i) -> str:
+        return bytes(self.source[self.starts[i]:self.ends[i]]).decode("utf-8", errors="replace").strip()
+
+    def node(self, i) -> "Node":
+        return Node(self, i)
+
+    @property
+    def root(self) -> "Node":
+        return Node(self, 0)
+
+    def children(self, i):
+        if self._children is None:
+            self._children = [[] for _ in range(len(self.kinds))]
+            for child, parent in enumerate(self.parents):
+                if parent >= 0:
+                    self._children[parent].append(child)
+        return [Node(self, c) for c in self._children[i]]
+
+    def iter(self, *kinds):
+        """Nodes of the given kinds in document order"""
+        wanted = set(kinds)
+        order = sorted((i for i, k in enumerate(self.kinds) if k in wanted), key=self.starts.__getitem__)
+        return [Node(self, i) for i in order]
+
+    def sentences(self):
+        return [n.text for n in self.iter(SENTENCE)]
+
+    def blocks(self):
+        return self.iter(*BLOCK_KINDS)
+
+    def heading_trail(self, i):
+        """Heading lines of the sections enclosing node i, outermost first"""
+        trail = []
+        parent = self.parents[i]
+        while parent > 0:
+            if self.kinds[parent] == SECTION:
+                start = self.starts[parent]
+                end = self.source.find(b"\n", start, self.ends[parent])
+                line = bytes(self.source[start:end if end >= 0 else self.ends[parent]])
+                trail.append(line.decode("utf-8", errors="replace").strip())
+            parent = self.parents[parent]
+        return trail[::-1]
+
+
+class Node:
+    __slots__ = ("doc", "index")
+
+    def __init__(self, doc, index):
+        self.doc = doc
+        self.index = index
+
+    kind = property(lambda self: self.doc.kinds[self.index])
+    kind_name = property(lambda self: KIND_NAMES[self.doc.kinds[self.index]])
+    start = property(lambda self: self.doc.starts[self.index])
+    end = property(lambda self: self.doc.ends[self.index])
+    level = property(lambda self: self.doc.levels[self.index])
+    hash = property(lambda self: self.doc.hashes[self.index])
+    text = property(lambda self: self.doc.text(self.index))
+
+    @property
+    def parent(self):
+        parent = self.doc.parents[self.index]
+        return Node(self.doc, parent) if parent >= 0 else None
+
+    @property
+    def children(self):
+        return self.doc.children(self.index)
+
+    def __repr__(self):
+        return f"<{self.kind_name} {self.start}:{self.end} {self.text[:40]!r}>"
+
+
+class _Parser:
+    def __init__(self, data):
+        self.data = data
+        self.doc = Document(data)
+        self.doc.add(DOCUMENT, 0, len(data), -1)
+        self.sections = [(0, 0)]  # (node index, heading level) stack
+        self.block = None         # (kind, start, end, level) of the open paragraph/list item/code
+        self.table = None         # node index of the open table
+
+    def parent(self):
+        return self.sections[-1][0]
+
+    def finish(self, i):
+        doc = self.doc
+        doc.hashes[i] = content_hash(bytes(self.data[doc.starts[i]:doc.ends[i]]))
+
+    def close_block(self):
+        if self.block is None:
+            return
+        kind, start, end, level = self.block
+        self.block = None
+        i = self.doc.add(kind, start, end, self.parent(), level)
+        self.finish(i)
+        if kind == PARAGRAPH:
+            self.add_sentences(i, start, end)
+        elif kind == LIST_ITEM:
+            marker = LIST_MARKER.match(bytes(self.data[start:end]))
+            self.add_sentences(i, start + (marker.end() if marker else 0), end)
+
+    def close_table(self):
+        if self.table is not None:
+            self.finish(self.table)
+            self.table = None
+
+    def add_sentences(self, parent, start, end):
+        raw = bytes(self.data[start:end])
+        text = raw.decode("utf-8", errors="replace")
+        if text.isascii():
+            for s, e in sentence_spans(text):
+                i = self.doc.add(SENTENCE, start + s, start + e, parent)
+                self.doc.hashes[i] = content_hash(raw[s:e])
+            return
+        # Map character offsets back to byte offsets for non-ASCII text
+        position, offset = 0, 0
+        for s, e in sentence_spans(text):
+            offset += len(text[position:s].encode("utf-8"))
+            size = len(text[s:e].encode("utf-8"))
+            i = self.doc.add(SENTENCE, start + offset, start + offset + size, parent)
+            self.doc.hashes[i] = content_hash(raw[offset:offset + size])
+            offset += size
+            position = e
+
+    def open_section(self, level, start):
+        while len(self.sections) > 1 and self.sections[-1][1] >= level:
+            self.close_section(start)
+        i = self.doc.add(SECTION, start, start, self.parent(), level)
+        self.sections.append((i, level))
+
+    def close_section(self, end):
+        i, _ = self.sections.pop()
+        self.doc.ends[i] = end
+        self.finish(i)
+
+    def feed_line(self, line, start, end):
+        stripped = line.strip()
+
+        if self.block is not None and self.block[0] == CODE:
+            self.block = (CODE, self.block[1], end, 0)
+            if FENCE_LINE.match(line):
+                self.close_block()
+            return
+
+        if not stripped:
+            self.close_block()
+            self.close_table()
+            return
+
+        if FENCE_LINE.match(line):
+            self.close_block()
+            self.close_table()
+            self.block = (CODE, start, end, 0)
+            return
+
+        heading = HEADING_LINE.match(line)
+        if heading:
+            self.close_block()
+            self.close_table()
+            level = len(heading.group(1))
+            self.open_section(level, start)
+            i = self.doc.add(HEADING, start, end, self.parent(), level)
+            self.finish(i)
+            return
+
+        if stripped.startswith(b"|"):
+            self.close_block()
+            if self.table is None:
+                self.table = self.doc.add(TABLE, start, end, self.parent())
+            self.doc.ends[self.table] = end
+            # Skip the |---|---| delimiter row
+            if stripped.strip(b"|:- \t"):
+                i = self.doc.add(TABLE_ROW, start, end, self.table)
+                self.finish(i)
+            return
+        self.close_table()
+
+        item = LIST_LINE.match(line)
+        if item:
+            self.close_block()
+            self.block = (LIST_ITEM, start, end, min(len(item.group(1)), 127))
+            return
+
+        if NUMBERED_LINE.match(line):
+            self.close_block()
+
+        if self.block is not None:
+            kind, block_start, _, level = self.block
+            self.block = (kind, block_start, end, level)
+        else:
+            self.block = (PARAGRAPH, start, end, 0)
+
+    def run(self):
+        data = self.data
+        length = len(data)
+        position = 0
+        while position < length:
+            newline = data.find(b"\n", position)
+            end = length if newline < 0 else newline
+            line = data[position:end]
+            if line.endswith(b"\r"):
+                self.feed_line(line[:-1], position, end - 1)
+            else:
+                self.feed_line(line, position, end)
+            position = end + 1
+        self.close_block()
+        self.close_table()
+        while len(self.sections) > 1:
+            self.close_section(length)
+        self.finish(0)
+        return self.doc
+
+
+def parse_bytes(data) -> Document:
+    """Parse UTF-8 markdown from bytes, a bytearray or an mmap in one pass"""
+    return _Parser(data).run()
+
+
+def parse_file(path: str) -> Document:
+    """Parse a markdown file through a read-only memory map"""
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            data = b""  # empty files cannot be mapped
+    return parse_bytes(data)
+
+
+@lru_cache(maxsize=32)
+def parse_markdown(markdown: str) -> Document:
+    """Parse markdown text; cached so every agent shares one parse per document"""
+    return parse_bytes(markdown.encode("utf-8"))
@@ -0,0 +1,259 @@
+import os
+import mmap
+import time
+import weakref
+import asyncio
+import hashlib
+import functools
+import contextlib
+import logging
+import multiprocessing
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from core.instrumentation import recorder
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for CPU-bound preprocessing (parsing, MinHash, triage,
+# windowing, fingerprinting); 0 runs it inline on the event loop
+WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(os.cpu_count() or 1)))
+# Text shorter than this is cheaper to process inline than to ship to a worker
+MIN_CHARS = int(os.getenv("PREPROCESS_MIN_CHARS", "20000"))
+# Text larger than this reaches the workers through shared memory instead of the pipe
+SHARED_MEMORY_BYTES = int(os.getenv("SHARED_MEMORY_BYTES", str(256 * 1024)))
+# run_cpu results kept per event loop, so every agent working on the same text
+# shares one computation (e.g. a document's windows) instead of redoing it
+MEMO_ENTRIES = int(os.getenv("PREPROCESS_MEMO_ENTRIES", "512"))
+
+SharedText = namedtuple("SharedText", "name size")
+# A batch document after the CPU stage; `error` is set when it could not be
+# read or decoded, `markdown` is None when its digest was skipped
+Loaded = namedtuple("Loaded", "path digest markdown error computed")
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None and WORKERS > 0:
+        # spawn rather than fork: a forked worker would inherit the event loop,
+        # pooled sockets and whatever locks other threads held at that moment
+        _pool = ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def share(text: str):
+    """(payload for a worker, SharedMemory block to release once it is done or None)"""
+    data = text.encode("utf-8")
+    if len(data) < SHARED_MEMORY_BYTES:
+        return text, None
+    block = shared_memory.SharedMemory(create=True, size=len(data))
+    block.buf[:len(data)] = data
+    return SharedText(block.name, len(data)), block
+
+
+def load_text(payload) -> str:
+    if isinstance(payload, str):
+        return payload
+    block = shared_memory.SharedMemory(name=payload.name)
+    try:
+        view = block.buf[:payload.size]
+        try:
+            return str(view, "utf-8")
+        finally:
+            view.release()
+    finally:
+        block.close()
+
+
+def _call_with_text(fn, payload, args):
+    return fn(load_text(payload), *args)
+
+
+# event loop -> OrderedDict of (fn, args, text) -> Future of the result
+_memos = weakref.WeakKeyDictionary()
+
+
+def _memo():
+    loop = asyncio.get_running_loop()
+    if loop not in _memos:
+        _memos[loop] = OrderedDict()
+    return _memos[loop]
+
+
+def _remember(memo, key, future):
+    memo[key] = future
+    memo.move_to_end(key)
+    while len(memo) > MEMO_ENTRIES:
+        memo.popitem(last=False)
+
+
+async def run_cpu(fn, text: str, *args, stage: str = "cpu"):
+    """fn(text, *args) in the worker pool, so CPU work on large documents does
+    not stall the requests in flight on the event loop. `fn` must be a
+    module-level function and its result picklable; callers must not mutate
+    it, since concurrent and repeated calls with the same arguments share it."""
+    memo = _memo()
+    key = (fn, args, text)
+    future = memo.get(key)
+    if future is not None and not (future.done() and future.exception() is not None):
+        memo.move_to_end(key)
+        recorder.inc("dq_cpu_stage_reused_total", stage=stage)
+        return await asyncio.shield(future)
+    future = asyncio.ensure_future(_run_cpu(fn, text, *args, stage=stage))
+    _remember(memo, key, future)
+    return await asyncio.shield(future)
+
+
+async def _run_cpu(fn, text: str, *args, stage: str = "cpu"):
+    pool = get_pool() if len(text) >= MIN_CHARS else None
+    start = time.perf_counter()
+    try:
+        if pool is None:
+            return fn(text, *args)
+        payload, block = share(text)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, _call_with_text, fn, payload, args)
+        finally:
+            if block is not None:
+                block.close()
+                block.unlink()
+    finally:
+        end = time.perf_counter()
+        where = "inline" if pool is None else "pool"
+        recorder.observe("dq_cpu_stage_seconds", end - start, stage=stage, where=where)
+        recorder.add_span(stage, "cpu", start, end, where=where)
+
+
+def precompute(text: str, jobs=(), split=None, per_piece=()):
+    """Results of several CPU stages over one text in a single pass, so a
+    document is shipped to a worker once instead of once per agent.
+
+    Every (fn, args) of `jobs` runs on `text`. `split` (fn, args) cuts it into
+    pieces (items or their `.text`) and `per_piece` jobs run on each piece,
+    or on `text` itself when it is a single piece. Returns (fn, args, piece
+    index or None, result) entries for seed(); a job that raises is left out
+    so its caller recomputes it and reports the error itself.
+    """
+    computed = []
+
+    def run(fn, args, index, piece):
+        try:
+            result = fn(piece, *args)
+        except Exception:
+            return None
+        computed.append((fn, args, index, result))
+        return result
+
+    for fn, args in jobs:
+        run(fn, args, None, text)
+    pieces = run(*split, None, text) if split is not None else None
+    if pieces and len(pieces) > 1:
+        targets = list(enumerate(getattr(p, "text", p) for p in pieces))
+    else:
+        targets = [(None, text)]
+    for index, piece in targets:
+        for fn, args in per_piece:
+            run(fn, args, index, piece)
+    return computed
+
+
+def seed(text: str, computed, split=None):
+    """Make the precompute() results of `text` the run_cpu results of this event loop"""
+    memo = _memo()
+    loop = asyncio.get_running_loop()
+    pieces = [text]
+    if split is not None:
+        fn, args = split
+        for entry in computed:
+            if entry[:3] == (fn, args, None):
+                pieces = [getattr(p, "text", p) for p in entry[3]]
+    for fn, args, index, result in computed:
+        key = (fn, args, text if index is None else pieces[index])
+        if key not in memo:
+            future = loop.create_future()
+            future.set_result(result)
+            _remember(memo, key, future)
+
+
+async def prepare(text: str, jobs=(), split=None, per_piece=()):
+    """Run the CPU stages of one document in one worker call ahead of the
+    agents, whose own run_cpu calls then find their results"""
+    try:
+        computed = await run_cpu(precompute, text, tuple(jobs), split, tuple(per_piece), stage="prepare")
+    except Exception as e:
+        # The agents compute what they need themselves
+        logger.warning(f"⚠️ Preprocessing failed, leaving it to the agents: {type(e).__name__}: {e}")
+        return
+    seed(text, computed, split)
+
+
+@contextlib.contextmanager
+def _mapped(path: str):
+    """Bytes of the file at `path` through a read-only memory map"""
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            data = b""  # empty files cannot be mapped
+    try:
+        yield data
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def fingerprint_file(path: str):
+    """(path, sha256 of its bytes), read through a memory map"""
+    with _mapped(path) as data:
+        return path, hashlib.sha256(data).hexdigest()
+
+
+def load_document(path: str, skip=(), jobs=(), split=None, per_piece=()):
+    """Loaded record of one document: fingerprinted, decoded and precomputed
+    in one worker call. Documents whose digest is in `skip` are not decoded."""
+    try:
+        with _mapped(path) as data:
+            digest = hashlib.sha256(data).hexdigest()
+            if digest in skip:
+                return Loaded(path, digest, None, None, ())
+            # Universal newlines, as open() in text mode would give
+            markdown = str(data, "utf-8").replace("\r\n", "\n").replace("\r", "\n")
+    except (OSError, UnicodeDecodeError) as e:
+        return Loaded(path, None, None, f"{type(e).__name__}: {e}", ())
+    return Loaded(path, digest, markdown, None, precompute(markdown, jobs, split, per_piece))
+
+
+async def loaded(paths, queue: asyncio.Queue, consumers: int, skip=None, **stages):
+    """CPU stage of the batch pipeline: load_document() `paths` in the worker
+    pool and put their Loaded records on `queue`, then one None per consumer.
+
+    `skip(path)` gives the digests already scored for a path and `stages` the
+    precompute() jobs. At most one document per worker is in the pool at a
+    time and `queue` is bounded, so this stage never runs further ahead of the
+    scorers than that.
+    """
+    pool = get_pool()
+    loop = asyncio.get_running_loop()
+    ahead = max(1, WORKERS)
+    pending = []
+    for path in paths:
+        done = frozenset(skip(path)) if skip else frozenset()
+        if pool is None:
+            await queue.put(load_document(path, done, **stages))
+            continue
+        pending.append(loop.run_in_executor(pool, functools.partial(load_document, path, done, **stages)))
+        if len(pending) >= ahead:
+            await queue.put(await pending.pop(0))
+    for future in pending:
+        await queue.put(await future)
+    for _ in range(consumers):
+        await queue.put(None)
@@ -0,0 +1,230 @@
+import re
+import json
+import time
+import logging
+from collections import namedtuple
+from core.gemini_client import gemini_flash, estimate_tokens
+from core.incremental import SPLITTERS
+from core.instrumentation import recorder
+
+logger = logging.getLogger(__name__)
+
+# What an agent's `details` items look like:
+# unit_key / verdict_key: the evaluated text and its boolean verdict
+# extra_key:              the free-text justification or issue (may be null)
+# granularity:            "sentence" / "paragraph" / "document", selects the
+#                         units re-asked when a response comes back truncated
+DetailSpec = namedtuple("DetailSpec", "slug unit_key verdict_key extra_key granularity")
+
+FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.S | re.I)
+
+
+def response_schema(spec: DetailSpec) -> dict:
+    """Gemini responseSchema for a list of `spec` items"""
+    return {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {
+                spec.unit_key: {"type": "STRING"},
+                spec.verdict_key: {"type": "BOOLEAN"},
+                spec.extra_key: {"type": "STRING", "nullable": True},
+            },
+            "required": [spec.unit_key, spec.verdict_key],
+        },
+    }
+
+
+def unavailable(reason: str) -> dict:
+    """Result of a dimension that missed its deadline, crashed or got no usable answer"""
+    return {"status": "unavailable", "score": None, "error": reason}
+
+
+def is_unavailable(output) -> bool:
+    return isinstance(output, dict) and output.get("status") == "unavailable"
+
+
+def parse_failure(dimension: str, response, error: Exception) -> dict:
+    """unavailable() result of an agent whose answer could not be parsed, even after re-asking"""
+    logger.warning(f"⚠️ Could not parse the {dimension} response: {error}")
+    logger.debug(f"Unparsed {dimension} response:\n{response}")
+    return unavailable(f"Failed to parse Gemini response as JSON: {error}")
+
+
+def json_config(spec: DetailSpec = None) -> dict:
+    """generationConfig for JSON mode, constrained to `spec` items when given"""
+    config = {"responseMimeType": "application/json"}
+    if spec is not None:
+        config["responseSchema"] = response_schema(spec)
+    return config
+
+
+def salvage_json(text):
+    """Parse `text` as JSON, tolerating code fences, surrounding prose and
+    truncated arrays; returns (value, clean) where clean means no salvage was needed"""
+    if not text:
+        raise ValueError("Empty response")
+    try:
+        return json.loads(text), True
+    except ValueError:
+        pass
+
+    fenced = FENCE.search(text)
+    candidate = fenced.group(1) if fenced else text
+    starts = [i for i in (candidate.find("["), candidate.find("{")) if i >= 0]
+    if not starts:
+        raise ValueError("No JSON found in response")
+    start = min(starts)
+    end = max(candidate.rfind("]"), candidate.rfind("}"))
+    if end > start:
+        try:
+            return json.loads(candidate[start:end + 1]), False
+        except ValueError:
+            pass
+    repaired = close_truncated(candidate[start:])
+    if repaired:
+        try:
+            return json.loads(repaired), False
+        except ValueError:
+            pass
+    raise ValueError("Could not salvage JSON from response")
+
+
+def close_truncated(text: str):
+    """Cut truncated JSON back to its last complete value and close the open
+    brackets, so every element finished before the output broke off survives"""
+    stack, in_string, escaped = [], False, False
+    cut = None
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append("]" if char == "[" else "}")
+        elif char in "]}":
+            if not stack:
+                break
+            stack.pop()
+            cut = (i + 1, "".join(reversed(stack)))
+            if not stack:
+                break
+        elif char == ",":
+            cut = (i, "".join(reversed(stack)))
+    if cut is None:
+        return None
+    return text[:cut[0]] + cut[1]
+
+
+def parse_response(response, dimension: str):
+    """salvage_json with parse time, failure and salvage accounting"""
+    start = time.perf_counter()
+    try:
+        value, clean = salvage_json(response)
+    except ValueError:
+        recorder.inc("dq_parse_failures_total", dimension=dimension)
+        raise
+    finally:
+        end = time.perf_counter()
+        recorder.observe("dq_parse_seconds", end - start, dimension=dimension)
+        recorder.add_span("parse", "parse", start, end, dimension=dimension)
+    if not clean:
+        recorder.inc("dq_parse_salvaged_total", dimension=dimension)
+    return value, clean
+
+
+def _normalize(text) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def _as_list(value):
+    # Some answers wrap the list in an object, e.g. {"results": [...]}
+    if isinstance(value, dict):
+        lists = [v for v in value.values() if isinstance(v, list)]
+        if len(lists) == 1:
+            return lists[0]
+    return value if isinstance(value, list) else []
+
+
+def split_valid(items, spec: DetailSpec):
+    """(well-formed items, unit texts of malformed items worth re-asking)"""
+    valid, failed = [], []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        unit = item.get(spec.unit_key)
+        if isinstance(unit, str) and unit.strip() and isinstance(item.get(spec.verdict_key), bool):
+            valid.append(item)
+        elif isinstance(unit, str) and unit.strip():
+            failed.append(unit)
+    return valid, failed
+
+
+def missing_units(markdown: str, spec: DetailSpec, items, failed):
+    """Units of `markdown` not covered by any returned item"""
+    splitter, _ = SPLITTERS.get(spec.granularity, SPLITTERS["paragraph"])
+    seen = [_normalize(item[spec.unit_key]) for item in items] + [_normalize(unit) for unit in failed]
+    exact = set(seen)
+    joined = "\n".join(seen)
+    return [unit for unit in splitter(markdown) if _normalize(unit) not in exact and _normalize(unit) not in joined]
+
+
+async def reask(units, spec: DetailSpec, build_prompt):
+    """Evaluate only `units` again with the agent's own prompt; returns the well-formed items"""
+    _, separator = SPLITTERS.get(spec.granularity, SPLITTERS["paragraph"])
+    prompt = build_prompt(separator.join(units))
+    if not prompt:
+        # Triaged agents build no prompt when none of the units needs the model
+        return []
+    recorder.inc("dq_reask_total", dimension=spec.slug)
+    recorder.inc("dq_reask_units_total", len(units), dimension=spec.slug)
+    recorder.inc("dq_reask_prompt_tokens_total", estimate_tokens(prompt), dimension=spec.slug)
+    logger.warning(f"⚠️ Re-asking {spec.slug} for {len(units)} missing or malformed units")
+
+    try:
+        response = await gemini_flash(prompt, dimension=spec.slug, generation_config=json_config(spec),
+                                      shape=f"reask:{spec.slug}")
+    except Exception as e:
+        # The items already salvaged are kept; only the re-asked units are lost
+        recorder.inc("dq_reask_failures_total", dimension=spec.slug)
+        logger.warning(f"⚠️ Re-ask for {spec.slug} failed, keeping the {spec.unit_key}s already parsed: {type(e).__name__}: {e}")
+        return []
+    try:
+        value, _ = parse_response(response, spec.slug)
+    except ValueError:
+        return []
+    valid, _ = split_valid(_as_list(value), spec)
+    return valid
+
+
+async def complete_details(items, clean: bool, markdown: str, spec: DetailSpec, build_prompt):
+    """Keep the well-formed items and re-ask, in one follow-up call, for the
+    malformed ones and (when the answer was not `clean`) the units of
+    `markdown` it never reached, instead of re-running the whole prompt"""
+    valid, failed = split_valid(items, spec)
+    # A clean answer chose its own units; a broken one is re-asked for what it lost
+    if not clean and (spec.granularity != "document" or not valid):
+        failed += missing_units(markdown, spec, valid, failed)
+    if failed:
+        valid += await reask(failed, spec, build_prompt)
+    return valid
+
+
+async def resolve_details(response, markdown: str, spec: DetailSpec, build_prompt):
+    """The agent's `details` list from a raw response, salvaging fenced or
+    truncated JSON and re-asking only for what was lost. Raises ValueError
+    only if nothing usable came back at all."""
+    try:
+        value, clean = parse_response(response, spec.slug)
+    except ValueError:
+        value, clean = None, False
+
+    valid = await complete_details(_as_list(value), clean, markdown, spec, build_prompt)
+    if not valid and value is None:
+        raise ValueError(f"Unparsable {spec.slug} response")
+    return valid
@@ -0,0 +1,333 @@
+import os
+import re
+import json
+import struct
+import bisect
+import hashlib
+import logging
+from collections import defaultdict
+import numpy as np
+from agents.registry import DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Append-only columnar store with one row per evaluated unit:
+#
+#   b"DQR1" then batches of
+#   <u4 header length> <header JSON> <pad to 8> (<column bytes> <pad to 8>)*
+#
+# The header lists the batch's row count, its columns as [name, dtype, nbytes],
+# the strings it adds to the doc / dimension / section / version tables and
+# the [doc, version] pairs whose rows it holds; integer columns refer to those
+# tables by position. Variable-length text lives in a utf-8 blob column plus
+# an int64 column of end offsets into it. Readers scan one batch at a time, so
+# memory is bounded by the batch size, not the store.
+#
+# A version is the sha256 of the document's text plus a digest of its results.
+# Every add marks its version as the document's latest, and readers only see
+# the rows of that version, so re-runs never double count, a retry that scored
+# more dimensions replaces the earlier rows and a document reverted to an
+# earlier text is reported as it is now. Adding a version whose rows are
+# already stored only appends the marker.
+MAGIC = b"DQR1"
+TABLES = ("doc", "dimension", "section", "version")
+FIXED = (
+    ("doc", "<i4"),
+    ("dimension", "<u1"),
+    ("section", "<i4"),     # -1 before the first heading
+    ("offset", "<i8"),      # character offset of the unit in its document, -1 if not found
+    ("length", "<i4"),
+    ("verdict", "<i1"),     # 1 true, 0 false, -1 missing
+    ("version", "<i4"),     # -1 for rows added without one
+)
+TEXT = ("reason", "unit")   # unit text is only kept when it is not found verbatim at its offset
+
+HEADING = re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$", re.M)
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+def section_index(markdown: str):
+    """(heading start offsets, heading titles) for section_at"""
+    starts, titles = [], []
+    for match in HEADING.finditer(markdown):
+        starts.append(match.start())
+        titles.append(match.group(1))
+    return starts, titles
+
+
+def section_at(index, offset: int):
+    starts, titles = index
+    k = bisect.bisect_right(starts, offset) - 1
+    return titles[k] if k >= 0 and offset >= 0 else None
+
+
+def locate(markdown: str, unit: str):
+    """(character offset of `unit` in `markdown`, whether it is there verbatim).
+
+    Units reworded by the model are placed by their first words, tolerating
+    whitespace differences; the offset is -1 if even those are absent.
+    """
+    offset = markdown.find(unit)
+    if offset >= 0 or not unit.strip():
+        return offset, offset >= 0
+    words = unit.split()[:12]
+    match = re.search(r"\s+".join(map(re.escape, words)), markdown)
+    return (match.start() if match else -1), False
+
+
+class ResultWriter:
+    """Appends unit rows to a store; flushes a batch every `batch_rows` rows and on close"""
+
+    def __init__(self, path: str, batch_rows: int = 65536):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.ids = {table: {} for table in TABLES}
+        self.versions = set()
+        exists = os.path.exists(path) and os.path.getsize(path) >= len(MAGIC)
+        if exists:
+            valid = len(MAGIC)
+            for header, _, end in _read_batches(path, with_columns=False):
+                for table, values in header["strings"].items():
+                    for value in values:
+                        self.ids[table].setdefault(value, len(self.ids[table]))
+                self.versions.update(map(tuple, header.get("documents", [])))
+                valid = end
+            if valid < os.path.getsize(path):
+                # A batch torn by a crash while appending; new batches must
+                # follow the last complete one or the store becomes unreadable
+                logger.warning(f"⚠️ Dropping {os.path.getsize(path) - valid} bytes of an incomplete batch at the end of {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(valid)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, "ab" if exists else "wb")
+        if not exists:
+            self.file.write(MAGIC)
+        self._reset()
+
+    def _reset(self):
+        self.rows = {name: [] for name, _ in FIXED}
+        self.text = {name: [] for name in TEXT}
+        self.new = {table: [] for table in TABLES}
+        self.documents = []
+
+    def _id(self, table: str, value) -> int:
+        if value is None:
+            return -1
+        ids = self.ids[table]
+        if value not in ids:
+            ids[value] = len(ids)
+            self.new[table].append(value)
+        return ids[value]
+
+    def add(self, doc: str, dimension: str, section, offset: int, length: int, verdict, reason=None, unit: str = "", version: str = None):
+        """Add one row; `unit` is the text kept for units not found verbatim at `offset` (pass "" otherwise)"""
+        rows = self.rows
+        rows["doc"].append(self._id("doc", doc))
+        rows["dimension"].append(self._id("dimension", dimension))
+        rows["section"].append(self._id("section", section))
+        rows["offset"].append(offset)
+        rows["length"].append(length)
+        rows["verdict"].append(1 if verdict is True else 0 if verdict is False else -1)
+        rows["version"].append(self._id("version", version))
+        self.text["reason"].append("" if reason is None else str(reason))
+        self.text["unit"].append(unit)
+        if len(rows["doc"]) >= self.batch_rows:
+            self.flush()
+
+    def add_document(self, doc: str, markdown: str, results: dict) -> bool:
+        """Add a row for every `details` item of every dimension in an evaluate_all
+        result and make them `doc`'s current rows; returns False when identical
+        rows were already stored and are only marked current again"""
+        found = []
+        for name, output in results.items():
+            if not isinstance(output, dict) or name not in DIMENSIONS:
+                continue
+            spec = DIMENSIONS[name].spec
+            for item in output.get("details", []):
+                if isinstance(item, dict):
+                    found.append((spec.slug, str(item.get(spec.unit_key) or ""), item.get(spec.verdict_key), item.get(spec.extra_key)))
+        digest = hashlib.sha256(json.dumps(found, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+        version = hashlib.sha256(markdown.encode("utf-8")).hexdigest() + ":" + digest[:16]
+        key = (self._id("doc", doc), self._id("version", version))
+        self.documents.append(list(key))
+        if key in self.versions:
+            return False
+        self.versions.add(key)
+        index = section_index(markdown)
+        for slug, unit, verdict, reason in found:
+            offset, exact = locate(markdown, unit)
+            self.add(doc, slug, section_at(index, offset), offset, len(unit),
+                     verdict, reason, "" if exact else unit, version)
+        return True
+
+    def flush(self):
+        count = len(self.rows["doc"])
+        if not count and not self.documents:
+            return
+        columns = [(name, dtype, np.asarray(self.rows[name], dtype=dtype).tobytes()) for name, dtype in FIXED]
+        for name in TEXT:
+            encoded = [value.encode("utf-8") for value in self.text[name]]
+            ends = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+            columns.append((f"{name}_end", "<i8", ends.tobytes()))
+            columns.append((name, "|u1", b"".join(encoded)))
+        header = json.dumps({
+            "rows": count,
+            "strings": self.new,
+            "documents": self.documents,
+            "columns": [[name, dtype, len(data)] for name, dtype, data in columns],
+        }, ensure_ascii=False).encode("utf-8")
+        self.file.write(struct.pack("<I", len(header)) + header + b"\0" * _pad(4 + len(header)))
+        for _, _, data in columns:
+            self.file.write(data + b"\0" * _pad(len(data)))
+        self.file.flush()
+        self._reset()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def _read_batches(path: str, with_columns: bool = True):
+    """Yield (header, columns, end offset) per complete batch, stopping at a torn tail"""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path} is not a result store")
+        while True:
+            raw = f.read(4)
+            if len(raw) < 4:
+                return
+            (size_header,) = struct.unpack("<I", raw)
+            blob = f.read(size_header)
+            if len(blob) < size_header:
+                return  # a batch cut short by a crash while appending
+            try:
+                header = json.loads(blob)
+            except ValueError:
+                return
+            f.read(_pad(4 + size_header))
+            end = f.tell() + sum(nbytes + _pad(nbytes) for _, _, nbytes in header["columns"])
+            if end > size:
+                return
+            columns = {}
+            for name, dtype, nbytes in header["columns"]:
+                if with_columns:
+                    columns[name] = np.frombuffer(f.read(nbytes), dtype=dtype)
+                    f.read(_pad(nbytes))
+            f.seek(end)
+            yield header, columns, end
+
+
+def headers(path: str):
+    """Batch headers only, skipping the column data"""
+    for header, _, _ in _read_batches(path, with_columns=False):
+        yield header
+
+
+def latest_versions(path: str):
+    """{doc id: id of the version of it added last}"""
+    latest = {}
+    for header in headers(path):
+        for doc, version in header.get("documents", []):
+            latest[doc] = version
+    return latest
+
+
+class Batch:
+    """One batch's columns as numpy arrays, with the string tables as of that
+    batch; `current` masks out rows of superseded document versions"""
+
+    def __init__(self, tables, header, columns, latest):
+        self.tables = tables
+        self.rows = header["rows"]
+        self.columns = columns
+        if "version" not in columns:  # written before rows carried a version
+            self.current = np.ones(self.rows, dtype=bool)
+            return
+        lookup = np.full(len(tables["doc"]), -2, dtype=np.int64)
+        for doc, version in latest.items():
+            if doc < len(lookup):  # documents first seen in later batches
+                lookup[doc] = version
+        self.current = (columns["version"] == -1) | (lookup[columns["doc"]] == columns["version"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def text(self, name: str, row: int) -> str:
+        ends = self.columns[f"{name}_end"]
+        start = ends[row - 1] if row else 0
+        return bytes(self.columns[name][start:ends[row]]).decode("utf-8")
+
+
+def batches(path: str):
+    """Yield every Batch of the store in write order"""
+    latest = latest_versions(path)
+    tables = {table: [] for table in TABLES}
+    for header, columns, _ in _read_batches(path):
+        for table, values in header["strings"].items():
+            tables[table].extend(values)
+        yield Batch(tables, header, columns, latest)
+
+
+def aggregate(path: str, by: str = None, dimension: str = None):
+    """Unit counts per dimension, or per (dimension, section) / (dimension, doc)
+    with `by`; returns {key tuple: (units, passed, failed)} computed batch by batch"""
+    totals = defaultdict(lambda: np.zeros(3, dtype=np.int64))
+    for batch in batches(path):
+        keys = batch["dimension"].astype(np.int64) << 32
+        if by == "section":
+            keys |= batch["section"].astype(np.int64) + 1
+        elif by == "doc":
+            keys |= batch["doc"].astype(np.int64)
+        elif by is not None:
+            raise ValueError(f"Cannot group by '{by}', expected section or doc")
+        mask = batch.current
+        if dimension is not None:
+            wanted = batch.tables["dimension"].index(dimension) if dimension in batch.tables["dimension"] else -1
+            mask = mask & (batch["dimension"] == wanted)
+        keys, verdicts = keys[mask], batch["verdict"][mask]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        units = np.bincount(inverse, minlength=len(unique))
+        passed = np.bincount(inverse, weights=verdicts == 1, minlength=len(unique)).astype(np.int64)
+        failed = np.bincount(inverse, weights=verdicts == 0, minlength=len(unique)).astype(np.int64)
+        for key, counts in zip(unique.tolist(), zip(units, passed, failed)):
+            name = batch.tables["dimension"][key >> 32]
+            low = key & 0xFFFFFFFF
+            if by == "section":
+                group = (name, batch.tables["section"][low - 1] if low else None)
+            elif by == "doc":
+                group = (name, batch.tables["doc"][low])
+            else:
+                group = (name,)
+            totals[group] += counts
+    return {group: tuple(int(v) for v in counts) for group, counts in totals.items()}
+
+
+def rows(path: str, dimension: str = None, verdict=None):
+    """Iterate the current rows as dicts (doc, dimension, section, offset, length,
+    verdict, reason, unit); `unit` is "" when the text is at `offset` in the document"""
+    code = {True: 1, False: 0, None: -1}
+    for batch in batches(path):
+        mask = batch.current.copy()
+        if dimension is not None:
+            tables = batch.tables["dimension"]
+            mask &= batch["dimension"] == (tables.index(dimension) if dimension in tables else -1)
+        if verdict is not None:
+            mask &= batch["verdict"] == code[verdict]
+        for row in np.flatnonzero(mask).tolist():
+            section = int(batch["section"][row])
+            value = int(batch["verdict"][row])
+            yield {
+                "doc": batch.tables["doc"][batch["doc"][row]],
+                "dimension": batch.tables["dimension"][batch["dimension"][row]],
+                "section": batch.tables["section"][section] if section >= 0 else None,
+                "offset": int(batch["offset"][row]),
+                "length": int(batch["length"][row]),
+                "verdict": None if value < 0 else bool(value),
+                "reason": batch.text("reason", row) or None,
+                "unit": batch.text("unit", row),
+            }
@@ -0,0 +1,157 @@
+import re
+import json
+import time
+import logging
+from core.gemini_client import gemini_flash_stream
+from core.instrumentation import recorder, instrument_agent
+from core.responses import unavailable
+
+logger = logging.getLogger(__name__)
+
+# Characters that can change the parser state; everything in between is skipped in one step
+STRUCTURAL = re.compile(r'[\[\]{}",]')
+IN_STRING = re.compile(r'["\\]')
+
+
+class IncompleteStream(Exception):
+    """The response ended before its JSON array was closed"""
+
+
+class JSONArrayParser:
+    """Incremental parser for a top-level JSON array.
+
+    feed() takes text as it arrives and returns the elements completed so
+    far, already decoded. Anything before the opening bracket (code fences,
+    prose) is ignored, as is anything after the closing one.
+    """
+
+    def __init__(self, dimension: str = None):
+        self.dimension = dimension or "unknown"
+        self.buf = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.start = None
+        self.started = False
+        self.closed = False
+        self.count = 0
+
+    def feed(self, text: str):
+        if self.closed:
+            return []
+        self.buf += text
+        elements = []
+        buf, pos = self.buf, self.pos
+
+        if not self.started:
+            pos = buf.find("[", pos)
+            if pos < 0:
+                self.pos = len(buf)
+                return elements
+            self.started, self.depth, self.start = True, 1, pos + 1
+            pos += 1
+
+        while not self.closed:
+            if self.in_string:
+                match = IN_STRING.search(buf, pos)
+                if match is None:
+                    pos = len(buf)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(buf):
+                        # Escape split across chunks; resume at the backslash
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self.in_string = False
+                pos = match.end()
+                continue
+
+            match = STRUCTURAL.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            char, pos = match.group(), match.end()
+            if char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.depth += 1
+            elif char in "]}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._emit(buf[self.start:match.start()], elements)
+                    self.closed = True
+            elif char == "," and self.depth == 1:
+                self._emit(buf[self.start:match.start()], elements)
+                self.start = pos
+
+        # Drop consumed text so long streams do not grow the buffer
+        if self.start is not None and self.start > 0:
+            self.buf = buf[self.start:]
+            pos -= self.start
+            self.start = 0
+        self.pos = pos
+        return elements
+
+    def _emit(self, text: str, elements: list):
+        text = text.strip()
+        if not text:
+            return
+        started = time.perf_counter()
+        try:
+            elements.append(json.loads(text))
+            self.count += 1
+        except ValueError as e:
+            recorder.inc("dq_parse_failures_total", dimension=self.dimension)
+            logger.warning(f"⚠️ Skipping unparsable {self.dimension} element: {e}")
+        finally:
+            recorder.observe("dq_parse_seconds", time.perf_counter() - started, dimension=self.dimension)
+
+    def finish(self):
+        if not self.started:
+            raise ValueError(f"No JSON array in the {self.dimension} response")
+        if not self.closed:
+            raise IncompleteStream(f"{self.dimension} response ended after {self.count} elements")
+
+
+async def stream_json_array(prompt: str, dimension: str, generation_config: dict = None):
+    """Yield each element of the JSON array Gemini generates for `prompt` as soon as it is complete"""
+    parser = JSONArrayParser(dimension)
+    async for text in gemini_flash_stream(prompt, dimension=dimension, generation_config=generation_config):
+        for element in parser.feed(text):
+            yield element
+    parser.finish()
+
+
+async def evaluate_streamed(dimension, markdown: str, on_item=None):
+    """Drop-in for dimension.evaluate that consumes dimension.stream.
+
+    `on_item(name, item)` is called for every detail as it arrives. If the
+    stream is cut off, the units received so far are still summarized and
+    the result is marked "partial" instead of failing the whole dimension.
+    """
+    async def collect():
+        details = []
+        try:
+            async for item in dimension.stream(markdown):
+                if not isinstance(item, dict):
+                    continue
+                details.append(item)
+                if on_item is not None:
+                    on_item(dimension.name, item)
+        except Exception as e:
+            if not details:
+                return unavailable(f"Streaming {dimension.slug} failed: {type(e).__name__}: {e}")
+            logger.warning(f"⚠️ {dimension.slug} stream interrupted after {len(details)} units: {e}")
+            recorder.inc("dq_stream_interrupted_total", dimension=dimension.slug)
+            summary = dimension.summarize(details)
+            summary["partial"] = f"{type(e).__name__}: {e}"
+            return summary
+
+        summary = dimension.summarize(details)
+        logger.info(f"\n✅ Streamed {dimension.name} Score: {summary['score']} over {len(details)} units\n")
+        return summary
+
+    collect.__name__ = f"stream_{dimension.slug}"
+    return await instrument_agent(dimension.slug)(collect)()
@@ -0,0 +1,72 @@
+import os
+import re
+from core.incremental import SPLITTERS
+from core.gemini_client import estimate_tokens
+from core.instrumentation import recorder
+
+# Set LOCAL_TRIAGE=0 to send every unit to the timeliness and accuracy agents again
+ENABLED = os.getenv("LOCAL_TRIAGE", "1") != "0"
+
+MONTH = (r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?"
+         r"|Sep(?:t(?:ember)?)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\.?")
+YEAR = r"(?:1[89]\d\d|20\d\d)"
+
+TEMPORAL = re.compile(
+    rf"\b{MONTH}\s+(?:\d{{1,2}},?\s+)?{YEAR}\b"                # December 2021, Dec 5, 2021
+    rf"|\b{YEAR}\s*(?:-|–|—|to)\s*(?:{YEAR}|\d\d)\b"           # 2019-2021, 2020–21
+    rf"|\b{YEAR}s?\b"                                          # 2012, 1990s
+    r"|\bFY\s?\d{2,4}\b|\bQ[1-4]\b"                            # FY2021, Q3
+    r"|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b"      # 2021-12-01, 1/12/21
+    r"|\b(?:recent(?:ly)?|current(?:ly)?|now|nowadays|today|presently|at present|to date|so far|as of"
+    r"|this (?:year|month|quarter|decade)|last (?:year|month|quarter|decade)|next (?:year|month|quarter|decade)"
+    r"|upcoming|latest|ongoing|in the coming|forecast|projected|expected to|by the end of)\b"
+    r"|\b(?:will|shall|(?:is|are) going to|plans? to|aims? to)\b",  # future tense
+    re.I,
+)
+
+CLAIM = re.compile(
+    r"\d"                                                      # any figure: 45,000, 8.6, 0–3
+    r"|%|\bper ?cent\b|\bpercentage points?\b"
+    r"|[$€£₹¥]|\b(?:USD|INR|EUR|GBP|Rs)\b"
+    r"|\b(?:thousand|million|billion|trillion|crore|lakh|half|double[ds]?|twice|tripled?)\b"
+    r"|\bet al\b|\baccording to\b|\b(?:study|survey|report|census|data) (?:found|finds|shows?|showed|estimates?)\b"
+    r"|\b(?:increased?|decreased?|rose|fell|grew|declined?|doubled|halved)\b",
+    re.I,
+)
+
+# Paragraph numbering such as "8.64" or "3)" is not a claim
+SECTION_NUMBER = re.compile(r"^\s*(?:\d+(?:\.\d+)+|\d+[.)])\s+")
+
+
+def has_time_reference(text: str) -> bool:
+    return TEMPORAL.search(text) is not None
+
+
+def has_claim(text: str) -> bool:
+    return CLAIM.search(SECTION_NUMBER.sub("", text)) is not None
+
+
+def triage_units(markdown: str, granularity: str, predicate):
+    """Split `markdown` into (units worth sending to the agent, units left to a default rule)"""
+    splitter, _ = SPLITTERS[granularity]
+    units = splitter(markdown)
+    if not ENABLED:
+        return units, []
+    checked, skipped = [], []
+    for unit in units:
+        (checked if predicate(unit) else skipped).append(unit)
+    return checked, skipped
+
+
+def triage_report(dimension: str, checked, skipped, rule: str) -> dict:
+    """Record the routing and return the "triage" block attached to an agent summary"""
+    saved = sum(estimate_tokens(unit) for unit in skipped)
+    recorder.inc("dq_triage_units_total", len(checked), dimension=dimension, routed="agent")
+    recorder.inc("dq_triage_units_total", len(skipped), dimension=dimension, routed="default")
+    recorder.inc("dq_triage_tokens_saved_total", saved, dimension=dimension)
+    return {
+        "sent_units": len(checked),
+        "default_units": len(skipped),
+        "tokens_saved": saved,
+        "default_rule": rule,
+    }
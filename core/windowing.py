@@ -0,0 +1,145 @@
+import re
+import asyncio
+from collections import namedtuple
+from core.gemini_client import estimate_tokens
+from core.markdown_utils import split_sentences
+from core.md_parser import parse_markdown
+from core.pipeline import run_cpu
+from agents.fused_agent import evaluate_fused
+from core.responses import unavailable, is_unavailable
+
+# text:   what is sent to the agent (header digest + overlap + own blocks)
+# own:    the blocks this window is responsible for, without the overlap
+# digest: heading trail in effect at the start of the window
+Window = namedtuple("Window", "text own digest")
+Block = namedtuple("Block", "text headings tokens")
+
+# Tokens of the previous window repeated at the start of the next one
+OVERLAP_TOKENS = 200
+
+
+def split_blocks(markdown: str):
+    """Block-level units of the shared parse (headings, numbered paragraphs,
+    lists, tables), each with the heading trail it sits under"""
+    doc = parse_markdown(markdown)
+    blocks = []
+    for node in doc.blocks():
+        text = node.text
+        if text:
+            blocks.append(Block(text, tuple(doc.heading_trail(node.index)), estimate_tokens(text)))
+    return blocks
+
+
+def _split_oversized(block: Block, max_tokens: int):
+    # A single block larger than the budget is cut along sentence boundaries
+    pieces, current, tokens = [], [], 0
+    for sentence in split_sentences(block.text) or [block.text]:
+        size = estimate_tokens(sentence)
+        if current and tokens + size > max_tokens:
+            pieces.append(" ".join(current))
+            current, tokens = [], 0
+        current.append(sentence)
+        tokens += size
+    if current:
+        pieces.append(" ".join(current))
+    return [Block(p, block.headings, estimate_tokens(p)) for p in pieces]
+
+
+def build_windows(markdown: str, max_tokens: int = 8000, overlap_tokens: int = OVERLAP_TOKENS):
+    """Pack blocks into token-bounded windows, each prefixed with a header digest
+    and the trailing blocks of the previous window as overlap"""
+    blocks = []
+    for block in split_blocks(markdown):
+        blocks.extend(_split_oversized(block, max_tokens) if block.tokens > max_tokens else [block])
+    if not blocks:
+        return []
+
+    groups, current, tokens = [], [], 0
+    for block in blocks:
+        if current and tokens + block.tokens > max_tokens:
+            groups.append(current)
+            current, tokens = [], 0
+        current.append(block)
+        tokens += block.tokens
+    groups.append(current)
+
+    windows = []
+    for i, group in enumerate(groups):
+        overlap, size = [], 0
+        if i > 0:
+            for block in reversed(groups[i - 1]):
+                if size + block.tokens > overlap_tokens:
+                    break
+                overlap.insert(0, block)
+                size += block.tokens
+
+        first = (overlap or group)[0]
+        # A window opening on a heading already carries that heading itself
+        digest = "\n".join(h for h in first.headings if h != first.text)
+        own = "\n\n".join(b.text for b in group)
+        parts = ([digest] if digest else []) + [b.text for b in overlap] + [own]
+        windows.append(Window("\n\n".join(parts), own, digest))
+    return windows
+
+
+def _normalize(text) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def merge_window_outputs(dimension, windows, outputs):
+    """Merge per-window agent outputs into one result for `dimension`.
+
+    A unit reported by a window that only saw it through the overlap or
+    header digest is dropped in favour of the window that owns it; the score
+    is recomputed over the merged units, so windows are weighted by unit count.
+    """
+    owners = [_normalize(w.own) for w in windows]
+    details = []
+    unowned = set()
+    failed = [o for o in outputs if is_unavailable(o)]
+    for own, output in zip(owners, outputs):
+        if is_unavailable(output):
+            continue
+        for item in output.get("details", []):
+            key = _normalize(item.get(dimension.unit_key, ""))
+            if key and key in own:
+                details.append(item)
+            elif key and any(key in other for other in owners):
+                # Seen through the overlap or digest; the owning window reports it
+                continue
+            elif key not in unowned:
+                unowned.add(key)
+                details.append(item)
+
+    if failed and len(failed) == len(outputs):
+        return failed[0]
+
+    summary = dimension.summarize(details)
+    summary["windows"] = {"count": len(windows), "failed": len(failed)}
+    return summary
+
+
+async def evaluate_windowed(dimension, markdown: str, max_tokens: int = 8000, overlap_tokens: int = OVERLAP_TOKENS):
+    """Evaluate `dimension` over token-bounded windows concurrently and merge the results"""
+    windows = await run_cpu(build_windows, markdown, max_tokens, overlap_tokens, stage="windowing")
+    if len(windows) <= 1:
+        return await dimension.evaluate(markdown)
+    outputs = await asyncio.gather(*(dimension.evaluate(w.text) for w in windows), return_exceptions=True)
+    outputs = [unavailable(f"{type(o).__name__}: {o}") if isinstance(o, BaseException) else o for o in outputs]
+    return merge_window_outputs(dimension, windows, outputs)
+
+
+async def evaluate_fused_windowed(markdown: str, dimensions, max_tokens: int = 8000, overlap_tokens: int = OVERLAP_TOKENS):
+    """Windowed counterpart of agents.fused_agent.evaluate_fused"""
+    windows = await run_cpu(build_windows, markdown, max_tokens, overlap_tokens, stage="windowing")
+    if len(windows) <= 1:
+        return await evaluate_fused(markdown, dimensions)
+    outputs = await asyncio.gather(*(evaluate_fused(w.text, dimensions) for w in windows), return_exceptions=True)
+    merged = {}
+    for d in dimensions:
+        per_window = [
+            unavailable(f"{type(o).__name__}: {o}") if isinstance(o, BaseException) else o[d.name]
+            for o in outputs
+        ]
+        merged[d.name] = merge_window_outputs(d, windows, per_window)
+    return merged
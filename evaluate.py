@@ -1,23 +1,224 @@
+import os
+import time
 import asyncio
-from agents.accuracy_agent import evaluate_accuracy
-from agents.completeness_agent import evaluate_completeness
-from agents.consistency_agent import evaluate_consistency
-from agents.timeliness_agent import evaluate_timeliness
-from agents.uniqueness_agent import evaluate_uniqueness
-from agents.semanticoherence_agent import evaluate_semantic_coherence
+import logging
+from typing import Optional
+from agents.registry import DIMENSIONS
+from agents.fused_agent import evaluate_fused
+from agents import consistency_agent
+from core import consistency
+from core.incremental import DocumentIndex, evaluate_incremental, evaluate_document, SPLITTERS
+from core.windowing import evaluate_windowed, evaluate_fused_windowed, build_windows, OVERLAP_TOKENS
+from core.pipeline import prepare
+from core.streaming import evaluate_streamed
+from core.responses import unavailable, is_unavailable
+from core.instrumentation import recorder
 # "Schema Inference and validity",
 # "Outlier Detection", 
 # "AI Trust Score" 
 # "Granularity"
-async def evaluate_all(markdown: str):
+
+# Dimensions that judge the document as a whole; "hybrid" mode fuses only these
+# into one call while the per-sentence agents keep their own prompts.
+HYBRID_FUSED = ("Completeness", "Consistency", "semantic coherence")
+MODES = ("fanout", "fused", "hybrid")
+
+# Documents larger than this many prompt tokens are evaluated in parallel windows (0 disables)
+WINDOW_TOKENS = int(os.getenv("WINDOW_TOKENS", "8000"))
+
+# Seconds a dimension may take before it is reported "unavailable" instead of
+# holding up the others; DIMENSION_DEADLINES overrides it per agent slug,
+# e.g. "accuracy=180,timeliness=60"
+DIMENSION_DEADLINE = float(os.getenv("DIMENSION_DEADLINE", "120"))
+DIMENSION_DEADLINES = {
+    slug.strip(): float(seconds)
+    for slug, _, seconds in (item.partition("=") for item in os.getenv("DIMENSION_DEADLINES", "").split(",") if item.strip())
+}
+
+# Dimensions whose model details are merged with the findings of local
+# analyzers that need the whole document, so they run once per document
+# alongside the dimension however it is evaluated (windowed, incremental,
+# fused or packed): name -> (async fn(markdown, doc_id) returning findings,
+# fn(details, findings) returning the merged details, their run_cpu stages)
+LOCAL_CHECKS = {
+    "Consistency": (consistency_agent.local_findings, consistency.merge_findings, consistency_agent.LOCAL_PREPROCESS),
+}
+
+logger = logging.getLogger(__name__)
+
+def evaluate_dimension(dimension, markdown: str, index: Optional[DocumentIndex] = None, window_tokens: int = WINDOW_TOKENS, doc_id: Optional[str] = None, on_item=None):
+    """Coroutine evaluating one dimension, incrementally when an index is given.
+
+    With `on_item(name, item)`, streaming agents report each detail as it is
+    generated (per window or per changed excerpt alike); the others report
+    theirs once the dimension completes.
+    """
+    coroutine = _evaluate_dimension(dimension, markdown, index, window_tokens, doc_id, on_item)
+    if dimension.name in LOCAL_CHECKS:
+        return with_local_checks(dimension, coroutine, markdown, doc_id, on_item)
+    return coroutine
+
+def _evaluate_dimension(dimension, markdown: str, index: Optional[DocumentIndex], window_tokens: int, doc_id: Optional[str], on_item):
+    if on_item is not None:
+        if dimension.stream is None:
+            return _report_details(dimension.name, _evaluate_dimension(dimension, markdown, index, window_tokens, doc_id, None), on_item)
+        streamed = dimension
+        dimension = dimension._replace(evaluate=lambda text: evaluate_streamed(streamed, text, on_item))
+    if dimension.corpus_aware:
+        return dimension.evaluate(markdown, doc_id=doc_id)
+    if index is not None:
+        # The first run of a document sends all of it, so the excerpt is windowed like a full document
+        windowed = (lambda text: evaluate_windowed(dimension, text, window_tokens)) if window_tokens else None
+        if dimension.granularity == "document":
+            return evaluate_document(dimension, markdown, index, evaluate=windowed)
+        return evaluate_incremental(dimension, markdown, index, evaluate=windowed)
+    if window_tokens:
+        return evaluate_windowed(dimension, markdown, window_tokens)
+    return dimension.evaluate(markdown)
+
+async def with_local_checks(dimension, coroutine, markdown: str, doc_id: Optional[str] = None, on_item=None):
+    """Await `coroutine`, the dimension's result, while its local checks run
+    over the whole document, and merge their findings into it"""
+    find, merge, _ = LOCAL_CHECKS[dimension.name]
+    output, found = await asyncio.gather(coroutine, find(markdown, doc_id))
+    if is_unavailable(output):
+        return output
+    details = output.get("details", [])
+    merged = merge(details, found)
+    if on_item is not None:
+        # Streamed model items were reported already; report what the merge changed or added
+        reported = {id(item) for item in details}
+        for item in merged:
+            if id(item) not in reported:
+                on_item(dimension.name, item)
+    return {**output, **dimension.summarize(merged)}
+
+async def _fused_local_checks(coroutine, dimensions, markdown: str, doc_id: Optional[str]):
+    names = [d.name for d in dimensions if d.name in LOCAL_CHECKS]
+    outputs, *found = await asyncio.gather(coroutine, *(LOCAL_CHECKS[name][0](markdown, doc_id) for name in names))
+    if is_unavailable(outputs):
+        return outputs
+    outputs = dict(outputs)
+    for name, items in zip(names, found):
+        output = outputs.get(name)
+        if output is not None and not is_unavailable(output):
+            merged = LOCAL_CHECKS[name][1](output.get("details", []), items)
+            outputs[name] = {**output, **DIMENSIONS[name].summarize(merged)}
+    return outputs
+
+async def _report_details(name: str, coroutine, on_item):
+    output = await coroutine
+    if isinstance(output, dict):
+        for item in output.get("details", []):
+            on_item(name, item)
+    return output
+
+def fused_dimensions(mode: str):
+    """Names of the dimensions evaluated by the single fused call in `mode`"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown evaluation mode '{mode}', expected one of {MODES}")
+    if mode == "fused":
+        return [name for name, d in DIMENSIONS.items() if not d.corpus_aware]
+    if mode == "hybrid":
+        return list(HYBRID_FUSED)
+    return []
+
+def build_tasks(markdown: str, index: Optional[DocumentIndex] = None, mode: str = "fanout", window_tokens: int = WINDOW_TOKENS, doc_id: Optional[str] = None, on_item=None):
+    """Coroutines for one document keyed by dimension name, plus a "fused" entry
+    evaluating every fused dimension at once"""
+    fused = fused_dimensions(mode)
     tasks = {
-        "Accuracy": evaluate_accuracy(markdown),
-        "Completeness": evaluate_completeness(markdown),
-        "Consistency": evaluate_consistency(markdown),
-        "timeliness": evaluate_timeliness(markdown),
-        "uniqueness": evaluate_uniqueness(markdown),
-        "semantic coherence": evaluate_semantic_coherence(markdown),
+        name: evaluate_dimension(dimension, markdown, index, window_tokens, doc_id, on_item)
+        for name, dimension in DIMENSIONS.items() if name not in fused
     }
+    if fused:
+        dimensions = [DIMENSIONS[name] for name in fused]
+        if window_tokens:
+            tasks["fused"] = evaluate_fused_windowed(markdown, dimensions, window_tokens)
+        else:
+            tasks["fused"] = evaluate_fused(markdown, dimensions)
+        if any(d.name in LOCAL_CHECKS for d in dimensions):
+            tasks["fused"] = _fused_local_checks(tasks["fused"], dimensions, markdown, doc_id)
+        if on_item is not None:
+            tasks["fused"] = _report_fused(tasks["fused"], on_item)
+    return tasks
+
+async def _report_fused(coroutine, on_item):
+    outputs = await coroutine
+    for name, output in outputs.items():
+        if isinstance(output, dict):
+            for item in output.get("details", []):
+                on_item(name, item)
+    return outputs
+
+def preprocessing(mode: str = "fanout", window_tokens: int = WINDOW_TOKENS, incremental: bool = False) -> dict:
+    """core.pipeline.precompute() stages of one document for build_tasks:
+    windows, each agent's preprocess on every window (or the whole document
+    when it fits one), corpus-aware agents' and local checks' on the whole
+    document, and the unit splits of incremental re-runs"""
+    fused = fused_dimensions(mode)
+    jobs = [job for _, _, stages in LOCAL_CHECKS.values() for job in stages]
+    per_piece = []
+    for name, dimension in DIMENSIONS.items():
+        stages = jobs if dimension.corpus_aware else per_piece
+        stages.extend(job for job in dimension.preprocess if job not in stages)
+        if incremental and name not in fused and not dimension.corpus_aware and dimension.granularity != "document":
+            split = (SPLITTERS[dimension.granularity][0], ())
+            if split not in jobs:
+                jobs.append(split)
+    split = (build_windows, (window_tokens, OVERLAP_TOKENS)) if window_tokens else None
+    return {"jobs": tuple(jobs), "split": split, "per_piece": tuple(per_piece)}
+
+def task_deadline(name: str, mode: str = "fanout", deadline: Optional[float] = None) -> float:
+    """Deadline of a build_tasks entry; the fused call gets the longest of its dimensions'"""
+    names = fused_dimensions(mode) if name == "fused" else [name]
+    default = deadline or DIMENSION_DEADLINE
+    return max(DIMENSION_DEADLINES.get(DIMENSIONS[n].slug, default) for n in names)
+
+async def run_with_deadline(name: str, coroutine, deadline: float):
+    """Await one build_tasks entry, turning a timeout or crash into an unavailable result"""
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(coroutine, deadline)
+    except asyncio.TimeoutError:
+        recorder.inc("dq_dimension_timeouts_total", dimension=name)
+        logger.warning(f"⏳ {name} missed its {deadline:g}s deadline")
+        return unavailable(f"deadline of {deadline:g}s exceeded after {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        logger.error(f"❌ {name} failed: {type(e).__name__}: {e}")
+        return unavailable(f"{type(e).__name__}: {e}")
+
+def collect_results(results: dict):
+    """Flatten the outputs of build_tasks back into {dimension name: result}"""
+    results = dict(results)
+    fused_results = results.pop("fused", {})
+    if is_unavailable(fused_results):
+        fused_results = {name: fused_results for name in DIMENSIONS}
+    return {name: results[name] if name in results else fused_results[name] for name in DIMENSIONS}
+
+async def evaluate_all(markdown: str, doc_id: Optional[str] = None, mode: str = "fanout", window_tokens: int = WINDOW_TOKENS, incremental: bool = False, on_item=None, deadline: Optional[float] = None):
+    """Run every dimension agent concurrently.
+
+    `mode` is "fanout" (one call per dimension), "fused" (a single combined
+    call) or "hybrid" (whole-document dimensions fused, the rest fanned out).
+    `doc_id` identifies the document in corpus-wide indexes; with
+    `incremental`, fanned-out per-unit dimensions reuse the verdicts stored
+    for that document and only send changed sentences/paragraphs to the LLM,
+    and whole-document dimensions are only re-sent when the document changed.
+    Documents above `window_tokens` are split into windows evaluated in parallel.
+    `on_item(name, item)` turns on streaming and receives every detail as it arrives.
+    Each dimension runs against its own deadline (`deadline`, or
+    DIMENSION_DEADLINE / DIMENSION_DEADLINES); one that misses it is
+    reported as {"status": "unavailable"} while the rest are kept.
+    """
+    index = DocumentIndex(doc_id) if doc_id and incremental else None
+    # Parse, split and triage the document once for every agent
+    await prepare(markdown, **preprocessing(mode, window_tokens, index is not None))
+    tasks = build_tasks(markdown, index, mode, window_tokens, doc_id, on_item)
 
-    results = await asyncio.gather(*tasks.values())
-    return {dim: result for dim, result in zip(tasks.keys(), results)}
+    results = dict(zip(tasks.keys(), await asyncio.gather(*(
+        run_with_deadline(name, coroutine, task_deadline(name, mode, deadline)) for name, coroutine in tasks.items()
+    ))))
+    if index is not None:
+        index.save()
+    return collect_results(results)
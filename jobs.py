@@ -0,0 +1,224 @@
+# python jobs.py enqueue corpus/    |    python jobs.py work    |    python jobs.py status --export scores.jsonl
+"""Score one corpus with any number of workers sharing a job queue.
+
+`enqueue` adds one (document, dimension) job per dimension to a lease-based
+queue, `work` pulls jobs, scores them and writes the results to the shared
+result store, and `status` is the coordinator: it releases expired leases,
+reports progress and dead-lettered jobs, and aggregates per-dimension scores.
+Workers need the documents at the same paths and a queue URL they can all
+reach (JOB_QUEUE_URL, default .cache/jobs.sqlite). The SQLite backend is for
+workers on one host; it is not safe on a network filesystem.
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import logging
+from statistics import mean
+from agents.registry import DIMENSIONS
+from batch import collect_documents
+from core.gemini_client import close_client
+from core.jobqueue import open_queue, worker_name, STATES
+from core.dedup import open_corpus_index
+from core.pipeline import fingerprint_file, shutdown_pool
+from core import instrumentation
+from evaluate import evaluate_dimension, run_with_deadline, task_deadline, WINDOW_TOKENS, DIMENSION_DEADLINE
+
+logger = logging.getLogger(__name__)
+
+BY_SLUG = {d.slug: (name, d) for name, d in DIMENSIONS.items()}
+
+
+def enqueue(queue, inputs, pattern="*.md", dimensions=None, corpus_index=None):
+    paths = collect_documents(inputs, pattern)
+    if corpus_index:
+        # Rank the documents in path order before any worker indexes them
+        open_corpus_index(corpus_index).register([os.path.abspath(p) for p in paths])
+    added = 0
+    for path in paths:
+        _, digest = fingerprint_file(path)
+        added += queue.enqueue(path, digest, dimensions or list(BY_SLUG))
+    return len(paths), added
+
+
+async def score_job(job, window_tokens=WINDOW_TOKENS, deadline=None):
+    """Result of one job, or {"error": ...} when it should be retried"""
+    name, dimension = BY_SLUG[job.dimension]
+    _, digest = fingerprint_file(job.doc)
+    if digest != job.sha256:
+        return {"error": "document changed since it was enqueued"}
+    with open(job.doc, "r", encoding="utf-8") as f:
+        markdown = f.read()
+    output = await run_with_deadline(
+        name,
+        evaluate_dimension(dimension, markdown, window_tokens=window_tokens, doc_id=os.path.abspath(job.doc)),
+        task_deadline(name, deadline=deadline),
+    )
+    return output
+
+
+async def work(queue, worker, concurrency=16, lease_seconds=120.0, window_tokens=WINDOW_TOKENS, deadline=None, drain=False, poll=2.0):
+    """Keep up to `concurrency` jobs in flight, heartbeating their leases,
+    until the queue is empty (with `drain`) or forever. Queue calls run in a
+    thread so a slow or locked database does not stall the jobs in flight"""
+    running = {}
+    counts = {"done": 0, "failed": 0, "lost": 0}
+
+    async def run(job):
+        try:
+            output = await score_job(job, window_tokens, deadline)
+        except Exception as e:
+            output = {"error": f"{type(e).__name__}: {e}"}
+        if "error" in output:
+            await asyncio.to_thread(queue.fail, job, output["error"], worker)
+            counts["failed"] += 1
+            logger.warning(f"⚠️ {job.dimension} of {job.doc} failed (attempt {job.attempts}): {output['error']}")
+        else:
+            await asyncio.to_thread(queue.complete, job, output, worker)
+            counts["done"] += 1
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            try:
+                held = set(await asyncio.to_thread(queue.heartbeat, worker, list(running), lease_seconds))
+            except Exception as e:
+                # e.g. "database is locked"; the leases are renewed on the next beat
+                logger.warning(f"⚠️ Heartbeat failed, retrying in {lease_seconds / 3:g}s: {type(e).__name__}: {e}")
+                continue
+            for id in set(running) - held:
+                # Another worker took it over; its result will be the same
+                counts["lost"] += 1
+                logger.warning(f"⚠️ Lost the lease on job {id}")
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        while True:
+            jobs = await asyncio.to_thread(queue.lease, worker, concurrency - len(running), lease_seconds) if len(running) < concurrency else []
+            for job in jobs:
+                task = asyncio.create_task(run(job), name=f"job-{job.id}")
+                running[job.id] = task
+                task.add_done_callback(lambda _, id=job.id: running.pop(id, None))
+            if not running:
+                if drain:
+                    break
+                await asyncio.sleep(poll)
+                continue
+            await asyncio.wait(list(running.values()), timeout=poll, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        beat.cancel()
+        for task in running.values():
+            task.cancel()
+        await close_client()
+        shutdown_pool()
+    return counts
+
+
+def aggregate(queue):
+    """Latest result per (document, dimension) -> per-dimension score statistics and per-document records"""
+    latest = {}
+    for doc, sha256, dimension, score, result in queue.results():
+        latest[(doc, dimension)] = (sha256, score, result)
+    scores, documents = {}, {}
+    for (doc, dimension), (sha256, score, result) in latest.items():
+        if score is not None:
+            scores.setdefault(dimension, []).append(score)
+        record = documents.setdefault(doc, {"doc": doc, "sha256": sha256, "scores": {}, "results": {}})
+        record["scores"][dimension] = score
+        record["results"][dimension] = result
+    summary = {
+        dimension: {"documents": len(values), "mean": round(mean(values), 4), "min": min(values), "max": max(values)}
+        for dimension, values in sorted(scores.items())
+    }
+    return summary, list(documents.values())
+
+
+def status(queue, export=None):
+    requeued = queue.requeue_expired()
+    progress = queue.progress()
+    summary, documents = aggregate(queue)
+    report = {"requeued": requeued, "progress": progress, "scores": summary, "dead": queue.dead()}
+    if export:
+        with open(export, "w", encoding="utf-8") as out:
+            for record in documents:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return report
+
+
+def print_status(report):
+    total = {state: sum(counts[state] for counts in report["progress"].values()) for state in STATES}
+    jobs = sum(total.values())
+    finished = total["done"] + total["dead"]
+    print(f"📈 {finished}/{jobs} jobs finished - " + ", ".join(f"{state} {count}" for state, count in total.items()))
+    if report["requeued"]:
+        print(f"♻️ Re-enqueued {report['requeued']} expired leases")
+    for dimension, counts in sorted(report["progress"].items()):
+        stats = report["scores"].get(dimension)
+        line = f"📊 {dimension}: " + ", ".join(f"{state}={counts[state]}" for state in STATES)
+        if stats:
+            line += f" | mean {stats['mean']:.2f} (min {stats['min']:.2f}, max {stats['max']:.2f}) over {stats['documents']} docs"
+        print(line)
+    for doc, dimension, attempts, error in report["dead"]:
+        print(f"💀 {dimension} of {doc} after {attempts} attempts: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a corpus through a shared lease-based job queue")
+    parser.add_argument("--queue", help="queue URL, e.g. sqlite:///shared/jobs.sqlite (default: JOB_QUEUE_URL or .cache/jobs.sqlite)")
+    parser.add_argument("--max-attempts", type=int, default=3, help="attempts before a job is dead-lettered")
+    parser.add_argument("--corpus-index", default=os.getenv("UNIQUENESS_INDEX_PATH"),
+                        help="MinHash index to check uniqueness across the corpus against (default: UNIQUENESS_INDEX_PATH; unset checks each document on its own)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("enqueue", help="add (document, dimension) jobs")
+    add.add_argument("inputs", nargs="+", help="files, directories, glob patterns or @manifest files")
+    add.add_argument("--pattern", default="*.md", help="file pattern used when walking directories")
+    add.add_argument("--dimensions", nargs="+", choices=sorted(BY_SLUG), help="only these dimensions (default: all)")
+
+    worker = commands.add_parser("work", help="pull and score jobs")
+    worker.add_argument("--concurrency", type=int, default=16, help="jobs in flight in this worker")
+    worker.add_argument("--lease", type=float, default=120.0, help="lease length in seconds, renewed every third of it")
+    worker.add_argument("--deadline", type=float, default=DIMENSION_DEADLINE,
+                        help="seconds each dimension may take before the job is retried")
+    worker.add_argument("--window-tokens", type=int, default=WINDOW_TOKENS,
+                        help="split documents larger than this many tokens into parallel windows (0 disables)")
+    worker.add_argument("--drain", action="store_true", help="exit once no jobs are left instead of polling")
+    worker.add_argument("--poll", type=float, default=2.0, help="seconds between polls of an empty queue")
+    worker.add_argument("--name", default=worker_name(), help="worker id recorded on leases (default: host:pid)")
+    instrumentation.add_arguments(worker)
+
+    coordinator = commands.add_parser("status", help="progress, per-dimension scores and expired-lease recovery")
+    coordinator.add_argument("--export", help="write one JSONL record per document from the result store")
+    coordinator.add_argument("--retry-dead", action="store_true", help="give dead-lettered jobs another round of attempts")
+    coordinator.add_argument("--watch", type=float, help="repeat every this many seconds")
+    coordinator.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    args = parser.parse_args()
+    queue = open_queue(args.queue, max_attempts=args.max_attempts)
+    try:
+        if args.command == "enqueue":
+            documents, added = enqueue(queue, args.inputs, args.pattern, args.dimensions, args.corpus_index)
+            print(f"🚀 Enqueued {added} jobs for {documents} documents")
+        elif args.command == "work":
+            instrumentation.setup_from_args(args)
+            if args.corpus_index:
+                open_corpus_index(args.corpus_index)
+            counts = asyncio.run(work(queue, args.name, args.concurrency, args.lease, args.window_tokens,
+                                      args.deadline, args.drain, args.poll))
+            print(f"✅ Worker {args.name}: {counts['done']} jobs scored, {counts['failed']} failed, {counts['lost']} leases lost")
+            instrumentation.export_from_args(args)
+        else:
+            if args.retry_dead:
+                print(f"♻️ Re-enqueued {queue.retry_dead()} dead-lettered jobs")
+            while True:
+                report = status(queue, args.export)
+                if args.json:
+                    print(json.dumps(report, ensure_ascii=False))
+                else:
+                    print_status(report)
+                if not args.watch:
+                    break
+                time.sleep(args.watch)
+    finally:
+        queue.close()
@@ -1,8 +1,15 @@
 # python main.py sample.md         
 import asyncio
-import sys
 import json
-from evaluate import evaluate_all
+import argparse
+import os
+from evaluate import evaluate_all, is_unavailable, MODES, WINDOW_TOKENS, DIMENSION_DEADLINE
+from agents.registry import DIMENSIONS
+from core.gemini_client import close_client
+from core.pipeline import shutdown_pool
+from core.cache import get_cache
+from core.resultstore import ResultWriter
+from core import instrumentation
 from rich.table import Table
 from rich.console import Console
 from io import StringIO
@@ -13,20 +20,32 @@ def render_score_table(results):
     table.add_column("Score", style="green")
 
     for dimension, output in results.items():
+        if is_unavailable(output):
+            table.add_row(dimension.capitalize(), "⏳ unavailable")
+            continue
         score = output.get("score", "N/A")
-        table.add_row(dimension.capitalize(), f"{score:.2f}" if isinstance(score, float) else str(score))
+        score = f"{score:.2f}" if isinstance(score, float) else str(score)
+        if output.get("partial"):
+            score += " (partial)"
+        table.add_row(dimension.capitalize(), score)
     return table
 
+def _cell(value):
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
 def render_json_section(dimension, output):
     section = StringIO()
     section.write(f"\n\n=== {dimension.upper()} DETAILS ===\n\n")
-    
+
+    if is_unavailable(output):
+        section.write(f"Unavailable: {output['error']}\n")
+        return section.getvalue()
+
     details = output.get("details", [])
     if not details:
         section.write("No detailed information available.\n")
         return section.getvalue()
 
-    # Use the first dictionary's keys as headers
     keys = sorted(set().union(*(d.keys() for d in details)))
 
     table = Table(show_header=True, header_style="bold magenta")
@@ -34,35 +53,93 @@ def render_json_section(dimension, output):
         table.add_column(key)
 
     for entry in details:
-        row = [json.dumps(entry.get(k, ""), ensure_ascii=False) for k in keys]
-        table.add_row(*row)
+        table.add_row(*(_cell(entry.get(k, "")) for k in keys))
 
     console = Console(file=section, width=120, force_terminal=False)
     console.print(table)
     return section.getvalue()
 
+def write_report(path, results):
+    """Score table followed by one details table per dimension, written section by section"""
+    with open(path, "w", encoding="utf-8") as out_file:
+        Console(file=out_file, width=100, force_terminal=False).print(render_score_table(results))
+        for dimension, output in results.items():
+            out_file.write(render_json_section(dimension, output))
+
+def stream_rows(path):
+    """on_item callback printing each verdict as it arrives and appending it to a JSONL file"""
+    out_file = open(path, "w", encoding="utf-8")
+
+    def on_item(name, item):
+        dimension = DIMENSIONS[name]
+        mark = "✅" if item.get(dimension.verdict_key) is True else "❌"
+        unit = " ".join(str(item.get(dimension.unit_key, "")).split())
+        print(f"{mark} {name}: {unit[:90]}")
+        out_file.write(json.dumps({"dimension": dimension.slug, **item}, ensure_ascii=False) + "\n")
+        out_file.flush()
+
+    return on_item, out_file
+
+async def run(markdown, doc_id=None, mode="fanout", window_tokens=WINDOW_TOKENS, incremental=False, on_item=None, deadline=None):
+    try:
+        return await evaluate_all(markdown, doc_id=doc_id, mode=mode, window_tokens=window_tokens, incremental=incremental, on_item=on_item, deadline=deadline)
+    finally:
+        await close_client()
+        shutdown_pool()
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python main.py <markdown_file.md>")
-        exit(1)
+    parser = argparse.ArgumentParser(description="Evaluate the data quality of a markdown file")
+    parser.add_argument("file", help="markdown file to evaluate")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse stored per-sentence/paragraph verdicts and only re-evaluate changed units; "
+                             "whole-document dimensions are skipped while the document is unchanged and re-run on any edit")
+    parser.add_argument("--mode", choices=MODES, default="fanout",
+                        help="fanout: one call per dimension; fused: one call per document; "
+                             "hybrid: fuse only the whole-document dimensions")
+    parser.add_argument("--window-tokens", type=int, default=WINDOW_TOKENS,
+                        help="split documents larger than this many tokens into parallel windows (0 disables)")
+    parser.add_argument("--output", default="output.txt", help="where the rendered report is written")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream agent output, printing each verdict as it arrives and saving it to <output>.stream.jsonl")
+    parser.add_argument("--store", help="append one row per evaluated unit to this columnar result store (see report.py)")
+    parser.add_argument("--no-report", action="store_true",
+                        help="print the score table instead of rendering the full text report to --output")
+    parser.add_argument("--deadline", type=float, default=DIMENSION_DEADLINE,
+                        help="seconds each dimension may take before it is reported unavailable")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.setup_from_args(args)
 
-    with open(sys.argv[1], "r", encoding="utf-8") as f:
+    with open(args.file, "r", encoding="utf-8") as f:
         markdown = f.read()
 
-    results = asyncio.run(evaluate_all(markdown))
+    doc_id = os.path.abspath(args.file)
+    on_item, stream_file = stream_rows(args.output + ".stream.jsonl") if args.stream else (None, None)
+    try:
+        results = asyncio.run(run(markdown, doc_id, args.mode, args.window_tokens, args.incremental, on_item, args.deadline))
+    finally:
+        if stream_file:
+            stream_file.close()
 
-    output_lines = StringIO()
+    if args.store:
+        writer = ResultWriter(args.store)
+        writer.add_document(doc_id, markdown, results)
+        writer.close()
 
-    # Generate and write the summary score table
-    console = Console(file=output_lines, width=100, force_terminal=False)
-    console.print(render_score_table(results))
+    if args.no_report:
+        Console(width=100).print(render_score_table(results))
+    else:
+        write_report(args.output, results)
 
-    # Append the detailed JSON reasoning for each dimension
-    for dimension, output in results.items():
-        output_lines.write(render_json_section(dimension, output))
+    if args.no_report:
+        print("✅ Evaluation completed.")
+    else:
+        print(f"✅ Evaluation completed. See '{args.output}' for structured results.")
+    if args.store:
+        print(f"🗃️ Unit verdicts appended to '{args.store}'; query them with: python report.py {args.store}")
 
-    # Write final results to output.txt
-    with open("output.txt", "w", encoding="utf-8") as out_file:
-        out_file.write(output_lines.getvalue())
+    cache = get_cache()
+    if cache:
+        print(f"🗄️ Response cache: {cache.summary()}")
 
-    print("✅ Evaluation completed. See 'output.txt' for structured results.")
+    instrumentation.export_from_args(args)
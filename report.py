@@ -0,0 +1,149 @@
+# python report.py results.dqr --by section --dimension accuracy
+"""Query the columnar result store written by main.py / batch.py --store.
+
+Aggregates are computed batch by batch, so stores with millions of unit rows
+are never loaded whole. The full rich text report is just another view of the
+store, rendered only when asked for with --text.
+"""
+import os
+import json
+import argparse
+from collections import OrderedDict
+from rich.table import Table
+from rich.console import Console
+from agents.registry import DIMENSIONS
+from core.resultstore import aggregate, rows
+from main import render_json_section
+
+BY_SLUG = {d.slug: d for d in DIMENSIONS.values()}
+
+
+def _rate(passed, failed):
+    return round(passed / (passed + failed), 4) if passed + failed else None
+
+
+def dimension_summary(path, dimension=None):
+    """{slug: units, passed, failed, pass rate, documents and the mean per-document score}"""
+    summary = {}
+    for (slug, _), (units, passed, failed) in aggregate(path, by="doc", dimension=dimension).items():
+        entry = summary.setdefault(slug, {"units": 0, "passed": 0, "failed": 0, "documents": 0, "doc_scores": []})
+        entry["units"] += units
+        entry["passed"] += passed
+        entry["failed"] += failed
+        entry["documents"] += 1
+        if passed + failed:
+            entry["doc_scores"].append(passed / (passed + failed))
+    for entry in summary.values():
+        scores = entry.pop("doc_scores")
+        entry["pass_rate"] = _rate(entry["passed"], entry["failed"])
+        entry["mean_doc_score"] = round(sum(scores) / len(scores), 4) if scores else None
+    return dict(sorted(summary.items()))
+
+
+def grouped(path, by, dimension=None, top=20):
+    """Groups with the lowest pass rate first"""
+    result = [
+        {"dimension": slug, by: group, "units": units, "passed": passed, "failed": failed, "pass_rate": _rate(passed, failed)}
+        for (slug, group), (units, passed, failed) in aggregate(path, by=by, dimension=dimension).items()
+    ]
+    result.sort(key=lambda r: (r["pass_rate"] if r["pass_rate"] is not None else 2, -r["units"]))
+    return result[:top] if top else result
+
+
+class Sources:
+    """Unit text for rows stored by offset, read back from the evaluated documents"""
+
+    def __init__(self, size=8):
+        self.size = size
+        self.cache = OrderedDict()
+
+    def text(self, row):
+        if row["offset"] < 0 or row["unit"]:
+            return row["unit"]
+        doc = row["doc"]
+        if doc not in self.cache:
+            try:
+                with open(doc, "r", encoding="utf-8") as f:
+                    self.cache[doc] = f.read()
+            except OSError:
+                self.cache[doc] = None
+            if len(self.cache) > self.size:
+                self.cache.popitem(last=False)
+        source = self.cache[doc]
+        if source is None:
+            return f"<{doc} offset {row['offset']}>"
+        return source[row["offset"]:row["offset"] + row["length"]]
+
+
+def failed_units(path, dimension=None, limit=50):
+    sources = Sources()
+    for n, row in enumerate(rows(path, dimension=dimension, verdict=False)):
+        if limit and n >= limit:
+            return
+        yield {**row, "unit": sources.text(row)}
+
+
+def write_text_report(path, output, dimension=None):
+    """The per-document, per-dimension details tables of main.py, generated from the store"""
+    sources = Sources()
+    current, details = None, []
+
+    def flush(out):
+        if current and details:
+            doc, slug = current
+            out.write(render_json_section(f"{os.path.basename(doc)} · {BY_SLUG[slug].name}", {"details": details}))
+
+    with open(output, "w", encoding="utf-8") as out:
+        for row in rows(path, dimension=dimension):
+            key = (row["doc"], row["dimension"])
+            if key != current:
+                flush(out)
+                current, details = key, []
+            spec = BY_SLUG[row["dimension"]].spec
+            details.append({spec.unit_key: sources.text(row), spec.verdict_key: row["verdict"], spec.extra_key: row["reason"]})
+        flush(out)
+
+
+def print_table(title, records, columns):
+    table = Table(title=title, show_lines=False)
+    for column in columns:
+        table.add_column(column)
+    for record in records:
+        table.add_row(*("" if record.get(c) is None else str(record.get(c)) for c in columns))
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate and query a columnar result store")
+    parser.add_argument("store", help="result store written with --store")
+    parser.add_argument("--dimension", choices=sorted(BY_SLUG), help="only this dimension")
+    parser.add_argument("--by", choices=("section", "doc"), help="aggregate per section or per document, worst first")
+    parser.add_argument("--top", type=int, default=20, help="groups shown with --by (0 for all)")
+    parser.add_argument("--failed", action="store_true", help="list units with a false verdict and their reasons")
+    parser.add_argument("--limit", type=int, default=50, help="units listed with --failed (0 for all)")
+    parser.add_argument("--text", help="render the full text report into this file")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of tables")
+    args = parser.parse_args()
+
+    if args.text:
+        write_text_report(args.store, args.text, args.dimension)
+        print(f"✅ Text report written to '{args.text}'")
+    elif args.failed:
+        units = list(failed_units(args.store, args.dimension, args.limit))
+        if args.json:
+            print(json.dumps(units, ensure_ascii=False))
+        else:
+            print_table("Failed units", units, ("dimension", "doc", "section", "unit", "reason"))
+    elif args.by:
+        groups = grouped(args.store, args.by, args.dimension, args.top)
+        if args.json:
+            print(json.dumps(groups, ensure_ascii=False))
+        else:
+            print_table(f"Pass rate per {args.by}", groups, ("dimension", args.by, "units", "passed", "failed", "pass_rate"))
+    else:
+        summary = dimension_summary(args.store, args.dimension)
+        if args.json:
+            print(json.dumps(summary, ensure_ascii=False))
+        else:
+            print_table("Pass rate per dimension", [{"dimension": slug, **entry} for slug, entry in summary.items()],
+                        ("dimension", "documents", "units", "passed", "failed", "pass_rate", "mean_doc_score"))
@@ -0,0 +1,385 @@
+# python service.py --port 8080 --docs-root .    |    curl -s localhost:8080/evaluate -d '{"path": "sample.md"}'
+"""Resident evaluation service.
+
+Keeps the interpreter, parsers and the pooled Gemini client warm between
+documents. Requests are admitted into a bounded queue (429 when full) and
+carry a deadline (504 when it passes). Small documents arriving within a
+short batching window share one packed LLM call per dimension.
+
+Endpoints: POST /evaluate {"markdown" | "path", "doc_id"?, "deadline"?},
+GET /stats, GET /metrics, GET /healthz. "path" is only accepted for markdown
+files under --docs-root (DOCS_ROOT) and is refused when no root is set.
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import logging
+from collections import deque
+from typing import Optional
+from agents.registry import DIMENSIONS
+from agents.packed_agent import evaluate_packed
+from core.gemini_client import get_client, close_client, estimate_tokens, latency
+from core.pipeline import get_pool, shutdown_pool
+from core import instrumentation
+from core.instrumentation import recorder
+from evaluate import evaluate_all, evaluate_dimension, with_local_checks, run_with_deadline, unavailable, LOCAL_CHECKS, task_deadline, MODES, WINDOW_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Extensions of the files a "path" request may read
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return round(ordered[low] + (ordered[high] - ordered[low]) * (k - low), 4)
+
+
+def parse_request(body: bytes) -> dict:
+    """The JSON body of an /evaluate request; raises ValueError/TypeError
+    (a 400) when it is not an object with the documented field types"""
+    request = json.loads(body)
+    if not isinstance(request, dict):
+        raise TypeError(f"expected a JSON object, got {type(request).__name__}")
+    for field in ("markdown", "path", "doc_id"):
+        if request.get(field) is not None and not isinstance(request[field], str):
+            raise TypeError(f"{field} must be a string")
+    if request.get("markdown") is None and request.get("path") is None:
+        raise ValueError("send markdown or path")
+    deadline = request.get("deadline")
+    if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or not deadline > 0):
+        raise ValueError("deadline must be a positive number of seconds")
+    return request
+
+
+class Job:
+    __slots__ = ("markdown", "doc_id", "tokens", "deadline", "admitted", "future")
+
+    def __init__(self, markdown: str, doc_id: str, deadline: float):
+        self.markdown = markdown
+        self.doc_id = doc_id
+        self.tokens = estimate_tokens(markdown)
+        self.admitted = time.monotonic()
+        self.deadline = self.admitted + deadline
+        self.future = asyncio.get_running_loop().create_future()
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+class MicroBatcher:
+    """Collects small documents for one dimension for up to `window` seconds,
+    or until `max_docs` / `max_tokens` is reached, and scores them with one
+    packed call"""
+
+    def __init__(self, dimension, window: float, max_docs: int, max_tokens: int):
+        self.dimension = dimension
+        self.window = window
+        self.max_docs = max_docs
+        self.max_tokens = max_tokens
+        self.pending = []
+        self.tokens = 0
+        self.timer = None
+        self.running = set()
+        self.batches = 0
+        self.documents = 0
+
+    def submit(self, markdown: str) -> asyncio.Future:
+        tokens = estimate_tokens(markdown)
+        if self.pending and self.tokens + tokens > self.max_tokens:
+            self.flush()
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((markdown, future))
+        self.tokens += tokens
+        if len(self.pending) >= self.max_docs:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending, self.tokens = self.pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self.run(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def run(self, batch):
+        self.batches += 1
+        self.documents += len(batch)
+        recorder.observe("dq_service_batch_documents", len(batch), dimension=self.dimension.slug)
+        try:
+            outputs = await evaluate_packed(self.dimension, [markdown for markdown, _ in batch])
+        except Exception as e:
+            outputs = [unavailable(f"{type(e).__name__}: {e}")] * len(batch)
+        for (_, future), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
+
+
+class EvaluationService:
+    def __init__(
+        self,
+        workers: int = 32,
+        max_queue: int = 256,
+        batch_window: float = 0.05,
+        max_batch_docs: int = 8,
+        max_batch_tokens: int = 6000,
+        small_doc_tokens: int = 1500,
+        deadline: float = 120.0,
+        mode: str = "fanout",
+        window_tokens: int = WINDOW_TOKENS,
+        docs_root: Optional[str] = None,
+    ):
+        self.workers = workers
+        self.docs_root = os.path.realpath(docs_root) if docs_root else None
+        self.queue = asyncio.Queue(max_queue)
+        self.small_doc_tokens = small_doc_tokens
+        self.deadline = deadline
+        self.mode = mode
+        self.window_tokens = window_tokens
+        self.batchers = {
+            name: MicroBatcher(d, batch_window, max_batch_docs, max_batch_tokens)
+            for name, d in DIMENSIONS.items() if not d.corpus_aware
+        } if batch_window > 0 and max_batch_docs > 1 else {}
+        self.tasks = []
+        self.started = time.monotonic()
+        self.latencies = deque(maxlen=10_000)
+        self.counts = {"admitted": 0, "rejected": 0, "completed": 0, "failed": 0, "expired": 0, "batched": 0}
+        self.in_flight = 0
+
+    async def start(self):
+        get_client()  # open the pooled connection set before the first request
+        get_pool()
+        self.tasks = [asyncio.create_task(self.worker(), name=f"worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await close_client()
+        shutdown_pool()
+
+    def admit(self, markdown: str, doc_id: str = None, deadline: float = None):
+        """Queue a document; returns its Job, or None when the queue is full"""
+        job = Job(markdown, doc_id, min(deadline or self.deadline, self.deadline))
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.counts["rejected"] += 1
+            return None
+        self.counts["admitted"] += 1
+        return job
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            if job.remaining() <= 0:
+                # Its caller has already given up; do not spend calls on it
+                self.counts["expired"] += 1
+                job.future.cancel()
+                continue
+            self.in_flight += 1
+            try:
+                result = await asyncio.wait_for(self.evaluate(job), job.remaining())
+                if not job.future.done():
+                    job.future.set_result(result)
+                self.counts["completed"] += 1
+                self.latencies.append(time.monotonic() - job.admitted)
+            except asyncio.TimeoutError:
+                self.counts["expired"] += 1
+                job.future.cancel()
+            except Exception as e:
+                self.counts["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.in_flight -= 1
+
+    async def evaluate(self, job: Job):
+        if not self.batchers or self.mode != "fanout" or job.tokens > self.small_doc_tokens:
+            return await evaluate_all(job.markdown, doc_id=job.doc_id, mode=self.mode, window_tokens=self.window_tokens)
+        self.counts["batched"] += 1
+        names = list(DIMENSIONS)
+        outputs = await asyncio.gather(*(
+            run_with_deadline(name, self.packed(name, job), task_deadline(name))
+            if name in self.batchers
+            else run_with_deadline(name, evaluate_dimension(DIMENSIONS[name], job.markdown, doc_id=job.doc_id), task_deadline(name))
+            for name in names
+        ))
+        return dict(zip(names, outputs))
+
+    def packed(self, name: str, job: Job):
+        """The dimension's result for `job` from its micro-batcher"""
+        result = self.batchers[name].submit(job.markdown)
+        if name in LOCAL_CHECKS:
+            # Local checks need the whole document and its id, not the packed call
+            return with_local_checks(DIMENSIONS[name], result, job.markdown, job.doc_id)
+        return result
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        latencies = list(self.latencies)
+        batches = sum(b.batches for b in self.batchers.values())
+        packed = sum(b.documents for b in self.batchers.values())
+        return {
+            **self.counts,
+            "queued": self.queue.qsize(),
+            "in_flight": self.in_flight,
+            "uptime_s": round(elapsed, 1),
+            "docs_per_sec": round(self.counts["completed"] / elapsed, 3) if elapsed else 0.0,
+            "latency_s": {f"p{q}": percentile(latencies, q) for q in (50, 95, 99)},
+            "packed_calls": batches,
+            "docs_per_packed_call": round(packed / batches, 2) if batches else None,
+            "calls_saved": packed - batches,
+            "llm_latency_s": latency.snapshot(),
+        }
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                status, content_type, payload = await self.route(method, path.split("?")[0], body)
+                head = (
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Error')}\r\n"
+                    f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+                    + ("Retry-After: 1\r\n" if status == 429 else "")
+                    + "\r\n"
+                )
+                writer.write(head.encode("latin-1") + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def resolve(self, path: str) -> str:
+        """Real path of a requested document, which must be a markdown file
+        under docs_root; raises PermissionError otherwise"""
+        if self.docs_root is None:
+            raise PermissionError("reading files is disabled; start the service with --docs-root or send markdown")
+        resolved = os.path.realpath(os.path.join(self.docs_root, path))
+        # realpath first, so neither ".." nor a symlink can leave the root
+        if os.path.commonpath([resolved, self.docs_root]) != self.docs_root:
+            raise PermissionError(f"{path} is outside the documents root")
+        if not resolved.lower().endswith(MARKDOWN_EXTENSIONS):
+            raise PermissionError(f"{path} is not a markdown file")
+        return resolved
+
+    async def route(self, method: str, path: str, body: bytes):
+        if method == "GET" and path == "/healthz":
+            return 200, "text/plain", b"ok"
+        if method == "GET" and path == "/stats":
+            return 200, "application/json", json.dumps(self.stats()).encode("utf-8")
+        if method == "GET" and path == "/metrics":
+            return 200, "text/plain; version=0.0.4", recorder.prometheus_text().encode("utf-8")
+        if method != "POST" or path != "/evaluate":
+            return 404, "application/json", b'{"error": "not found"}'
+
+        try:
+            request = parse_request(body)
+            markdown = request.get("markdown")
+            source = None
+            if markdown is None:
+                source = self.resolve(request["path"])
+                with open(source, "r", encoding="utf-8") as f:
+                    markdown = f.read()
+            doc_id = request.get("doc_id") or source
+        except PermissionError as e:
+            return 403, "application/json", json.dumps({"error": str(e)}).encode("utf-8")
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            return 400, "application/json", json.dumps({"error": f"{type(e).__name__}: {e}"}).encode("utf-8")
+
+        job = self.admit(markdown, doc_id, request.get("deadline"))
+        if job is None:
+            return 429, "application/json", b'{"error": "queue full"}'
+        try:
+            results = await asyncio.wait_for(asyncio.shield(job.future), max(0.0, job.remaining()))
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            return 504, "application/json", b'{"error": "deadline exceeded"}'
+        except Exception as e:
+            return 500, "application/json", json.dumps({"error": f"{type(e).__name__}: {e}"}).encode("utf-8")
+        payload = {"doc_id": doc_id, "latency_s": round(time.monotonic() - job.admitted, 4), "results": results}
+        return 200, "application/json", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 429: "Too Many Requests",
+               500: "Internal Server Error", 504: "Gateway Timeout"}
+
+
+async def serve(args):
+    service = EvaluationService(
+        workers=args.workers,
+        max_queue=args.max_queue,
+        batch_window=args.batch_window_ms / 1000,
+        max_batch_docs=args.max_batch_docs,
+        max_batch_tokens=args.max_batch_tokens,
+        small_doc_tokens=args.small_doc_tokens,
+        deadline=args.deadline,
+        mode=args.mode,
+        window_tokens=args.window_tokens,
+        docs_root=args.docs_root,
+    )
+    await service.start()
+    if args.unix:
+        server = await asyncio.start_unix_server(service.handle, args.unix)
+        print(f"🚀 Evaluation service listening on unix:{args.unix}")
+    else:
+        server = await asyncio.start_server(service.handle, args.host, args.port)
+        print(f"🚀 Evaluation service listening on http://{args.host}:{server.sockets[0].getsockname()[1]}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=32, help="documents evaluated concurrently")
+    parser.add_argument("--max-queue", type=int, default=256, help="admitted documents waiting for a worker; more get 429")
+    parser.add_argument("--deadline", type=float, default=120.0, help="maximum seconds per request (requests may ask for less)")
+    parser.add_argument("--batch-window-ms", type=float, default=50.0, help="how long small documents wait to share a call (0 disables)")
+    parser.add_argument("--max-batch-docs", type=int, default=8, help="documents packed into one call")
+    parser.add_argument("--max-batch-tokens", type=int, default=6000, help="document tokens packed into one call")
+    parser.add_argument("--small-doc-tokens", type=int, default=1500, help="documents up to this size are batched")
+    parser.add_argument("--mode", choices=MODES, default="fanout", help="evaluation mode for documents that are not batched")
+    parser.add_argument("--window-tokens", type=int, default=WINDOW_TOKENS,
+                        help="split documents larger than this many tokens into parallel windows (0 disables)")
+    parser.add_argument("--docs-root", default=os.getenv("DOCS_ROOT"),
+                        help='directory "path" requests may read markdown files from (default: DOCS_ROOT; unset refuses them)')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.setup_from_args(args)
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        instrumentation.export_from_args(args)
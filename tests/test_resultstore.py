@@ -0,0 +1,110 @@
+import os
+from core.resultstore import ResultWriter, aggregate, rows
+
+MARKDOWN = """# Intro
+
+The first paragraph states a fact.
+
+## Details
+
+The second paragraph explains it.
+
+A third paragraph follows right after.
+"""
+
+
+def results(verdicts, units=None):
+    units = units or ["The first paragraph states a fact.", "The second paragraph explains it."]
+    return {"Consistency": {"details": [
+        {"unit": unit, "is_consistent": verdict, "issue": None if verdict else "tone shift"}
+        for unit, verdict in zip(units, verdicts)
+    ]}}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "r.dqr")
+    writer = ResultWriter(path, batch_rows=1)
+    writer.add_document("a.md", MARKDOWN, results([True, False]))
+    writer.close()
+
+    stored = list(rows(path))
+    assert [(r["doc"], r["dimension"], r["section"], r["verdict"]) for r in stored] == [
+        ("a.md", "consistency", "Intro", True),
+        ("a.md", "consistency", "Details", False),
+    ]
+    assert stored[1]["reason"] == "tone shift"
+    assert MARKDOWN[stored[1]["offset"]:stored[1]["offset"] + stored[1]["length"]] == "The second paragraph explains it."
+    assert aggregate(path) == {("consistency",): (2, 1, 1)}
+    assert aggregate(path, by="section") == {("consistency", "Intro"): (1, 1, 0), ("consistency", "Details"): (1, 0, 1)}
+
+
+def test_reworded_unit_keeps_its_text(tmp_path):
+    path = str(tmp_path / "r.dqr")
+    reworded = "The second\n  paragraph   explains it."
+    writer = ResultWriter(path)
+    writer.add_document("a.md", MARKDOWN, results([False], [reworded]))
+    writer.close()
+
+    (row,) = rows(path)
+    assert row["section"] == "Details"
+    assert row["unit"] == reworded
+
+
+def test_rerun_does_not_duplicate_and_edits_supersede(tmp_path):
+    path = str(tmp_path / "r.dqr")
+    for verdicts in ([True, True], [True, True]):
+        writer = ResultWriter(path)
+        writer.add_document("a.md", MARKDOWN, results(verdicts))
+        writer.close()
+    assert aggregate(path) == {("consistency",): (2, 2, 0)}
+
+    writer = ResultWriter(path)
+    writer.add_document("a.md", MARKDOWN + "\nAn edit.\n", results([False, False]))
+    writer.close()
+    assert aggregate(path) == {("consistency",): (2, 0, 2)}
+    assert aggregate(path, by="doc") == {("consistency", "a.md"): (2, 0, 2)}
+
+
+def test_torn_tail_is_dropped_before_appending(tmp_path):
+    path = str(tmp_path / "r.dqr")
+    writer = ResultWriter(path)
+    writer.add_document("a.md", MARKDOWN, results([True, False]))
+    writer.close()
+    complete = os.path.getsize(path)
+
+    writer = ResultWriter(path)
+    writer.add_document("b.md", MARKDOWN, results([False, False]))
+    writer.close()
+    with open(path, "r+b") as f:
+        f.truncate(complete + (os.path.getsize(path) - complete) // 2)
+    assert aggregate(path) == {("consistency",): (2, 1, 1)}
+
+    writer = ResultWriter(path)
+    writer.add_document("c.md", MARKDOWN, results([True, True]))
+    writer.close()
+    assert [r["doc"] for r in rows(path)] == ["a.md", "a.md", "c.md", "c.md"]
+    assert aggregate(path) == {("consistency",): (4, 3, 1)}
+
+
+def test_retry_replaces_rows_of_the_same_version(tmp_path):
+    path = str(tmp_path / "r.dqr")
+    writer = ResultWriter(path)
+    writer.add_document("a.md", MARKDOWN, {"Consistency": {"status": "unavailable", "score": None, "error": "timeout"}})
+    writer.close()
+    assert aggregate(path) == {}
+
+    writer = ResultWriter(path)
+    writer.add_document("a.md", MARKDOWN, results([True, False]))
+    writer.close()
+    assert aggregate(path) == {("consistency",): (2, 1, 1)}
+
+
+def test_reverted_document_reports_its_current_rows(tmp_path):
+    path = str(tmp_path / "r.dqr")
+    edited = MARKDOWN + "\nAn edit.\n"
+    for markdown, verdicts in ((MARKDOWN, [True, True]), (edited, [False, False]), (MARKDOWN, [True, True])):
+        writer = ResultWriter(path)
+        writer.add_document("a.md", markdown, results(verdicts))
+        writer.close()
+    assert aggregate(path) == {("consistency",): (2, 2, 0)}
+    assert [r["verdict"] for r in rows(path)] == [True, True]